@@ -1,10 +1,122 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ALL_VAR, ChangeList, ORDER_VAR
+from django.utils.dateparse import parse_datetime
 from .models import ContactMessage
 
+AFTER_VAR = 'after'
+BEFORE_VAR = 'before'
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist paged by (created_at, id) instead of LIMIT/OFFSET, so every page
+    is an index range scan no matter how deep it is. Results are counted only up
+    to `count_limit` rather than with an exact COUNT(*) over the whole table.
+    Sorting by a column falls back to Django's numbered pages.
+    """
+    count_limit = 1000
+    keyset = False
+    # More than count_limit matches: result_count is a lower bound, so "select all" is hidden
+    count_capped = False
+
+    def __init__(self, request, *args, **kwargs):
+        self.after = self._parse_cursor(request.GET.get(AFTER_VAR))
+        self.before = self._parse_cursor(request.GET.get(BEFORE_VAR))
+        super().__init__(request, *args, **kwargs)
+
+    @staticmethod
+    def _parse_cursor(value):
+        """
+        "<created_at ISO>_<id>" from a page link, as (created_at, id)
+        """
+        if not value:
+            return None
+        created_at, _, pk = value.rpartition('_')
+        created_at = parse_datetime(created_at)
+        if created_at is None or not pk.isdigit():
+            raise IncorrectLookupParameters
+        return created_at, int(pk)
+
+    @staticmethod
+    def _cursor(obj):
+        return f'{obj.created_at.isoformat()}_{obj.pk}'
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        lookup_params.pop(BEFORE_VAR, None)
+        return lookup_params
+
+    def get_results(self, request):
+        self.keyset = not self.params.get(ORDER_VAR)
+        if not self.keyset:
+            return super().get_results(request)
+
+        # Only tells whether there are more than count_limit matches
+        result_count = self.queryset.order_by()[:self.count_limit + 1].count()
+        self.count_capped = result_count > self.count_limit
+        self.result_count = min(result_count, self.count_limit)
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = not self.count_capped and result_count <= self.list_max_show_all
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+
+        queryset = self.queryset
+        if self.show_all and self.can_show_all:
+            rows = list(queryset)
+            has_newer = has_older = False
+        elif self.before:
+            created_at, pk = self.before
+            # Walk backwards from the cursor, then restore newest first
+            rows = list(queryset.filter(created_at__gte=created_at).exclude(created_at=created_at, pk__lte=pk)
+                        .reverse()[:self.list_per_page + 1])
+            has_newer = len(rows) > self.list_per_page
+            rows = rows[:self.list_per_page][::-1]
+            has_older = True
+        else:
+            if self.after:
+                created_at, pk = self.after
+                # Not an OR of the two conditions: that can't be answered with an index range
+                queryset = queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, pk__gte=pk)
+            rows = list(queryset[:self.list_per_page + 1])
+            has_older = len(rows) > self.list_per_page
+            rows = rows[:self.list_per_page]
+            has_newer = self.after is not None
+
+        self.result_list = rows
+        self.multi_page = has_newer or has_older
+        remove = [AFTER_VAR, BEFORE_VAR]
+        self.first_page_url = self.get_query_string(remove=remove) if has_newer else None
+        self.newer_page_url = (self.get_query_string({BEFORE_VAR: self._cursor(rows[0])}, remove)
+                               if has_newer and rows else None)
+        self.older_page_url = (self.get_query_string({AFTER_VAR: self._cursor(rows[-1])}, remove)
+                               if has_older and rows else None)
+        self.show_all_url = self.get_query_string({ALL_VAR: ''}, remove)
+
+
 @admin.register(ContactMessage)
 class ContactMessageAdmin(admin.ModelAdmin):
-    list_display = ['name', 'email', 'subject', 'created_at', 'sent_to_telegram']
+    list_display = ['name', 'email', 'subject', 'created_at', 'sent_to_telegram', 'delivery_attempts']
     list_filter = ['sent_to_telegram', 'created_at']
     search_fields = ['name', 'email', 'subject']
-    readonly_fields = ['created_at']
-    ordering = ['-created_at']
\ No newline at end of file
+    readonly_fields = ['created_at', 'delivery_attempts', 'last_attempt_at', 'last_error']
+    ordering = ['-created_at']
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def response_action(self, request, queryset):
+        # The changelist only counts up to count_limit, so "all matches" can't be confirmed with a number
+        if request.POST.get('select_across') == '1':
+            limit = KeysetChangeList.count_limit
+            if queryset.order_by()[:limit + 1].count() > limit:
+                self.message_user(
+                    request,
+                    f'More than {limit} messages match. Narrow the filters or select messages on the page.',
+                    messages.WARNING,
+                )
+                return None
+        return super().response_action(request, queryset)
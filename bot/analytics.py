@@ -0,0 +1,306 @@
+"""
+Activity analytics over the local message mirror.
+
+Reports are read from rollup tables (ChatDailyStats, SenderDailyStats,
+MediaDailyStats and ResponseTimeStats) that hold one row per dialog and day
+(and sender, media type or response bucket), so even years of history are
+summed from a few thousand rows instead of scanning every message.
+ChatDailyStats keeps the day's hour-of-day histogram as a list of 24 counts
+rather than 24 rows, which keeps heatmaps over long ranges cheap. The
+rollups are computed with SQL aggregates and refreshed incrementally:
+refresh() remembers the highest message row it has seen and only
+recomputes the days of the dialogs that received messages since then.
+Days are local to the configured TIME_ZONE.
+"""
+from django.db import transaction
+from django.db.models import (
+    BooleanField, Case, Count, DurationField, ExpressionWrapper, F, IntegerField, Max, Min, OuterRef, Q,
+    Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, ExtractHour, ExtractIsoWeekDay, TruncDate
+from django.utils import timezone
+from datetime import datetime, time as dt_time, timedelta
+from functools import reduce
+import logging
+import operator
+from .models import (
+    BotState, ChatDailyStats, MediaDailyStats, ResponseTimeStats, SenderDailyStats, TelegramMessage,
+)
+from .mirror import USER_ID_KEY
+
+logger = logging.getLogger(__name__)
+
+# Highest TelegramMessage row already counted in the rollups
+WATERMARK_KEY = 'analytics_message_pk'
+
+ROLLUPS = [ChatDailyStats, SenderDailyStats, MediaDailyStats, ResponseTimeStats]
+
+# Upper bounds of the response time buckets; the last bucket is open-ended
+RESPONSE_BUCKETS = [
+    ('< 1m', timedelta(minutes=1)),
+    ('1-5m', timedelta(minutes=5)),
+    ('5-15m', timedelta(minutes=15)),
+    ('15m-1h', timedelta(hours=1)),
+    ('1-6h', timedelta(hours=6)),
+    ('6-24h', timedelta(days=1)),
+    ('> 1d', None),
+]
+
+# Dialogs recomputed per query, keeps the OR of date ranges small
+SPAN_CHUNK = 100
+
+
+def refresh(rebuild=False, batch_size=500):
+    """
+    Bring the rollups up to date with the mirror. Only days of dialogs that
+    got messages since the last refresh are recomputed, unless `rebuild`.
+    Returns (dialogs, days) refreshed.
+    """
+    top = TelegramMessage.objects.aggregate(top=Max('pk'))['top'] or 0
+    state = BotState.objects.filter(key=WATERMARK_KEY).first()
+    watermark = 0 if rebuild or state is None else state.value
+
+    if not watermark:
+        with transaction.atomic():
+            for model in ROLLUPS:
+                model.objects.all().delete()
+            days = _materialize(TelegramMessage.objects.all(), batch_size)
+            BotState.objects.update_or_create(key=WATERMARK_KEY, defaults={'value': top})
+        dialogs = ChatDailyStats.objects.values('dialog_id').distinct().count()
+        return dialogs, days
+
+    spans = list(
+        TelegramMessage.objects
+        .filter(pk__gt=watermark, pk__lte=top, date__isnull=False)
+        .values('dialog_id')
+        .annotate(first=Min('date'), last=Max('date'))
+        .order_by()
+    )
+    days = 0
+    with transaction.atomic():
+        for start in range(0, len(spans), SPAN_CHUNK):
+            chunk = [_day_span(span) for span in spans[start:start + SPAN_CHUNK]]
+            message_ranges = reduce(operator.or_, (
+                Q(dialog_id=dialog_id, date__gte=_day_start(first), date__lt=_day_start(last + timedelta(days=1)))
+                for dialog_id, first, last in chunk
+            ))
+            rollup_ranges = reduce(operator.or_, (
+                Q(dialog_id=dialog_id, day__gte=first, day__lte=last)
+                for dialog_id, first, last in chunk
+            ))
+            for model in ROLLUPS:
+                model.objects.filter(rollup_ranges).delete()
+            days += _materialize(TelegramMessage.objects.filter(message_ranges), batch_size)
+        BotState.objects.update_or_create(key=WATERMARK_KEY, defaults={'value': top})
+    return len(spans), days
+
+
+def _day_span(span):
+    return (
+        span['dialog_id'],
+        timezone.localtime(span['first']).date(),
+        timezone.localtime(span['last']).date(),
+    )
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, dt_time.min))
+
+
+def _materialize(messages, batch_size):
+    """
+    Insert the rollup rows of `messages`, whose days must have no rows yet.
+    Returns the number of (dialog, day) rows written.
+    """
+    state = BotState.objects.filter(key=USER_ID_KEY).first()
+    own_id = state.value if state else None
+    messages = messages.filter(date__isnull=False).annotate(day=TruncDate('date')).order_by()
+
+    hourly = {}
+    for dialog_id, day, hour, count in (messages
+                                        .annotate(hour=ExtractHour('date'))
+                                        .values_list('dialog_id', 'day', 'hour')
+                                        .annotate(messages=Count('pk'))):
+        hourly.setdefault((dialog_id, day), [0] * 24)[hour] = count
+
+    # Count('pk', filter=...) can't take an empty filter, so without the own id nothing is outgoing
+    outgoing = Count('pk', filter=Q(sender_id=own_id)) if own_id else Value(0)
+    daily = messages.values('dialog_id', 'day').annotate(
+        weekday=ExtractIsoWeekDay('date'),
+        messages=Count('pk'),
+        outgoing=outgoing,
+        replies=Count('pk', filter=Q(is_reply=True)),
+        media=Count('pk', filter=Q(has_media=True)),
+        senders=Count('sender_id', distinct=True),
+    )
+    ChatDailyStats.objects.bulk_create([
+        ChatDailyStats(dialog_id=row['dialog_id'], day=row['day'], weekday=row['weekday'],
+                       message_count=row['messages'], outgoing_count=row['outgoing'], reply_count=row['replies'],
+                       media_count=row['media'], sender_count=row['senders'],
+                       hourly_counts=hourly[row['dialog_id'], row['day']])
+        for row in daily
+    ], batch_size=batch_size)
+
+    senders = messages.values('dialog_id', 'day', 'sender_id').annotate(
+        messages=Count('pk'), name=Max('sender_name'),
+    )
+    SenderDailyStats.objects.bulk_create([
+        SenderDailyStats(dialog_id=row['dialog_id'], day=row['day'], sender_id=row['sender_id'],
+                         sender_name=row['name'], message_count=row['messages'])
+        for row in senders
+    ], batch_size=batch_size)
+
+    media = (messages.filter(has_media=True)
+             .annotate(kind=Coalesce('media_type', Value('Unknown')))
+             .values('dialog_id', 'day', 'kind')
+             .annotate(messages=Count('pk')))
+    MediaDailyStats.objects.bulk_create([
+        MediaDailyStats(dialog_id=row['dialog_id'], day=row['day'], media_type=row['kind'],
+                        message_count=row['messages'])
+        for row in media
+    ], batch_size=batch_size)
+
+    ResponseTimeStats.objects.bulk_create([
+        ResponseTimeStats(dialog_id=row['dialog_id'], day=row['day'], outgoing=row['is_outgoing'],
+                          bucket=row['bucket'], reply_count=row['replies'])
+        for row in _responses(messages, own_id)
+    ], batch_size=batch_size)
+
+    return len(daily)
+
+
+def _responses(messages, own_id):
+    """
+    Replies to another sender's message, grouped by dialog, day, direction
+    and response time bucket
+    """
+    original = TelegramMessage.objects.filter(dialog_id=OuterRef('dialog_id'), message_id=OuterRef('reply_to_msg_id'))
+    replies = (messages
+               .filter(reply_to_msg_id__isnull=False)
+               .annotate(replied_at=Subquery(original.values('date')[:1]),
+                         replied_sender=Subquery(original.values('sender_id')[:1]))
+               .filter(replied_at__isnull=False)
+               .exclude(replied_sender=F('sender_id'))
+               .annotate(delay=ExpressionWrapper(F('date') - F('replied_at'), output_field=DurationField())))
+    bucket = Case(
+        *[When(delay__lt=bound, then=Value(index)) for index, (_, bound) in enumerate(RESPONSE_BUCKETS) if bound],
+        default=Value(len(RESPONSE_BUCKETS) - 1),
+        output_field=IntegerField(),
+    )
+    if own_id:
+        is_outgoing = Case(When(sender_id=own_id, then=Value(True)), default=Value(False), output_field=BooleanField())
+    else:
+        is_outgoing = Value(False, output_field=BooleanField())
+    return (replies
+            .annotate(bucket=bucket, is_outgoing=is_outgoing)
+            .values('dialog_id', 'day', 'is_outgoing', 'bucket')
+            .annotate(replies=Count('pk')))
+
+
+def _scoped(model, since=None, until=None, dialog_id=None):
+    """
+    Rollup rows from `since` to `until` (dates, inclusive) of one dialog (peer id) or all
+    """
+    queryset = model.objects.all()
+    if since:
+        queryset = queryset.filter(day__gte=since)
+    if until:
+        queryset = queryset.filter(day__lte=until)
+    if dialog_id:
+        queryset = queryset.filter(dialog__dialog_id=dialog_id)
+    return queryset.order_by()
+
+
+def get_totals(since=None, until=None, dialog_id=None):
+    """
+    Message, outgoing, reply and media totals and the number of active chats and days
+    """
+    totals = _scoped(ChatDailyStats, since, until, dialog_id).aggregate(
+        messages=Coalesce(Sum('message_count'), 0),
+        outgoing=Coalesce(Sum('outgoing_count'), 0),
+        replies=Coalesce(Sum('reply_count'), 0),
+        media=Coalesce(Sum('media_count'), 0),
+        chats=Count('dialog_id', distinct=True),
+        days=Count('day', distinct=True),
+    )
+    return totals
+
+
+def get_daily(since=None, until=None, dialog_id=None):
+    """
+    Message and outgoing counts per day
+    """
+    return list(_scoped(ChatDailyStats, since, until, dialog_id)
+                .values('day')
+                .annotate(messages=Sum('message_count'), outgoing=Sum('outgoing_count'))
+                .order_by('day'))
+
+
+def get_top_chats(since=None, until=None, limit=10):
+    """
+    Dialogs with the most messages
+    """
+    return list(_scoped(ChatDailyStats, since, until)
+                .values('dialog__dialog_id', 'dialog__title', 'dialog__name')
+                .annotate(messages=Sum('message_count'), outgoing=Sum('outgoing_count'))
+                .order_by('-messages')[:limit])
+
+
+def get_top_senders(since=None, until=None, dialog_id=None, limit=10):
+    """
+    Senders with the most messages
+    """
+    return list(_scoped(SenderDailyStats, since, until, dialog_id)
+                .values('sender_id')
+                .annotate(messages=Sum('message_count'), sender_name=Max('sender_name'))
+                .order_by('-messages')[:limit])
+
+
+def get_heatmap(since=None, until=None, dialog_id=None):
+    """
+    7x24 matrix of message counts, Monday first, by hour of day
+    """
+    matrix = [[0] * 24 for _ in range(7)]
+    for weekday, counts in _scoped(ChatDailyStats, since, until, dialog_id).values_list('weekday', 'hourly_counts'):
+        row = matrix[weekday - 1]
+        for hour, count in enumerate(counts):
+            row[hour] += count
+    return matrix
+
+
+def get_response_times(since=None, until=None, dialog_id=None):
+    """
+    Reply counts per response time bucket, as {'outgoing': [...], 'incoming': [...]}
+    in RESPONSE_BUCKETS order
+    """
+    result = {'outgoing': [0] * len(RESPONSE_BUCKETS), 'incoming': [0] * len(RESPONSE_BUCKETS)}
+    rows = (_scoped(ResponseTimeStats, since, until, dialog_id)
+            .values('outgoing', 'bucket')
+            .annotate(replies=Sum('reply_count')))
+    for row in rows:
+        result['outgoing' if row['outgoing'] else 'incoming'][row['bucket']] = row['replies']
+    return result
+
+
+def median_bucket(counts):
+    """
+    Label of the response time bucket holding the median reply, or None
+    """
+    total = sum(counts)
+    if not total:
+        return None
+    seen = 0
+    for (label, _), count in zip(RESPONSE_BUCKETS, counts):
+        seen += count
+        if seen * 2 >= total:
+            return label
+
+
+def get_media_mix(since=None, until=None, dialog_id=None):
+    """
+    Media message counts per media type
+    """
+    return list(_scoped(MediaDailyStats, since, until, dialog_id)
+                .values('media_type')
+                .annotate(messages=Sum('message_count'))
+                .order_by('-messages'))
@@ -0,0 +1,226 @@
+"""
+Compressed, seekable on-disk archive of exported message history.
+
+An archive is a directory with:
+
+    dialogs.json            dialog metadata (same shape as get_all_dialogs() items)
+    segments/<id>.gz        messages of one dialog as JSON lines, split into
+                            independent gzip members of up to `segment_size` messages
+    index.bin               fixed-size binary records, one per segment, sorted by
+                            dialog id: (dialog_id, min_id, max_id, byte offset,
+                            byte length, message count)
+
+A segment file is a valid multi-member gzip file, so `zcat` reads it whole.
+ArchiveReader memory-maps the index and decompresses only the segments that
+overlap the requested dialog and message-id range.
+"""
+import gzip
+import json
+import mmap
+import os
+import struct
+from .telegram_client import json_default
+
+INDEX_MAGIC = b'TGARCH01'
+INDEX_RECORD = struct.Struct('<qqqQQI')
+INDEX_FILE = 'index.bin'
+DIALOGS_FILE = 'dialogs.json'
+SEGMENTS_DIR = 'segments'
+
+
+class ArchiveWriter:
+    """
+    Write messages into a new archive directory, one dialog after another.
+    Messages are compressed segment by segment, so memory stays bounded by
+    `segment_size` messages whatever the export size.
+    """
+
+    def __init__(self, path, segment_size=1000, compresslevel=6):
+        if os.path.exists(os.path.join(path, INDEX_FILE)):
+            raise FileExistsError(f"{path} already contains an archive")
+        self.path = path
+        self.segment_size = segment_size
+        self.compresslevel = compresslevel
+        self.message_count = 0
+        self._dialogs = []
+        self._dialog_ids = set()
+        self._index = []
+        self._dialog_id = None
+        self._file = None
+        self._segment = []
+        os.makedirs(os.path.join(path, SEGMENTS_DIR), exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def dialog_count(self):
+        return len(self._dialogs)
+
+    def add(self, dialog, message):
+        """
+        Add a message of `dialog`. A dialog's messages are best added together;
+        if it comes back later, its segment file is appended to.
+        """
+        if dialog['id'] != self._dialog_id:
+            self._finish_dialog()
+            self._dialog_id = dialog['id']
+            if dialog['id'] in self._dialog_ids:
+                # Earlier segments of the dialog are indexed at their offsets, keep them
+                self._file = open(self._segment_path(dialog['id']), 'ab')
+            else:
+                self._dialog_ids.add(dialog['id'])
+                self._dialogs.append(dialog)
+                self._file = open(self._segment_path(dialog['id']), 'wb')
+        self._segment.append(message)
+        if len(self._segment) >= self.segment_size:
+            self._flush_segment()
+
+    def close(self):
+        """
+        Flush the last dialog and write the index and dialog metadata
+        """
+        self._finish_dialog()
+        # Stable sort: segments of a dialog keep their export order
+        self._index.sort(key=lambda record: record[0])
+        index_path = os.path.join(self.path, INDEX_FILE)
+        with open(index_path + '.tmp', 'wb') as f:
+            f.write(INDEX_MAGIC)
+            for record in self._index:
+                f.write(INDEX_RECORD.pack(*record))
+        with open(os.path.join(self.path, DIALOGS_FILE), 'w', encoding='utf-8') as f:
+            json.dump(self._dialogs, f, ensure_ascii=False, default=json_default)
+        # The index is written last, so a partial export is never mistaken for a complete one
+        os.replace(index_path + '.tmp', index_path)
+
+    def _segment_path(self, dialog_id):
+        return os.path.join(self.path, SEGMENTS_DIR, f'{dialog_id}.gz')
+
+    def _flush_segment(self):
+        if not self._segment:
+            return
+        data = '\n'.join(json.dumps(msg, ensure_ascii=False, default=json_default) for msg in self._segment) + '\n'
+        compressed = gzip.compress(data.encode('utf-8'), compresslevel=self.compresslevel)
+        offset = self._file.tell()
+        self._file.write(compressed)
+        ids = [msg['id'] for msg in self._segment]
+        self._index.append((self._dialog_id, min(ids), max(ids), offset, len(compressed), len(self._segment)))
+        self.message_count += len(self._segment)
+        self._segment = []
+
+    def _finish_dialog(self):
+        if self._file is None:
+            return
+        self._flush_segment()
+        self._file.close()
+        self._file = None
+
+
+class ArchiveReader:
+    """
+    Read dialogs and message-id ranges from an archive without
+    decompressing the whole export
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._index_file = open(os.path.join(path, INDEX_FILE), 'rb')
+        if self._index_file.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+            self._index_file.close()
+            raise ValueError(f"{path} is not a message archive")
+        size = os.fstat(self._index_file.fileno()).st_size
+        self._count = (size - len(INDEX_MAGIC)) // INDEX_RECORD.size
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ) if self._count else None
+        self._dialogs = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._index is not None:
+            self._index.close()
+        self._index_file.close()
+
+    def __len__(self):
+        """
+        Number of segments in the archive
+        """
+        return self._count
+
+    def _record(self, position):
+        return INDEX_RECORD.unpack_from(self._index, len(INDEX_MAGIC) + position * INDEX_RECORD.size)
+
+    def _first_segment(self, dialog_id):
+        # Binary search for the first segment of the dialog
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._record(middle)[0] < dialog_id:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def segments(self, dialog_id, min_id=None, max_id=None):
+        """
+        Index records (dialog_id, min_id, max_id, offset, length, count) of the
+        segments of a dialog that overlap the message-id range
+        """
+        position = self._first_segment(dialog_id)
+        while position < self._count:
+            record = self._record(position)
+            if record[0] != dialog_id:
+                break
+            if (min_id is None or record[2] >= min_id) and (max_id is None or record[1] <= max_id):
+                yield record
+            position += 1
+
+    def dialogs(self):
+        """
+        Dialog metadata of all archived dialogs
+        """
+        if self._dialogs is None:
+            with open(os.path.join(self.path, DIALOGS_FILE), encoding='utf-8') as f:
+                self._dialogs = json.load(f)
+        return self._dialogs
+
+    def message_count(self, dialog_id=None):
+        """
+        Number of archived messages, in one dialog or in total
+        """
+        if dialog_id is not None:
+            return sum(record[5] for record in self.segments(dialog_id))
+        return sum(self._record(position)[5] for position in range(self._count))
+
+    def iter_messages(self, dialog_id, min_id=None, max_id=None):
+        """
+        Yield the archived messages of a dialog with min_id <= id <= max_id,
+        in export order
+        """
+        segments = list(self.segments(dialog_id, min_id, max_id))
+        if not segments:
+            return
+        with open(os.path.join(self.path, SEGMENTS_DIR, f'{dialog_id}.gz'), 'rb') as f:
+            for _, first_id, last_id, offset, length, _ in segments:
+                f.seek(offset)
+                data = gzip.decompress(f.read(length)).decode('utf-8')
+                whole = (min_id is None or first_id >= min_id) and (max_id is None or last_id <= max_id)
+                # Not splitlines(): message text keeps U+2028 and friends unescaped
+                for line in data.split('\n'):
+                    if not line:
+                        continue
+                    msg = json.loads(line)
+                    if whole or ((min_id is None or msg['id'] >= min_id) and (max_id is None or msg['id'] <= max_id)):
+                        yield msg
+
+    def get_messages(self, dialog_id, min_id=None, max_id=None):
+        """
+        Archived messages of a dialog as a list, see iter_messages()
+        """
+        return list(self.iter_messages(dialog_id, min_id, max_id))
@@ -0,0 +1,139 @@
+"""
+Per-dialog checkpoints of long-running message exports.
+
+An export records, per dialog, the id of the last message it has written
+(the lowest id when fetching newest first, the highest in a takeout export,
+which runs oldest first) and how many it wrote. A run that is interrupted
+resumes every dialog right after its last written message and skips the
+dialogs it finished. Progress is stored in the ExportCheckpoint table under
+the export's name.
+"""
+from django.db import transaction
+from .models import ExportCheckpoint
+from .telegram_client import MESSAGE_PAGE_SIZE
+
+
+class ExportCheckpoints:
+    """
+    Checkpoints of one named export. `flush` is called before progress is
+    saved, so a checkpoint never gets ahead of the output it describes.
+    """
+
+    def __init__(self, name, save_every=MESSAGE_PAGE_SIZE, flush=None):
+        self.name = name
+        self.save_every = save_every
+        self.flush = flush
+        # dialog id -> [last message id, message count, completed]
+        self._progress = {}
+        self._dirty = set()
+        self._unsaved = 0
+
+    def load(self):
+        """
+        Read the stored progress of the export
+        """
+        rows = (ExportCheckpoint.objects
+                .filter(name=self.name)
+                .values_list('dialog_id', 'last_message_id', 'message_count', 'completed'))
+        self._progress = {dialog_id: [last_id, count, completed] for dialog_id, last_id, count, completed in rows}
+        return self
+
+    def reset(self):
+        """
+        Forget the stored progress, the next run starts from scratch
+        """
+        ExportCheckpoint.objects.filter(name=self.name).delete()
+        self._progress = {}
+        self._dirty.clear()
+        self._unsaved = 0
+
+    def progress(self, dialog_id):
+        """
+        (last written message id, messages written, completed) of a dialog
+        """
+        return tuple(self._progress.get(dialog_id, (0, 0, False)))
+
+    def is_started(self, dialog_id):
+        progress = self._progress.get(dialog_id)
+        return bool(progress and progress[1])
+
+    def is_completed(self, dialog_id):
+        progress = self._progress.get(dialog_id)
+        return bool(progress and progress[2])
+
+    def last_ids(self):
+        """
+        Last written message id per unfinished dialog, where its export resumes
+        """
+        return {dialog_id: last_id for dialog_id, (last_id, _) in self.offsets().items()}
+
+    def offsets(self):
+        """
+        (last written message id, messages written) per unfinished dialog
+        """
+        return {
+            dialog_id: (last_id, count)
+            for dialog_id, (last_id, count, completed) in self._progress.items()
+            if last_id and not completed
+        }
+
+    @property
+    def message_count(self):
+        return sum(count for _, count, _ in self._progress.values())
+
+    def advance(self, dialog_id, message_id):
+        """
+        Record a written message, saving the progress every `save_every` messages
+        """
+        progress = self._progress.setdefault(dialog_id, [0, 0, False])
+        progress[0] = message_id
+        progress[1] += 1
+        self._dirty.add(dialog_id)
+        self._unsaved += 1
+        if self._unsaved >= self.save_every:
+            self.save()
+
+    def advance_page(self, dialog_id, messages):
+        """
+        Record a written page of messages and save the progress
+        """
+        if not messages:
+            return
+        progress = self._progress.setdefault(dialog_id, [0, 0, False])
+        progress[0] = messages[-1]['id']
+        progress[1] += len(messages)
+        self._dirty.add(dialog_id)
+        self.save()
+
+    def complete(self, dialog_id):
+        """
+        Mark a dialog as fully exported
+        """
+        self._progress.setdefault(dialog_id, [0, 0, False])[2] = True
+        self._dirty.add(dialog_id)
+        self.save()
+
+    def save(self):
+        if not self._dirty:
+            return
+        if self.flush:
+            self.flush()
+        objects = [
+            ExportCheckpoint(
+                name=self.name,
+                dialog_id=dialog_id,
+                last_message_id=self._progress[dialog_id][0],
+                message_count=self._progress[dialog_id][1],
+                completed=self._progress[dialog_id][2],
+            )
+            for dialog_id in self._dirty
+        ]
+        with transaction.atomic():
+            ExportCheckpoint.objects.bulk_create(
+                objects,
+                update_conflicts=True,
+                unique_fields=['name', 'dialog_id'],
+                update_fields=['last_message_id', 'message_count', 'completed', 'updated_at'],
+            )
+        self._dirty.clear()
+        self._unsaved = 0
@@ -0,0 +1,147 @@
+"""
+Handlers for incoming Telegram bot updates
+"""
+from django.conf import settings
+import logging
+import threading
+from .services import TelegramBotService, UpdateDeduplicator, UpdateDispatcher
+
+logger = logging.getLogger(__name__)
+
+
+# Command handlers, registered with @command
+COMMAND_HANDLERS = {}
+
+
+def command(name, inline=True):
+    """
+    Register a handler for a bot command.
+    A handler takes the incoming message and returns a list of Bot API calls
+    as (method, params) tuples. If `inline` is True and the handler returns
+    exactly one call, the call is sent back in the webhook response body
+    instead of through a separate outbound request.
+    Register with name=None to handle plain text and unknown commands.
+    """
+    def decorator(func):
+        func.inline = inline
+        COMMAND_HANDLERS[name] = func
+        return func
+    return decorator
+
+
+def _user_name(message):
+    return message.get('from', {}).get('first_name', 'Unknown')
+
+
+def _reply(message, text):
+    return ('sendMessage', {'chat_id': message['chat']['id'], 'text': text})
+
+
+@command('/start')
+def start_command(message):
+    return [_reply(message, f"Hello {_user_name(message)}! This is the ikramov.uz website bot. I'm here to notify you about contact form submissions.")]
+
+
+@command('/help')
+def help_command(message):
+    return [_reply(message, "Available commands:\n/start - Start the bot\n/help - Show this help message\n/status - Check bot status")]
+
+
+@command('/status')
+def status_command(message):
+    return [_reply(message, "Bot is running and ready to receive contact form notifications!")]
+
+
+@command(None)
+def text_message(message):
+    """
+    Fallback for plain text and unknown commands
+    """
+    return [_reply(message, f"Hi {_user_name(message)}! I received your message: '{message.get('text', '')}'")]
+
+
+def get_handler(update_data):
+    """
+    Find the handler for an update, or None if the update is ignored
+    """
+    message = update_data.get('message')
+    if not message:
+        return None, None
+
+    text = message.get('text', '')
+    name = None
+    if text.startswith('/'):
+        # "/start@my_bot payload" -> "/start"
+        name = text.split()[0].split('@')[0]
+    return COMMAND_HANDLERS.get(name, COMMAND_HANDLERS[None]), message
+
+
+def get_inline_reply(update_data):
+    """
+    Return the Bot API call to put in the webhook response body, or None
+    if the update has to be processed in the background
+    """
+    if not settings.TELEGRAM_INLINE_REPLIES:
+        return None
+
+    handler, message = get_handler(update_data)
+    if handler is None or not getattr(handler, 'inline', False):
+        return None
+
+    calls = handler(message)
+    if len(calls) != 1:
+        return None
+
+    method, params = calls[0]
+    return {'method': method, **params}
+
+
+def handle_update(update_data):
+    """
+    Process a single update from Telegram, sending replies through the Bot API
+    """
+    handler, message = get_handler(update_data)
+    if handler is None:
+        return
+
+    bot_service = TelegramBotService()
+    for method, params in handler(message):
+        bot_service.scheduler.call(method, params, timeout=settings.TELEGRAM_SEND_TIMEOUT)
+
+
+# Global dispatcher and deduplicator instances
+_update_dispatcher = None
+_update_deduplicator = None
+_instance_lock = threading.Lock()
+
+
+def get_update_dispatcher():
+    """
+    Get or create the global update dispatcher for this process
+    """
+    global _update_dispatcher
+    if _update_dispatcher is None:
+        with _instance_lock:
+            if _update_dispatcher is None:
+                _update_dispatcher = UpdateDispatcher(
+                    handle_update,
+                    workers=settings.TELEGRAM_UPDATE_WORKERS,
+                    queue_size=settings.TELEGRAM_UPDATE_QUEUE_SIZE,
+                    put_timeout=settings.TELEGRAM_UPDATE_QUEUE_TIMEOUT
+                )
+    return _update_dispatcher
+
+
+def get_update_deduplicator():
+    """
+    Get or create the global update deduplicator for this process
+    """
+    global _update_deduplicator
+    if _update_deduplicator is None:
+        with _instance_lock:
+            if _update_deduplicator is None:
+                _update_deduplicator = UpdateDeduplicator(
+                    cache_size=settings.TELEGRAM_UPDATE_DEDUP_CACHE_SIZE,
+                    window=settings.TELEGRAM_UPDATE_DEDUP_WINDOW
+                )
+    return _update_deduplicator
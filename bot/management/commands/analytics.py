@@ -0,0 +1,188 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from bot import analytics, mirror
+from bot.telegram_client import parse_date_bound
+from datetime import timedelta
+import json
+import time
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+HEATMAP_SHADES = ' ░▒▓█'
+
+
+class Command(BaseCommand):
+    help = 'Activity analytics over the local mirror (filled by sync_messages), from incrementally updated rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--report',
+            type=str,
+            default='all',
+            choices=['all', 'daily', 'chats', 'senders', 'heatmap', 'response', 'media'],
+            help='Report to show (default: all)'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Report on the last N days, 0 for the whole history (default: 30)'
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='First day to report on (YYYY-MM-DD), overrides --days'
+        )
+        parser.add_argument(
+            '--until',
+            type=str,
+            help='Last day to report on (YYYY-MM-DD, inclusive)'
+        )
+        parser.add_argument(
+            '--dialog',
+            type=int,
+            help='Only report on this dialog (peer ID)'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='Number of chats and senders to list (default: 10)'
+        )
+        parser.add_argument(
+            '--format',
+            type=str,
+            default='text',
+            choices=['text', 'json'],
+            help='Output format: text or json'
+        )
+        parser.add_argument(
+            '--no-refresh',
+            action='store_true',
+            help='Report from the rollups as they are, without picking up newly synced messages'
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute the rollups from all mirrored messages'
+        )
+
+    def handle(self, *args, **options):
+        report = options['report']
+        dialog_id = options['dialog']
+
+        if not mirror.has_data():
+            self.stdout.write(self.style.WARNING('The mirror is empty. Run sync_messages first.'))
+            return
+
+        try:
+            since = parse_date_bound(options['since'])
+            until = parse_date_bound(options['until'])
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+        since = since.date() if since else None
+        until = until.date() if until else None
+        if since is None and options['days'] > 0:
+            since = (until or timezone.localdate()) - timedelta(days=options['days'] - 1)
+
+        # Progress goes to stderr so --format json stays parseable
+        if options['rebuild'] or not options['no_refresh']:
+            started = time.monotonic()
+            dialogs, days = analytics.refresh(rebuild=options['rebuild'])
+            if days:
+                self.stderr.write(
+                    f'Refreshed {days} days of {dialogs} chats in {time.monotonic() - started:.1f}s'
+                )
+
+        started = time.monotonic()
+        data = {'since': since, 'until': until, 'dialog': dialog_id}
+        data['totals'] = analytics.get_totals(since, until, dialog_id)
+        if report in ('all', 'daily'):
+            data['daily'] = analytics.get_daily(since, until, dialog_id)
+        if report in ('all', 'chats') and not dialog_id:
+            data['chats'] = analytics.get_top_chats(since, until, options['top'])
+        if report in ('all', 'senders'):
+            data['senders'] = analytics.get_top_senders(since, until, dialog_id, options['top'])
+        if report in ('all', 'heatmap'):
+            data['heatmap'] = analytics.get_heatmap(since, until, dialog_id)
+        if report in ('all', 'response'):
+            data['response_times'] = analytics.get_response_times(since, until, dialog_id)
+        if report in ('all', 'media'):
+            data['media'] = analytics.get_media_mix(since, until, dialog_id)
+        elapsed = (time.monotonic() - started) * 1000
+
+        if options['format'] == 'json':
+            if 'response_times' in data:
+                data['response_buckets'] = [label for label, _ in analytics.RESPONSE_BUCKETS]
+            self.stdout.write(json.dumps(data, indent=2, ensure_ascii=False, default=str))
+            return
+
+        self._print_report(data)
+        self.stdout.write(self.style.SUCCESS(f'Report computed in {elapsed:.1f} ms'))
+
+    def _print_report(self, data):
+        """Print the collected reports"""
+        totals = data['totals']
+        period = f"{data['since'] or 'start'} - {data['until'] or 'today'}"
+        self.stdout.write("\n" + "=" * 80)
+        self.stdout.write(self.style.SUCCESS(f"📊 Activity Analytics ({period})"))
+        self.stdout.write("=" * 80)
+        self.stdout.write(f"  Messages: {totals['messages']} ({totals['outgoing']} sent) in {totals['chats']} chats "
+                          f"over {totals['days']} days")
+        self.stdout.write(f"  Replies: {totals['replies']}, with media: {totals['media']}")
+
+        if data.get('daily'):
+            self.stdout.write("\n" + self.style.SUCCESS("📅 Daily Messages:"))
+            peak = max(row['messages'] for row in data['daily']) or 1
+            for row in data['daily']:
+                bar = '█' * max(1, round(row['messages'] / peak * 40))
+                self.stdout.write(
+                    f"  {row['day']:%Y-%m-%d}  {row['messages']:>6} ({row['outgoing']:>5} sent)  {bar}"
+                )
+
+        if data.get('chats'):
+            self.stdout.write("\n" + self.style.SUCCESS("💬 Top Chats:"))
+            for row in data['chats']:
+                title = row['dialog__title'] or row['dialog__name'] or f"Chat {row['dialog__dialog_id']}"
+                self.stdout.write(f"  {title[:48]:<50} {row['messages']:>8} ({row['outgoing']} sent)")
+
+        if data.get('senders'):
+            self.stdout.write("\n" + self.style.SUCCESS("👤 Top Senders:"))
+            for row in data['senders']:
+                name = row['sender_name'] or (f"ID {row['sender_id']}" if row['sender_id'] else 'Channel posts')
+                self.stdout.write(f"  {name[:48]:<50} {row['messages']:>8}")
+
+        if 'heatmap' in data:
+            self._print_heatmap(data['heatmap'])
+
+        if 'response_times' in data:
+            self.stdout.write("\n" + self.style.SUCCESS("⏱️  Response Times:"))
+            labels = [label for label, _ in analytics.RESPONSE_BUCKETS]
+            self.stdout.write(f"  {'':<10}" + ''.join(f"{label:>9}" for label in labels) + f"{'median':>9}")
+            for direction in ('outgoing', 'incoming'):
+                counts = data['response_times'][direction]
+                median = analytics.median_bucket(counts) or '-'
+                name = 'You' if direction == 'outgoing' else 'Others'
+                self.stdout.write(f"  {name:<10}" + ''.join(f"{count:>9}" for count in counts) + f"{median:>9}")
+
+        if data.get('media'):
+            self.stdout.write("\n" + self.style.SUCCESS("🖼️  Media Mix:"))
+            total = sum(row['messages'] for row in data['media']) or 1
+            for row in data['media']:
+                self.stdout.write(
+                    f"  {row['media_type']:<30} {row['messages']:>8} {row['messages'] / total * 100:>6.1f}%"
+                )
+
+        self.stdout.write("=" * 80 + "\n")
+
+    def _print_heatmap(self, matrix):
+        """Print messages by weekday and hour of day as shaded cells"""
+        self.stdout.write("\n" + self.style.SUCCESS("🕒 Hour of Day Heatmap:"))
+        peak = max(max(row) for row in matrix) or 1
+        self.stdout.write("       " + ''.join(f"{hour:<3}" for hour in range(0, 24, 3)).ljust(24))
+        for weekday, row in zip(WEEKDAYS, matrix):
+            cells = ''.join(
+                HEATMAP_SHADES[min(len(HEATMAP_SHADES) - 1, -(-count * (len(HEATMAP_SHADES) - 1) // peak))]
+                for count in row
+            )
+            self.stdout.write(f"  {weekday}  {cells}  {sum(row):>8}")
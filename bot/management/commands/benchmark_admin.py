@@ -0,0 +1,138 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment
+from django.utils import timezone
+from bot.models import ContactMessage
+from bot.services import ContactOutbox
+from datetime import timedelta
+import random
+import re
+import time
+from urllib.parse import urlencode
+
+# Seeded rows are recognised by this address domain, see --cleanup
+SEED_DOMAIN = 'benchmark.invalid'
+BENCHMARK_USER = 'admin-benchmark'
+CHANGELIST_URL = '/admin/bot/contactmessage/'
+
+
+class Command(BaseCommand):
+    help = 'Time the ContactMessage admin changelist and outbox query, optionally on seeded rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            metavar='ROWS',
+            help='First add ROWS synthetic contact messages, e.g. 1000000 (default: none)'
+        )
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=5,
+            help='Requests per measurement, the best one is reported (default: 5)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows per bulk insert when seeding (default: 5000)'
+        )
+        parser.add_argument(
+            '--cleanup',
+            action='store_true',
+            help=f'Delete the seeded rows (email @{SEED_DOMAIN}) and exit'
+        )
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            deleted, _ = ContactMessage.objects.filter(email__endswith=f'@{SEED_DOMAIN}').delete()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} seeded messages'))
+            return
+
+        if options['seed']:
+            self._seed(options['seed'], options['batch_size'])
+
+        total = ContactMessage.objects.count()
+        if not total:
+            self.stdout.write(self.style.WARNING('No contact messages to benchmark. Use --seed 1000000.'))
+            return
+
+        setup_test_environment()
+        user, _ = User.objects.get_or_create(
+            username=BENCHMARK_USER, defaults={'is_staff': True, 'is_superuser': True}
+        )
+        client = Client()
+        client.force_login(user)
+        try:
+            self._run(client, total, options['runs'])
+        finally:
+            user.delete()
+
+    def _seed(self, rows, batch_size):
+        """Insert `rows` messages, one every 150 seconds up to now, 2% undelivered"""
+        started = time.monotonic()
+        start = timezone.now() - timedelta(seconds=rows * 150)
+        rng = random.Random(3)
+        batch = []
+        for i in range(rows):
+            created_at = start + timedelta(seconds=i * 150 + rng.randrange(100))
+            batch.append(ContactMessage(
+                name=f'Visitor {i}',
+                email=f'user{i % 50000}@{SEED_DOMAIN}',
+                subject=f'Subject {i}',
+                message='Hello',
+                created_at=created_at,
+                sent_to_telegram=rng.random() > 0.02,
+                next_attempt_at=created_at,
+            ))
+            if len(batch) >= batch_size:
+                ContactMessage.objects.bulk_create(batch, batch_size=batch_size)
+                batch = []
+        ContactMessage.objects.bulk_create(batch, batch_size=batch_size)
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.stdout.write(self.style.SUCCESS(f'Seeded {rows} messages in {time.monotonic() - started:.0f}s'))
+
+    def _time(self, runs, func):
+        best = None
+        for _ in range(runs):
+            started = time.monotonic()
+            result = func()
+            elapsed = (time.monotonic() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def _request(self, client, runs, label, path):
+        elapsed, response = self._time(runs, lambda: client.get(path))
+        if response.status_code != 200:
+            self.stdout.write(self.style.ERROR(f'  {label:<40} HTTP {response.status_code}'))
+        else:
+            self.stdout.write(f'  {label:<40} {elapsed:8.1f} ms')
+        return response
+
+    def _run(self, client, total, runs):
+        self.stdout.write(self.style.SUCCESS(f'Changelist over {total} messages (best of {runs}):'))
+        first = self._request(client, runs, 'first page', CHANGELIST_URL)
+
+        older = re.search(r'href="(\?after=[^"]+)"', first.content.decode())
+        if older:
+            self._request(client, runs, 'next page', CHANGELIST_URL + older.group(1).replace('&amp;', '&'))
+        middle = ContactMessage.objects.order_by('-created_at', '-id')[total // 2]
+        cursor = urlencode({'after': f'{middle.created_at.isoformat()}_{middle.pk}'})
+        self._request(client, runs, f'page at row {total // 2}', f'{CHANGELIST_URL}?{cursor}')
+        self._request(client, runs, 'undelivered filter', f'{CHANGELIST_URL}?sent_to_telegram__exact=0')
+        since = urlencode({'created_at__gte': (timezone.now() - timedelta(days=7)).isoformat()})
+        self._request(client, runs, 'date filter (last 7 days)', f'{CHANGELIST_URL}?{since}')
+        email = ContactMessage.objects.values_list('email', flat=True).first()
+        self._request(client, runs, 'one sender (?email=)', f'{CHANGELIST_URL}?{urlencode({"email": email})}')
+        self._request(client, runs, 'search', f'{CHANGELIST_URL}?q={email.split("@")[0]}')
+        self._request(client, runs, 'sorted by column (numbered pages)', f'{CHANGELIST_URL}?o=1')
+
+        outbox = ContactOutbox()
+        elapsed, _ = self._time(runs, lambda: list(outbox.pending()[:50]))
+        self.stdout.write(f'  {"outbox pending() batch":<40} {elapsed:8.1f} ms')
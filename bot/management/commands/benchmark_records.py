@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+from bot.telegram_client import TelegramClient
+from types import SimpleNamespace
+import datetime as dt
+import gc
+import time
+import tracemalloc
+
+
+class Command(BaseCommand):
+    help = 'Measure the memory held per message as MessageRecords versus plain dicts (no Telegram connection)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--messages',
+            type=int,
+            default=200000,
+            help='Number of synthetic messages to convert (default: 200000)'
+        )
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        if count <= 0:
+            self.stdout.write(self.style.ERROR('--messages must be positive.'))
+            return
+
+        # Telethon-like messages from a few senders, built before measuring so only the results are counted.
+        # Text is shared with the Telethon message either way, so only the per-message overhead differs.
+        senders = [SimpleNamespace(first_name=f'Sender {i}', last_name=None) for i in range(50)]
+        start = dt.datetime(2024, 1, 1, tzinfo=dt.timezone.utc)
+        messages = [
+            SimpleNamespace(
+                id=i,
+                date=start + dt.timedelta(seconds=i),
+                text='',
+                sender_id=i % 50,
+                sender=senders[i % 50],
+                is_reply=False,
+                reply_to=None,
+                media=None,
+            )
+            for i in range(count)
+        ]
+
+        def records():
+            return [TelegramClient._message_to_record(message) for message in messages]
+
+        def dicts():
+            return [TelegramClient._message_to_record(message).to_dict() for message in messages]
+
+        self.stdout.write(self.style.SUCCESS(f'Memory held by {count} converted messages:'))
+        results = {}
+        for label, build in (('dict', dicts), ('MessageRecord', records)):
+            held, elapsed = self._measure(build)
+            results[label] = held
+            self.stdout.write(f'  {label:<15} {held / count:8.1f} bytes/message  '
+                              f'{held / 1024 / 1024:8.1f} MiB  built in {elapsed:.2f}s')
+        self.stdout.write(f"  Records use {results['dict'] / results['MessageRecord']:.1f}x less memory than dicts")
+
+    @staticmethod
+    def _measure(build):
+        """Bytes still allocated while the built list is alive, and the build time"""
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before, _ = tracemalloc.get_traced_memory()
+            started = time.monotonic()
+            items = build()
+            elapsed = time.monotonic() - started
+            gc.collect()
+            after, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        del items
+        return after - before, elapsed
@@ -0,0 +1,156 @@
+from django.core.management.base import BaseCommand
+from bot.media import MediaDownloader
+from bot.telegram_client import MEDIA_FILTERS, build_message_filters, get_telegram_client
+from bot import mirror
+import time
+
+
+class Command(BaseCommand):
+    help = 'Download photos, videos and documents from your chats into MEDIA_ROOT (deduplicated, resumable)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'peer_id',
+            type=int,
+            nargs='*',
+            help='Peer IDs to download from (default: all dialogs of --type)'
+        )
+        parser.add_argument(
+            '--type',
+            type=str,
+            choices=['all', 'channels', 'supergroups', 'groups', 'chats'],
+            default='all',
+            help='Filter dialogs by type when no peer ID is given'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=100,
+            help='Number of recent messages to scan per chat, 0 for all (default: 100)'
+        )
+        parser.add_argument(
+            '--media',
+            type=str,
+            choices=list(MEDIA_FILTERS),
+            help='Only download this kind of media'
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='Only messages from this date on (YYYY-MM-DD or ISO datetime)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='Number of files to download in parallel (default: 4)'
+        )
+        parser.add_argument(
+            '--max-size',
+            type=int,
+            default=0,
+            help='Skip files larger than this many megabytes, 0 for no limit (default: 0)'
+        )
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help='Fetch the dialog list from Telegram instead of the local snapshot'
+        )
+
+    def handle(self, *args, **options):
+        limit = options['limit'] or None
+        filter_type = options['type']
+
+        client = get_telegram_client()
+
+        if not client.is_configured():
+            self.stdout.write(
+                self.style.ERROR('Telegram client is not properly configured. Please check your .env file.')
+            )
+            return
+
+        if not client.phone_number:
+            self.stdout.write(
+                self.style.ERROR(
+                    '\n⚠️  ERROR: To download media, you need to use a USER account.\n'
+                    'Please add TELEGRAM_PHONE_NUMBER to your .env file.\n'
+                )
+            )
+            return
+
+        try:
+            filters = build_message_filters(since=options['since'], media=options['media'])
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        if options['peer_id']:
+            dialogs = [{'id': peer_id, 'title': str(peer_id)} for peer_id in options['peer_id']]
+        else:
+            dialogs = mirror.get_dialog_snapshot(client, refresh=options['refresh'])
+            if filter_type != 'all':
+                type_map = {
+                    'channels': 'channel',
+                    'supergroups': 'supergroup',
+                    'groups': 'group',
+                    'chats': 'user'
+                }
+                dialogs = [d for d in dialogs if d.get('type') == type_map.get(filter_type)]
+
+        if not dialogs:
+            self.stdout.write(self.style.WARNING('No dialogs found.'))
+            return
+
+        try:
+            downloader = MediaDownloader(
+                client,
+                concurrency=options['concurrency'],
+                max_size=options['max_size'] * 1024 * 1024 or None,
+                progress=self._progress,
+            )
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Downloading media from {len(dialogs)} dialogs into {downloader.root}...'
+        ))
+
+        started = time.monotonic()
+        try:
+            for index, dialog in enumerate(dialogs, 1):
+                title = dialog.get('title') or dialog.get('name') or f"Chat {dialog.get('id')}"
+                self.stdout.write(f"[{index}/{len(dialogs)}] {title}")
+                try:
+                    downloader.download_dialog(dialog['id'], limit=limit, filters=filters)
+                except Exception as e:
+                    self.stdout.write(self.style.WARNING(f"  ⚠️  {str(e)}"))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nInterrupted, run again to resume.'))
+
+        self._print_summary(downloader.stats, time.monotonic() - started)
+
+    def _progress(self, status, dialog_id, message, detail):
+        if status == 'downloaded':
+            self.stdout.write(f"  ⬇️  {message.id}: {detail}")
+        elif status == 'deduplicated':
+            self.stdout.write(f"  🔗 {message.id}: {detail} (already stored)")
+        elif status == 'too_large':
+            self.stdout.write(f"  ⏭️  {message.id}: skipped, {detail / 1024 / 1024:.1f} MB")
+        elif status == 'failed':
+            self.stdout.write(self.style.WARNING(f"  ⚠️  {message.id}: {detail}"))
+
+    def _print_summary(self, stats, elapsed):
+        megabytes = stats.get('bytes', 0) / 1024 / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f"\nDownloaded {stats.get('downloaded', 0)} files ({megabytes:.1f} MB) in {elapsed:.1f}s, "
+            f"linked {stats.get('deduplicated', 0)} duplicates, "
+            f"{stats.get('skipped', 0)} already stored"
+        ))
+        if stats.get('resumed'):
+            self.stdout.write(f"Resumed {stats['resumed']} interrupted downloads")
+        if stats.get('too_large'):
+            self.stdout.write(f"Skipped {stats['too_large']} files over --max-size")
+        if stats.get('failed'):
+            self.stdout.write(self.style.WARNING(
+                f"{stats['failed']} downloads failed and will be retried on the next run"
+            ))
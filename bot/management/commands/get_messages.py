@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
-from bot.telegram_client import get_telegram_client
+from bot.telegram_client import MEDIA_FILTERS, build_message_filters, get_telegram_client, json_default
+from bot import mirror
+from bot.checkpoints import ExportCheckpoints
 import json
 from datetime import datetime
 
@@ -23,8 +25,8 @@ class Command(BaseCommand):
             '--format',
             type=str,
             default='table',
-            choices=['table', 'json', 'simple'],
-            help='Output format: table, json, or simple'
+            choices=['table', 'json', 'jsonl', 'simple'],
+            help='Output format: table, json, jsonl (one message per line, streamed), or simple'
         )
         parser.add_argument(
             '--offset-id',
@@ -32,23 +34,68 @@ class Command(BaseCommand):
             default=0,
             help='Offset message ID (to get messages before this ID)'
         )
+        parser.add_argument(
+            '--source',
+            type=str,
+            default='telegram',
+            choices=['telegram', 'mirror'],
+            help='Read from Telegram or from the local mirror filled by sync_messages'
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='Only messages from this date on (YYYY-MM-DD or ISO datetime)'
+        )
+        parser.add_argument(
+            '--until',
+            type=str,
+            help='Only messages before this date (YYYY-MM-DD or ISO datetime)'
+        )
+        parser.add_argument(
+            '--from',
+            dest='from_user',
+            type=str,
+            help='Only messages from this sender (user ID, @username, or "me")'
+        )
+        parser.add_argument(
+            '--search',
+            type=str,
+            help='Only messages containing this text'
+        )
+        parser.add_argument(
+            '--media',
+            type=str,
+            choices=list(MEDIA_FILTERS),
+            help='Only messages with this kind of media'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue an interrupted jsonl export from Telegram after its last written page '
+                 '(append the output; use the same options as the interrupted run)'
+        )
 
     def handle(self, *args, **options):
         peer_id = options['peer_id']
         limit = options['limit']
         output_format = options['format']
         offset_id = options['offset_id']
+        source = options['source']
+        
+        if options['resume'] and not (source == 'telegram' and output_format == 'jsonl'):
+            self.stdout.write(self.style.ERROR('--resume continues a jsonl export from Telegram.'))
+            return
         
         client = get_telegram_client()
         
-        if not client.is_configured():
+        if source == 'telegram' and not client.is_configured():
             self.stdout.write(
                 self.style.ERROR('Telegram client is not properly configured. Please check your .env file.')
             )
             return
         
         # Check if phone number is set
-        if not client.phone_number:
+        if source == 'telegram' and not client.phone_number:
             self.stdout.write(
                 self.style.ERROR(
                     '\n⚠️  ERROR: To get messages, you need to use a USER account, not a bot account.\n'
@@ -57,6 +104,18 @@ class Command(BaseCommand):
             )
             return
         
+        try:
+            filters = build_message_filters(
+                since=options['since'],
+                until=options['until'],
+                from_user=options['from_user'],
+                search=options['search'],
+                media=options['media'],
+            )
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+        
         # Convert peer_id to integer (handle negative IDs for groups/channels)
         try:
             if peer_id.startswith('-'):
@@ -69,11 +128,24 @@ class Command(BaseCommand):
             )
             return
         
-        self.stdout.write(self.style.SUCCESS(f'Fetching messages from peer ID: {peer_id_int}'))
-        self.stdout.write(self.style.WARNING(f'Limit: {limit} messages'))
+        # Keep stdout clean for the JSON lines
+        log = self.stderr if output_format == 'jsonl' else self.stdout
+        log.write(f'Fetching messages from peer ID: {peer_id_int}', style_func=self.style.SUCCESS)
+        log.write(f'Limit: {limit} messages', style_func=self.style.WARNING)
+        
+        if output_format == 'jsonl':
+            if source == 'mirror':
+                self._stream_jsonl(mirror.iter_messages(peer_id_int, limit=limit, offset_id=offset_id, filters=filters))
+            else:
+                self._stream_pages(self._iter_checkpointed(client, peer_id_int, limit, offset_id, filters,
+                                                           options['resume']))
+            return
         
         # Get messages
-        messages = client.get_messages(peer_id_int, limit=limit, offset_id=offset_id)
+        if source == 'mirror':
+            messages = mirror.get_messages(peer_id_int, limit=limit, offset_id=offset_id, filters=filters)
+        else:
+            messages = client.get_messages(peer_id_int, limit=limit, offset_id=offset_id, filters=filters)
         
         if not messages:
             self.stdout.write(self.style.WARNING('No messages found.'))
@@ -81,7 +153,7 @@ class Command(BaseCommand):
         
         # Display messages
         if output_format == 'json':
-            self.stdout.write(json.dumps(messages, indent=2, ensure_ascii=False, default=str))
+            self.stdout.write(json.dumps(messages, indent=2, ensure_ascii=False, default=json_default))
         elif output_format == 'simple':
             self._print_simple(messages)
         else:  # table format
@@ -91,6 +163,44 @@ class Command(BaseCommand):
             self.style.SUCCESS(f'\nTotal: {len(messages)} messages retrieved')
         )
     
+    def _iter_checkpointed(self, client, peer_id, limit, offset_id, filters, resume):
+        """Message pages from Telegram, saving a checkpoint after each written page"""
+        checkpoints = ExportCheckpoints(f'get_messages:{peer_id}', flush=self.stdout.flush)
+        if resume:
+            checkpoints.load()
+            _, count, completed = checkpoints.progress(peer_id)
+            if completed:
+                self.stderr.write('This export has already finished.', style_func=self.style.WARNING)
+            else:
+                self.stderr.write(f'Resuming export after {count} exported messages', style_func=self.style.SUCCESS)
+        else:
+            checkpoints.reset()
+        
+        return client.iter_message_pages(peer_id, limit=limit or None, offset_id=offset_id, filters=filters,
+                                         checkpoints=checkpoints)
+    
+    def _stream_pages(self, pages):
+        """Write message pages as JSON lines, each page in one write so it is never left half written"""
+        count = 0
+        try:
+            for page in pages:
+                self.stdout.write('\n'.join(json.dumps(msg, ensure_ascii=False, default=json_default) for msg in page))
+                count += len(page)
+        except Exception as e:
+            self.stderr.write(f'Error fetching messages: {str(e)}')
+        self.stderr.write(f'Total: {count} messages retrieved', style_func=self.style.SUCCESS)
+    
+    def _stream_jsonl(self, messages):
+        """Write messages as JSON lines while they are being fetched"""
+        count = 0
+        try:
+            for msg in messages:
+                self.stdout.write(json.dumps(msg, ensure_ascii=False, default=json_default))
+                count += 1
+        except Exception as e:
+            self.stderr.write(f'Error fetching messages: {str(e)}')
+        self.stderr.write(f'Total: {count} messages retrieved', style_func=self.style.SUCCESS)
+    
     def _print_simple(self, messages):
         """Print messages in simple format"""
         for msg in messages:
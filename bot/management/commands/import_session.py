@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from bot.models import TelethonSession, TelethonSessionEntity
+from bot.telegram_client import get_telegram_client
+import os
+import sqlite3
+
+
+class Command(BaseCommand):
+    help = 'Copy Telethon .session files into the database session backend (TELEGRAM_SESSION_BACKEND=database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names',
+            nargs='*',
+            help='Session names to import (default: the configured bot and user sessions)'
+        )
+        parser.add_argument(
+            '--overwrite',
+            action='store_true',
+            help='Replace sessions that are already in the database'
+        )
+
+    def handle(self, *args, **options):
+        client = get_telegram_client()
+        names = options['names'] or [client.session_name, client.user_session_name]
+
+        for name in names:
+            path = name if name.endswith('.session') else f'{name}.session'
+            name = path[:-len('.session')]
+            if not os.path.exists(path):
+                self.stdout.write(self.style.WARNING(f'{path} not found, skipping'))
+                continue
+            if TelethonSession.objects.filter(name=name).exists() and not options['overwrite']:
+                self.stdout.write(self.style.WARNING(f'{name} is already in the database, use --overwrite to replace it'))
+                continue
+
+            conn = sqlite3.connect(path)
+            try:
+                session = conn.execute('select dc_id, server_address, port, auth_key, takeout_id from sessions').fetchone()
+                entities = conn.execute('select id, hash, username, phone, name from entities').fetchall()
+                states = conn.execute('select id, pts, qts, date, seq from update_state').fetchall()
+            except sqlite3.Error as e:
+                self.stdout.write(self.style.ERROR(f'Could not read {path}: {str(e)}'))
+                continue
+            finally:
+                conn.close()
+
+            if not session:
+                self.stdout.write(self.style.WARNING(f'{path} has no login, skipping'))
+                continue
+
+            dc_id, server_address, port, auth_key, takeout_id = session
+            with transaction.atomic():
+                TelethonSession.objects.filter(name=name).delete()
+                row = TelethonSession.objects.create(
+                    name=name,
+                    dc_id=dc_id,
+                    server_address=server_address,
+                    port=port,
+                    auth_key=auth_key,
+                    takeout_id=takeout_id,
+                    update_states={str(entity_id): [pts, qts, int(date), seq] for entity_id, pts, qts, date, seq in states},
+                )
+                TelethonSessionEntity.objects.bulk_create(
+                    [
+                        TelethonSessionEntity(session=row, entity_id=entity_id, access_hash=access_hash,
+                                              username=username, phone=phone, name=entity_name)
+                        for entity_id, access_hash, username, phone, entity_name in entities
+                    ],
+                    batch_size=500,
+                )
+
+            self.stdout.write(self.style.SUCCESS(f'Imported {name}: DC {dc_id}, {len(entities)} entities'))
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
-from bot.telegram_client import get_telegram_client
+from bot.telegram_client import get_telegram_client, json_default
+from bot import mirror
 import json
 
 
@@ -11,8 +12,8 @@ class Command(BaseCommand):
             '--format',
             type=str,
             default='table',
-            choices=['table', 'json', 'simple'],
-            help='Output format: table, json, or simple'
+            choices=['table', 'json', 'jsonl', 'simple'],
+            help='Output format: table, json, jsonl (one item per line, streamed), or simple'
         )
         parser.add_argument(
             '--type',
@@ -21,6 +22,11 @@ class Command(BaseCommand):
             default='all',
             help='Filter by type: channel, supergroup, group, or all'
         )
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help='Fetch the dialog list from Telegram instead of the local snapshot'
+        )
 
     def handle(self, *args, **options):
         output_format = options['format']
@@ -48,10 +54,14 @@ class Command(BaseCommand):
             )
             return
         
+        if output_format == 'jsonl':
+            self._stream_jsonl(client, filter_type, options['refresh'])
+            return
+        
         self.stdout.write(self.style.SUCCESS('Connecting as user account...'))
         self.stdout.write(self.style.WARNING('Note: If this is your first time, you may be asked for a verification code.'))
         
-        channels = client.get_joined_channels()
+        channels = client.get_joined_channels(mirror.get_dialog_snapshot(client, refresh=options['refresh']))
         
         if not channels:
             self.stdout.write(self.style.WARNING('No channels or groups found.'))
@@ -71,7 +81,7 @@ class Command(BaseCommand):
         self._print_statistics(counts, filter_type)
         
         if output_format == 'json':
-            self.stdout.write(json.dumps(channels, indent=2, ensure_ascii=False))
+            self.stdout.write(json.dumps(channels, indent=2, ensure_ascii=False, default=json_default))
         elif output_format == 'simple':
             for channel in channels:
                 username = f"@{channel['username']}" if channel['username'] else "No username"
@@ -83,6 +93,25 @@ class Command(BaseCommand):
             self.style.SUCCESS(f'\nTotal: {len(channels)} {"item" if len(channels) == 1 else "items"} found')
         )
     
+    def _stream_jsonl(self, client, filter_type, refresh):
+        """Write channels as JSON lines while the dialogs are being read"""
+        if refresh or not mirror.is_snapshot_fresh():
+            self.stderr.write('Connecting as user account...', style_func=self.style.SUCCESS)
+            dialogs = client.iter_dialogs()
+        else:
+            dialogs = mirror.iter_dialogs()
+        
+        count = 0
+        try:
+            for dialog in dialogs:
+                if dialog['type'] == 'user' or filter_type not in ('all', dialog['type']):
+                    continue
+                self.stdout.write(json.dumps(dialog, ensure_ascii=False, default=json_default))
+                count += 1
+        except Exception as e:
+            self.stderr.write(f'Error fetching dialogs: {str(e)}')
+        self.stderr.write(f'Total: {count} {"item" if count == 1 else "items"} found', style_func=self.style.SUCCESS)
+    
     def _print_statistics(self, counts, filter_type):
         """Print statistics by type for channels and groups"""
         self.stdout.write("\n" + "=" * 60)
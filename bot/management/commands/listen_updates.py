@@ -0,0 +1,121 @@
+from django.core.management.base import BaseCommand
+from asgiref.sync import sync_to_async
+from telethon import events
+from bot.telegram_client import get_telegram_client
+from bot import mirror
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Keep account statistics and dialog activity up to date from the live update stream'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--heartbeat',
+            type=int,
+            default=60,
+            help='Seconds between heartbeats that tell telegram_stats the counters are live (default: 60)'
+        )
+
+    def handle(self, *args, **options):
+        self.heartbeat = max(1, options['heartbeat'])
+        self.client = get_telegram_client()
+
+        if not self.client.is_configured():
+            self.stdout.write(
+                self.style.ERROR('Telegram client is not properly configured. Please check your .env file.')
+            )
+            return
+
+        if not self.client.phone_number:
+            self.stdout.write(
+                self.style.ERROR(
+                    '\n⚠️  ERROR: To listen for updates, you need to use a USER account.\n'
+                    'Please add TELEGRAM_PHONE_NUMBER to your .env file.\n'
+                )
+            )
+            return
+
+        # Counters drift while nobody is listening, so start from a fresh snapshot
+        self.stdout.write(self.style.SUCCESS('Taking a dialog snapshot...'))
+        dialogs = mirror.get_dialog_snapshot(self.client, refresh=True)
+        if not dialogs:
+            self.stdout.write(self.style.ERROR('Could not fetch dialogs.'))
+            return
+
+        self.user_id = self.client.get_current_user_id()
+        mirror.save_user_id(self.user_id)
+        mirror.listener_heartbeat()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Listening for updates on {len(dialogs)} dialogs (Ctrl+C to stop)...'
+        ))
+        try:
+            self.client.connection.run(self._listen())
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nStopping listener...'))
+
+    async def _listen(self):
+        telethon_client = await self.client.ensure_connected(use_user_account=True)
+        if not telethon_client:
+            logger.error("Could not connect the user account, listener not started")
+            return
+
+        telethon_client.add_event_handler(self._on_new_message, events.NewMessage())
+        telethon_client.add_event_handler(self._on_chat_action, events.ChatAction())
+        telethon_client.add_event_handler(self._on_message_read, events.MessageRead(inbox=True))
+
+        heartbeat = asyncio.ensure_future(self._heartbeat())
+        try:
+            while True:
+                await telethon_client.run_until_disconnected()
+                telethon_client = await self.client.ensure_connected(use_user_account=True)
+                if not telethon_client:
+                    logger.error("Lost the Telegram connection, stopping listener")
+                    return
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self):
+        while True:
+            await sync_to_async(mirror.listener_heartbeat)()
+            await asyncio.sleep(self.heartbeat)
+
+    async def _add_chat(self, event):
+        chat = await event.get_chat()
+        if chat is None:
+            return False
+        return await sync_to_async(mirror.add_dialog)(self.client.entity_to_dialog(chat))
+
+    async def _on_new_message(self, event):
+        try:
+            record_message = sync_to_async(mirror.record_message)
+            if not await record_message(event.chat_id, event.message.date, event.out):
+                # First message in a dialog we have not seen yet
+                if await self._add_chat(event):
+                    self.stdout.write(f"New dialog: {event.chat_id}")
+                await record_message(event.chat_id, event.message.date, event.out)
+        except Exception as e:
+            logger.error(f"Error recording message in {event.chat_id}: {str(e)}")
+
+    async def _on_chat_action(self, event):
+        try:
+            if self.user_id not in (event.user_ids or []) and not event.created:
+                return
+            if event.user_joined or event.user_added or event.created:
+                if await self._add_chat(event):
+                    self.stdout.write(f"Joined dialog: {event.chat_id}")
+            elif event.user_left or event.user_kicked:
+                if await sync_to_async(mirror.remove_dialog)(event.chat_id):
+                    self.stdout.write(f"Left dialog: {event.chat_id}")
+        except Exception as e:
+            logger.error(f"Error handling chat action in {event.chat_id}: {str(e)}")
+
+    async def _on_message_read(self, event):
+        try:
+            await sync_to_async(mirror.mark_read)(event.chat_id)
+        except Exception as e:
+            logger.error(f"Error marking {event.chat_id} as read: {str(e)}")
@@ -1,7 +1,18 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from bot.telegram_client import get_telegram_client
+from bot.telegram_client import MEDIA_FILTERS, build_message_filters, get_telegram_client, json_default
+from bot import mirror
+from bot.archive import ArchiveWriter
+from bot.checkpoints import ExportCheckpoints
+from bot.sharding import ShardedExport
+from bot.media import MediaDownloader, check_media_root
 import json
 from collections import defaultdict
+import time
+
+# Checkpoint names of jsonl exports from Telegram
+HISTORY_EXPORT = 'message_history'
+TAKEOUT_EXPORT = 'takeout'
 
 
 class Command(BaseCommand):
@@ -18,8 +29,8 @@ class Command(BaseCommand):
             '--format',
             type=str,
             default='summary',
-            choices=['summary', 'json', 'detailed'],
-            help='Output format: summary, json, or detailed'
+            choices=['summary', 'json', 'jsonl', 'detailed'],
+            help='Output format: summary, json, jsonl (one message per line, streamed), or detailed'
         )
         parser.add_argument(
             '--type',
@@ -39,6 +50,99 @@ class Command(BaseCommand):
             action='store_true',
             help='Show only messages written by you'
         )
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='Only messages from this date on (YYYY-MM-DD or ISO datetime)'
+        )
+        parser.add_argument(
+            '--until',
+            type=str,
+            help='Only messages before this date (YYYY-MM-DD or ISO datetime)'
+        )
+        parser.add_argument(
+            '--from',
+            dest='from_user',
+            type=str,
+            help='Only messages from this sender (user ID, @username, or "me")'
+        )
+        parser.add_argument(
+            '--search',
+            type=str,
+            help='Only messages containing this text'
+        )
+        parser.add_argument(
+            '--media',
+            type=str,
+            choices=list(MEDIA_FILTERS),
+            help='Only messages with this kind of media'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Number of chats to fetch in parallel over one connection (default: 1, ignored by jsonl and --archive)'
+        )
+        parser.add_argument(
+            '--source',
+            type=str,
+            default='telegram',
+            choices=['telegram', 'mirror'],
+            help='Read from Telegram or from the local mirror filled by sync_messages'
+        )
+        parser.add_argument(
+            '--archive',
+            type=str,
+            metavar='DIR',
+            help='Write the messages to a compressed archive in DIR instead of printing them (see bot.archive)'
+        )
+        parser.add_argument(
+            '--segment-size',
+            type=int,
+            default=1000,
+            help='Messages per compressed archive segment (default: 1000)'
+        )
+        parser.add_argument(
+            '--download-media',
+            action='store_true',
+            help='Also download the media of the exported messages (see download_media)'
+        )
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help='Fetch the dialog list from Telegram instead of the local snapshot'
+        )
+        parser.add_argument(
+            '--takeout',
+            action='store_true',
+            help='Export the complete history of every chat, oldest first, through a takeout session '
+                 '(higher rate limits; needs --format jsonl or --archive, --limit is ignored)'
+        )
+        parser.add_argument(
+            '--shards',
+            type=int,
+            default=1,
+            help='Export over this many worker processes, each with its own connection and session copy '
+                 '(needs --format jsonl or --archive; chats are written as they finish)'
+        )
+        parser.add_argument(
+            '--flood-budget',
+            type=int,
+            default=300,
+            help='Seconds of FloodWait a shard may sleep off before its chats move to other shards (default: 300)'
+        )
+        parser.add_argument(
+            '--stall-timeout',
+            type=int,
+            default=120,
+            help='Seconds without progress after which a shard\'s chat moves to another shard (default: 120)'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue an interrupted jsonl export from Telegram after its last written message '
+                 '(append the output; use the same options as the interrupted run)'
+        )
 
     def handle(self, *args, **options):
         limit = options['limit']
@@ -46,17 +150,35 @@ class Command(BaseCommand):
         filter_type = options['type']
         min_messages = options['min_messages']
         my_messages_only = options['my_messages_only']
+        concurrency = max(1, options['concurrency'])
+        source = options['source']
+        takeout = options['takeout']
+        shards = max(1, options['shards'])
+        
+        if takeout and (source != 'telegram' or not (output_format == 'jsonl' or options['archive'])):
+            self.stdout.write(self.style.ERROR('--takeout exports from Telegram with --format jsonl or --archive.'))
+            return
+        if shards > 1 and (takeout or source != 'telegram' or not (output_format == 'jsonl' or options['archive'])):
+            self.stdout.write(self.style.ERROR('--shards exports from Telegram with --format jsonl or --archive, '
+                                               'without --takeout.'))
+            return
+        
+        # jsonl exports from Telegram are checkpointed, archives can't be appended to
+        checkpointed = source == 'telegram' and output_format == 'jsonl' and not options['archive']
+        if options['resume'] and not checkpointed:
+            self.stdout.write(self.style.ERROR('--resume continues a jsonl export from Telegram.'))
+            return
         
         client = get_telegram_client()
         
-        if not client.is_configured():
+        if source == 'telegram' and not client.is_configured():
             self.stdout.write(
                 self.style.ERROR('Telegram client is not properly configured. Please check your .env file.')
             )
             return
         
         # Check if phone number is set
-        if not client.phone_number:
+        if source == 'telegram' and not client.phone_number:
             self.stdout.write(
                 self.style.ERROR(
                     '\n⚠️  ERROR: To get message history, you need to use a USER account.\n'
@@ -65,17 +187,45 @@ class Command(BaseCommand):
             )
             return
         
+        try:
+            filters = build_message_filters(
+                since=options['since'],
+                until=options['until'],
+                from_user=options['from_user'],
+                search=options['search'],
+                media=options['media'],
+            )
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+        
+        if options['download_media']:
+            # Refuse before exporting rather than after
+            try:
+                check_media_root(settings.TELEGRAM_MEDIA_ROOT)
+            except ValueError as e:
+                self.stdout.write(self.style.ERROR(str(e)))
+                return
+        
+        # Keep stdout clean for the JSON lines
+        log = self.stderr if output_format == 'jsonl' else self.stdout
+        # Message ids with media per dialog, filled while exporting
+        self.media_ids = defaultdict(list) if options['download_media'] else None
+        
         if my_messages_only:
-            self.stdout.write(self.style.SUCCESS('📝 Mode: Showing only YOUR messages'))
+            log.write('📝 Mode: Showing only YOUR messages', style_func=self.style.SUCCESS)
         
-        self.stdout.write(self.style.SUCCESS('Fetching all dialogs...'))
-        self.stdout.write(self.style.WARNING('This may take a while depending on the number of chats...'))
+        log.write('Fetching all dialogs...', style_func=self.style.SUCCESS)
+        log.write('This may take a while depending on the number of chats...', style_func=self.style.WARNING)
         
         # Get all dialogs
-        dialogs = client.get_all_dialogs()
+        if source == 'mirror':
+            dialogs = mirror.get_dialogs()
+        else:
+            dialogs = mirror.get_dialog_snapshot(client, refresh=options['refresh'])
         
         if not dialogs:
-            self.stdout.write(self.style.WARNING('No dialogs found.'))
+            log.write('No dialogs found.', style_func=self.style.WARNING)
             return
         
         # Filter by type
@@ -88,34 +238,105 @@ class Command(BaseCommand):
             }
             dialogs = [d for d in dialogs if d.get('type') == type_map.get(filter_type)]
         
-        self.stdout.write(self.style.SUCCESS(f'Found {len(dialogs)} dialogs. Fetching messages...'))
+        log.write(f'Found {len(dialogs)} dialogs. Fetching messages...', style_func=self.style.SUCCESS)
+        
+        if output_format == 'jsonl' or options['archive']:
+            checkpoints = None
+            if checkpointed:
+                checkpoints = self._export_checkpoints(TAKEOUT_EXPORT if takeout else HISTORY_EXPORT, log,
+                                                       options['resume'])
+                dialogs = [d for d in dialogs if not checkpoints.is_completed(d['id'])]
+            
+            if takeout:
+                log.write('Exporting through a takeout session...', style_func=self.style.SUCCESS)
+                records = client.iter_takeout_messages(dialogs, from_user_only=my_messages_only, filters=filters,
+                                                       min_ids=checkpoints.last_ids() if checkpoints else None)
+            elif shards > 1:
+                log.write(f'Exporting over {shards} shards...', style_func=self.style.SUCCESS)
+                records = ShardedExport(
+                    client.user_session_name,
+                    dialogs,
+                    shards=shards,
+                    limit=limit,
+                    from_user_only=my_messages_only,
+                    filters=filters,
+                    offsets=checkpoints.offsets() if checkpoints else None,
+                    flood_budget=options['flood_budget'],
+                    stall_timeout=options['stall_timeout'],
+                    progress=lambda message: log.write(f'⚠️  {message}', style_func=self.style.WARNING),
+                )
+            elif source == 'mirror':
+                records = (
+                    (dialog, msg, None)
+                    for dialog in dialogs
+                    for msg in mirror.iter_messages(dialog['id'], limit=limit, from_user_only=my_messages_only,
+                                                    filters=filters)
+                )
+            else:
+                records = client.iter_messages_for_dialogs(dialogs, limit=limit, from_user_only=my_messages_only,
+                                                          filters=filters,
+                                                          offsets=checkpoints.offsets() if checkpoints else None)
+            if options['archive']:
+                self._write_archive(records, min_messages, options['archive'], options['segment_size'])
+            else:
+                self._stream_jsonl(records, min_messages, checkpoints)
+            self._download_media(client, log, concurrency)
+            return
         
         # Get messages from each dialog
         history_data = []
         total_messages = 0
+        started = time.monotonic()
         
-        for i, dialog in enumerate(dialogs, 1):
-            dialog_id = dialog.get('id')
-            dialog_title = dialog.get('title') or dialog.get('name') or f"Chat {dialog_id}"
+        def progress(done, total, dialog, messages, error):
+            dialog_title = dialog.get('title') or dialog.get('name') or f"Chat {dialog.get('id')}"
             dialog_type = dialog.get('type', 'unknown')
-            
-            self.stdout.write(f"  [{i}/{len(dialogs)}] Fetching from {dialog_title} ({dialog_type})...")
-            
-            try:
-                messages = client.get_messages(dialog_id, limit=limit, from_user_only=my_messages_only)
-                
-                if len(messages) >= min_messages:
-                    history_data.append({
-                        'dialog': dialog,
-                        'messages': messages,
-                        'message_count': len(messages)
-                    })
-                    total_messages += len(messages)
-            except Exception as e:
+            if error:
                 self.stdout.write(
-                    self.style.WARNING(f"    ⚠️  Error fetching messages from {dialog_title}: {str(e)}")
+                    self.style.WARNING(f"  [{done}/{total}] ⚠️  Error fetching messages from {dialog_title}: {str(error)}")
                 )
+            else:
+                self.stdout.write(f"  [{done}/{total}] {dialog_title} ({dialog_type}): {len(messages)} messages")
+        
+        if source == 'mirror':
+            results = []
+            for dialog in dialogs:
+                messages = mirror.get_messages(dialog['id'], limit=limit, from_user_only=my_messages_only,
+                                               filters=filters)
+                results.append((dialog, messages, None))
+        else:
+            results = client.get_messages_for_dialogs(
+                dialogs,
+                limit=limit,
+                from_user_only=my_messages_only,
+                filters=filters,
+                concurrency=concurrency,
+                progress=progress
+            )
+        
+        # Results come back in dialog order regardless of completion order
+        for dialog, messages, error in results:
+            if error:
                 continue
+            if len(messages) >= min_messages:
+                if self.media_ids is not None:
+                    self.media_ids[dialog['id']].extend(msg['id'] for msg in messages if msg.get('has_media'))
+                history_data.append({
+                    'dialog': dialog,
+                    'messages': messages,
+                    'message_count': len(messages)
+                })
+                total_messages += len(messages)
+        
+        elapsed = time.monotonic() - started
+        fetched = sum(len(messages) for _, messages, _ in results)
+        rate = fetched / elapsed if elapsed > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Fetched {fetched} messages from {len(results)} chats in {elapsed:.1f}s ({rate:.0f} messages/s)'
+        ))
+        if source == 'telegram':
+            cache = client.entity_names.get_stats()
+            self.stdout.write(f"Sender name cache: {cache['size']} names, {cache['hit_rate']:.1%} hit rate")
         
         if not history_data:
             self.stdout.write(self.style.WARNING('No messages found matching criteria.'))
@@ -128,6 +349,139 @@ class Command(BaseCommand):
             self._print_detailed(history_data, my_messages_only)
         else:  # summary
             self._print_summary(history_data, total_messages, my_messages_only)
+        
+        self._download_media(client, log, concurrency)
+    
+    def _qualifying(self, records, min_messages, checkpoints=None):
+        """
+        Yield (dialog, message) pairs from a (dialog, message, error) stream,
+        skipping chats with fewer than `min_messages` messages. Only the first
+        `min_messages` messages of a chat are held back, until it qualifies.
+        With `checkpoints`, every message is recorded once the consumer has
+        written it, and a chat is marked complete when the next one starts.
+        """
+        current_id = None
+        failed = set()
+        pending = []
+        for dialog, msg, error in records:
+            if error:
+                failed.add(dialog['id'])
+                dialog_title = dialog.get('title') or dialog.get('name') or f"Chat {dialog.get('id')}"
+                self.stderr.write(f"⚠️  Error fetching messages from {dialog_title}: {str(error)}")
+                continue
+            
+            if dialog['id'] != current_id:
+                if checkpoints and current_id is not None and current_id not in failed:
+                    checkpoints.complete(current_id)
+                current_id = dialog['id']
+                # A resumed chat has qualified before
+                pending = None if checkpoints and checkpoints.is_started(current_id) else []
+            
+            if pending is None:
+                self._collect_media(dialog, msg)
+                yield dialog, msg
+                if checkpoints:
+                    checkpoints.advance(dialog['id'], msg['id'])
+                continue
+            pending.append(msg)
+            if len(pending) >= min_messages:
+                for item in pending:
+                    self._collect_media(dialog, item)
+                    yield dialog, item
+                    if checkpoints:
+                        checkpoints.advance(dialog['id'], item['id'])
+                pending = None
+        
+        if checkpoints and current_id is not None and current_id not in failed:
+            checkpoints.complete(current_id)
+    
+    def _export_checkpoints(self, name, log, resume):
+        """Checkpoints of a jsonl export, loaded when resuming and cleared otherwise"""
+        checkpoints = ExportCheckpoints(name, flush=self.stdout.flush)
+        if resume:
+            checkpoints.load()
+            log.write(f'Resuming export after {checkpoints.message_count} exported messages',
+                      style_func=self.style.SUCCESS)
+        else:
+            checkpoints.reset()
+        return checkpoints
+    
+    def _collect_media(self, dialog, msg):
+        if self.media_ids is not None and msg.get('has_media'):
+            self.media_ids[dialog['id']].append(msg['id'])
+    
+    def _download_media(self, client, log, concurrency):
+        """Download the media of the exported messages"""
+        if not self.media_ids:
+            return
+        
+        total = sum(len(ids) for ids in self.media_ids.values())
+        log.write(f'Downloading media of {total} messages...', style_func=self.style.SUCCESS)
+        downloader = MediaDownloader(client, concurrency=max(concurrency, 4))
+        for dialog_id, message_ids in self.media_ids.items():
+            try:
+                downloader.download_messages(dialog_id, message_ids)
+            except Exception as e:
+                log.write(f'⚠️  Error downloading media from {dialog_id}: {str(e)}', style_func=self.style.WARNING)
+        
+        stats = downloader.stats
+        log.write(
+            f"Downloaded {stats.get('downloaded', 0)} files into {downloader.root}, "
+            f"linked {stats.get('deduplicated', 0)} duplicates, {stats.get('skipped', 0)} already stored, "
+            f"{stats.get('failed', 0)} failed",
+            style_func=self.style.SUCCESS
+        )
+    
+    def _stream_jsonl(self, records, min_messages, checkpoints=None):
+        """Write messages as JSON lines while they are being fetched"""
+        started = time.monotonic()
+        total_messages = 0
+        chat_ids = set()
+        
+        try:
+            for dialog, msg in self._qualifying(records, min_messages, checkpoints):
+                record = {
+                    'dialog_id': dialog['id'],
+                    'dialog_title': dialog.get('title') or dialog.get('name'),
+                    'dialog_type': dialog.get('type'),
+                    **msg
+                }
+                self.stdout.write(json.dumps(record, ensure_ascii=False, default=json_default))
+                chat_ids.add(dialog['id'])
+                total_messages += 1
+        except Exception as e:
+            self.stderr.write(f'Error fetching messages: {str(e)}')
+        finally:
+            if checkpoints:
+                checkpoints.save()
+        
+        elapsed = time.monotonic() - started
+        rate = total_messages / elapsed if elapsed > 0 else 0
+        self.stderr.write(
+            f'Wrote {total_messages} messages from {len(chat_ids)} chats in {elapsed:.1f}s ({rate:.0f} messages/s)',
+            style_func=self.style.SUCCESS
+        )
+    
+    def _write_archive(self, records, min_messages, path, segment_size):
+        """Write messages into a compressed archive directory while they are being fetched"""
+        started = time.monotonic()
+        try:
+            writer = ArchiveWriter(path, segment_size=segment_size)
+        except FileExistsError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+        
+        with writer:
+            try:
+                for dialog, msg in self._qualifying(records, min_messages):
+                    writer.add(dialog, msg)
+            except Exception as e:
+                self.stderr.write(f'Error fetching messages: {str(e)}')
+        
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {writer.message_count} messages from {writer.dialog_count} chats to {path} in {elapsed:.1f}s'
+        ))
     
     def _print_summary(self, history_data, total_messages, my_messages_only=False):
         """Print summary of message history"""
@@ -237,5 +591,5 @@ class Command(BaseCommand):
                 'message_count': item['message_count']
             })
         
-        self.stdout.write(json.dumps(output, indent=2, ensure_ascii=False, default=str))
+        self.stdout.write(json.dumps(output, indent=2, ensure_ascii=False, default=json_default))
 
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+from bot.services import ContactOutbox
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending contact form messages to Telegram (outbox worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Messages to deliver per batch (default: TELEGRAM_OUTBOX_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=None,
+            help='Give up on a message after this many attempts (default: TELEGRAM_OUTBOX_MAX_ATTEMPTS)'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Seconds to sleep when the outbox is empty (default: 2)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process pending messages once and exit'
+        )
+
+    def handle(self, *args, **options):
+        outbox = ContactOutbox(
+            batch_size=options['batch_size'],
+            max_attempts=options['max_attempts']
+        )
+        interval = options['interval']
+        once = options['once']
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Outbox worker started (batch size: {outbox.batch_size}, max attempts: {outbox.max_attempts})'
+        ))
+
+        totals = {'sent': 0, 'failed': 0, 'skipped': 0}
+        try:
+            while True:
+                stats = outbox.process_batch()
+                for key, value in stats.items():
+                    totals[key] += value
+
+                processed = sum(stats.values())
+                if processed:
+                    self.stdout.write(
+                        f"Batch: {stats['sent']} sent, {stats['failed']} failed, {stats['skipped']} skipped"
+                    )
+
+                # Keep draining while batches come back full
+                if processed >= outbox.batch_size:
+                    continue
+                if once:
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nOutbox worker stopped'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Total: {totals['sent']} sent, {totals['failed']} failed, {totals['skipped']} skipped"
+        ))
@@ -0,0 +1,132 @@
+from django.core.management.base import BaseCommand
+from bot.handlers import get_update_dispatcher, get_update_deduplicator
+from bot.models import BotState
+from bot.services import TelegramBotService
+import telebot
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+OFFSET_KEY = 'polling_offset'
+
+
+class Command(BaseCommand):
+    help = 'Run the Telegram bot with long polling (getUpdates) instead of a webhook'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--timeout',
+            type=int,
+            default=30,
+            help='Long polling timeout in seconds (default: 30)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=100,
+            help='Maximum number of updates per getUpdates call, 1-100 (default: 100)'
+        )
+        parser.add_argument(
+            '--delete-webhook',
+            action='store_true',
+            help='Delete the webhook before polling (getUpdates does not work while a webhook is set)'
+        )
+        parser.add_argument(
+            '--reset-offset',
+            action='store_true',
+            help='Ignore the stored offset and start from the oldest pending update'
+        )
+
+    def handle(self, *args, **options):
+        poll_timeout = options['timeout']
+        limit = max(1, min(options['limit'], 100))
+
+        bot_service = TelegramBotService()
+        if not bot_service.bot_token:
+            self.stdout.write(self.style.ERROR('TELEGRAM_BOT_TOKEN is not configured'))
+            return
+
+        if options['delete_webhook']:
+            if bot_service.delete_webhook():
+                self.stdout.write(self.style.SUCCESS('Webhook deleted'))
+            else:
+                self.stdout.write(self.style.ERROR('Failed to delete webhook'))
+                return
+
+        offset = 0 if options['reset_offset'] else self._load_offset()
+        dispatcher = get_update_dispatcher()
+        deduplicator = get_update_deduplicator()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Polling for updates (offset: {offset or "none"}, batch: {limit}, workers: {dispatcher.workers})...'
+        ))
+
+        received = 0
+        try:
+            while True:
+                params = {'timeout': poll_timeout, 'limit': limit}
+                if offset:
+                    params['offset'] = offset
+
+                try:
+                    updates = bot_service.transport.call(
+                        'getUpdates', params, read_timeout=poll_timeout + 10
+                    )
+                except telebot.apihelper.ApiTelegramException as api_error:
+                    if api_error.error_code == 409:
+                        self.stdout.write(self.style.ERROR(
+                            'A webhook is set for this bot. Run with --delete-webhook to switch to polling.'
+                        ))
+                        return
+                    logger.error(f"getUpdates failed: {str(api_error)}")
+                    time.sleep(5)
+                    continue
+                except Exception as e:
+                    logger.error(f"getUpdates failed: {str(e)}")
+                    time.sleep(5)
+                    continue
+
+                if not updates:
+                    continue
+
+                for update in updates:
+                    if not deduplicator.claim(update.get('update_id')):
+                        continue
+                    # Block while the workers are saturated instead of dropping updates
+                    dispatcher.submit(update, block=True)
+
+                # Move past the batch only once it has been handled, so an
+                # interrupted batch is redelivered on the next start
+                dispatcher.wait()
+                offset = updates[-1]['update_id'] + 1
+                self._save_offset(offset)
+                received += len(updates)
+                self.stdout.write(f"Received {len(updates)} updates (total: {received}, next offset: {offset})")
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nStopping bot...'))
+            # Updates that never started are released so the redelivery isn't skipped as a duplicate.
+            # Running ones stay claimed: they may already have been answered, and must not be answered twice.
+            queued, running = dispatcher.drain()
+            for update in queued:
+                deduplicator.release(update.get('update_id'))
+            if queued:
+                self.stdout.write(self.style.WARNING(
+                    f'{len(queued)} unprocessed updates will be received again on the next start'
+                ))
+            if running:
+                self.stdout.write(self.style.WARNING(
+                    f'{len(running)} updates were interrupted while being handled and will not be retried'
+                ))
+
+        stats = dispatcher.get_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Stopped. Received {received} updates, processed {stats['processed']}, failed {stats['failed']}"
+        ))
+
+    def _load_offset(self):
+        state = BotState.objects.filter(key=OFFSET_KEY).first()
+        return state.value if state else 0
+
+    def _save_offset(self, offset):
+        BotState.objects.update_or_create(key=OFFSET_KEY, defaults={'value': offset})
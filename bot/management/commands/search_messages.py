@@ -0,0 +1,144 @@
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+from bot import mirror, search
+from bot.telegram_client import parse_date_bound
+import json
+import time
+
+
+class Command(BaseCommand):
+    help = 'Search messages in the local mirror (filled by sync_messages) with full-text search'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'query',
+            type=str,
+            nargs='?',
+            default='',
+            help='Words to search for (all must match, word* for a prefix)'
+        )
+        parser.add_argument(
+            '--dialog',
+            type=int,
+            help='Only search this dialog (peer ID)'
+        )
+        parser.add_argument(
+            '--sender',
+            type=int,
+            help='Only search messages from this sender ID'
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='Only messages from this date on (YYYY-MM-DD or ISO datetime)'
+        )
+        parser.add_argument(
+            '--until',
+            type=str,
+            help='Only messages before this date (YYYY-MM-DD or ISO datetime)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Maximum number of results (default: 20)'
+        )
+        parser.add_argument(
+            '--format',
+            type=str,
+            default='table',
+            choices=['table', 'json', 'simple'],
+            help='Output format: table, json, or simple'
+        )
+        parser.add_argument(
+            '--raw',
+            action='store_true',
+            help='Pass the query to SQLite FTS5 as is (phrases, OR, NOT, NEAR)'
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Rebuild the search index from the mirrored messages first'
+        )
+
+    def handle(self, *args, **options):
+        query = options['query']
+        output_format = options['format']
+
+        if not search.is_available():
+            self.stdout.write(self.style.ERROR('Full-text search requires the SQLite database backend.'))
+            return
+
+        if options['rebuild']:
+            started = time.monotonic()
+            search.rebuild()
+            search.optimize()
+            self.stdout.write(self.style.SUCCESS(f'Search index rebuilt in {time.monotonic() - started:.1f}s'))
+            if not query:
+                return
+        else:
+            search.ensure_index()
+
+        if not query:
+            self.stdout.write(self.style.ERROR('Please give a search query.'))
+            return
+
+        if not mirror.has_data():
+            self.stdout.write(self.style.WARNING('The mirror is empty. Run sync_messages first.'))
+            return
+
+        try:
+            since = parse_date_bound(options['since'])
+            until = parse_date_bound(options['until'])
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        started = time.monotonic()
+        try:
+            results = search.search(
+                query,
+                dialog_id=options['dialog'],
+                sender_id=options['sender'],
+                since=since,
+                until=until,
+                limit=options['limit'],
+                raw=options['raw'],
+            )
+        except OperationalError as e:
+            self.stdout.write(self.style.ERROR(f'Invalid search query: {str(e)}'))
+            return
+        elapsed = (time.monotonic() - started) * 1000
+
+        if not results:
+            self.stdout.write(self.style.WARNING(f'No messages found ({elapsed:.1f} ms).'))
+            return
+
+        if output_format == 'json':
+            self.stdout.write(json.dumps(results, indent=2, ensure_ascii=False, default=str))
+        elif output_format == 'simple':
+            for result in results:
+                self.stdout.write(
+                    f"[{str(result['date'])[:19]}] {result['dialog_title']} / "
+                    f"{result['sender_name'] or 'Unknown'} (ID: {result['id']}): {result['snippet']}"
+                )
+        else:  # table format
+            self._print_table(results)
+
+        self.stdout.write(self.style.SUCCESS(f'\nTotal: {len(results)} messages found in {elapsed:.1f} ms'))
+
+    def _print_table(self, results):
+        """Print search results in a formatted table"""
+        self.stdout.write("\n" + "=" * 120)
+        self.stdout.write(f"{'Chat':<25} {'ID':<10} {'Date':<20} {'Sender':<20} {'Message':<40}")
+        self.stdout.write("=" * 120)
+
+        for result in results:
+            chat = (result['dialog_title'] or str(result['dialog_id']))[:23]
+            date = str(result['date'])[:19] if result['date'] else 'N/A'
+            sender = (result['sender_name'] or 'Unknown')[:18]
+            snippet = ' '.join(str(result['snippet']).split())
+
+            self.stdout.write(f"{chat:<25} {str(result['id']):<10} {date:<20} {sender:<20} {snippet}")
+
+        self.stdout.write("=" * 120)
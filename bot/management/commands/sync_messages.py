@@ -0,0 +1,124 @@
+from django.core.management.base import BaseCommand
+from bot.telegram_client import get_telegram_client
+from bot import mirror
+import time
+
+
+class Command(BaseCommand):
+    help = 'Incrementally sync dialogs and messages into the local mirror'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--initial-limit',
+            type=int,
+            default=1000,
+            help='Messages to fetch from a dialog that has never been synced, 0 for all (default: 1000)'
+        )
+        parser.add_argument(
+            '--type',
+            type=str,
+            choices=['all', 'channels', 'supergroups', 'groups', 'chats'],
+            default='all',
+            help='Filter by type: all, channels, supergroups, groups, or chats'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='Number of chats to fetch in parallel over one connection (default: 4)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows per bulk insert (default: 500)'
+        )
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help='Refresh the dialog snapshot even if it is still fresh'
+        )
+
+    def handle(self, *args, **options):
+        initial_limit = options['initial_limit'] or None
+        filter_type = options['type']
+        concurrency = max(1, options['concurrency'])
+        batch_size = options['batch_size']
+
+        client = get_telegram_client()
+
+        if not client.is_configured():
+            self.stdout.write(
+                self.style.ERROR('Telegram client is not properly configured. Please check your .env file.')
+            )
+            return
+
+        if not client.phone_number:
+            self.stdout.write(
+                self.style.ERROR(
+                    '\n⚠️  ERROR: To sync messages, you need to use a USER account.\n'
+                    'Please add TELEGRAM_PHONE_NUMBER to your .env file.\n'
+                )
+            )
+            return
+
+        started = time.monotonic()
+        self.stdout.write(self.style.SUCCESS('Fetching all dialogs...'))
+
+        dialogs = mirror.get_dialog_snapshot(client, refresh=options['refresh'])
+        if not dialogs:
+            self.stdout.write(self.style.WARNING('No dialogs found.'))
+            return
+
+        dialog_objects = mirror.get_dialog_objects(d['id'] for d in dialogs)
+        mirror.save_user_id(client.get_current_user_id())
+
+        if filter_type != 'all':
+            type_map = {
+                'channels': 'channel',
+                'supergroups': 'supergroup',
+                'groups': 'group',
+                'chats': 'user'
+            }
+            dialogs = [d for d in dialogs if d.get('type') == type_map.get(filter_type)]
+
+        min_ids = mirror.get_min_ids()
+        new_dialogs = sum(1 for d in dialogs if not min_ids.get(d['id']))
+        self.stdout.write(self.style.SUCCESS(
+            f'Syncing {len(dialogs)} dialogs ({new_dialogs} new, {len(dialogs) - new_dialogs} incremental)...'
+        ))
+
+        # Each dialog is saved as soon as it is fetched, so only a few are held in memory
+        results = client.iter_completed_dialogs(
+            dialogs,
+            limit=initial_limit,
+            concurrency=concurrency,
+            min_ids=min_ids
+        )
+
+        done = 0
+        written = 0
+        errors = 0
+        try:
+            for dialog, messages, error in results:
+                done += 1
+                title = dialog.get('title') or dialog.get('name') or f"Chat {dialog.get('id')}"
+                if error:
+                    errors += 1
+                    self.stdout.write(self.style.WARNING(f"  [{done}/{len(dialogs)}] ⚠️  {title}: {str(error)}"))
+                    continue
+                written += mirror.save_messages(dialog_objects[dialog['id']], messages, batch_size=batch_size)
+                if messages:
+                    self.stdout.write(f"  [{done}/{len(dialogs)}] {title}: {len(messages)} new messages")
+        except ConnectionError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'\nSynced {written} new messages from {done - errors} dialogs in {elapsed:.1f}s'
+        ))
+        cache = client.entity_names.get_stats()
+        self.stdout.write(f"Sender name cache: {cache['size']} names, {cache['hit_rate']:.1%} hit rate")
+        if errors:
+            self.stdout.write(self.style.WARNING(f'{errors} dialogs failed and will be retried on the next run'))
@@ -1,10 +1,25 @@
 from django.core.management.base import BaseCommand
 from bot.telegram_client import get_telegram_client
+from bot import mirror
 
 
 class Command(BaseCommand):
     help = 'Show Telegram account statistics (contacts, chats, channels, groups)'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help='Fetch the dialog list from Telegram instead of the stored counters'
+        )
+        parser.add_argument(
+            '--activity',
+            type=int,
+            default=0,
+            metavar='DAYS',
+            help='Also show daily message activity recorded by listen_updates for the last DAYS days'
+        )
+
     def handle(self, *args, **options):
         client = get_telegram_client()
         
@@ -28,11 +43,15 @@ class Command(BaseCommand):
             )
             return
         
-        self.stdout.write(self.style.SUCCESS('Connecting as user account...'))
-        self.stdout.write(self.style.WARNING('Note: If this is your first time, you may be asked for a verification code.'))
+        # Counters are current while listen_updates runs or the snapshot is fresh
+        stats = None
+        if not options['refresh'] and (mirror.is_listener_running() or mirror.is_snapshot_fresh()):
+            stats = mirror.get_statistics()
         
-        # Get statistics
-        stats = client.get_statistics()
+        if not stats:
+            self.stdout.write(self.style.SUCCESS('Connecting as user account...'))
+            self.stdout.write(self.style.WARNING('Note: If this is your first time, you may be asked for a verification code.'))
+            stats = client.get_statistics(mirror.get_dialog_snapshot(client, refresh=options['refresh']))
         
         if not stats:
             self.stdout.write(self.style.WARNING('Could not retrieve statistics.'))
@@ -40,6 +59,9 @@ class Command(BaseCommand):
         
         # Display statistics
         self._print_statistics(stats)
+        
+        if options['activity'] > 0:
+            self._print_activity(mirror.get_daily_activity(options['activity']))
     
     def _print_statistics(self, stats):
         """Print comprehensive statistics"""
@@ -86,4 +108,18 @@ class Command(BaseCommand):
                 self.stdout.write(f"  Groups:               {groups_pct:>5.1f}%")
         
         self.stdout.write("=" * 70 + "\n")
-
+    
+    def _print_activity(self, activity):
+        """Print daily message counts as a bar chart"""
+        self.stdout.write(self.style.SUCCESS("📅 Daily Activity:"))
+        if not activity:
+            self.stdout.write(self.style.WARNING("  No activity recorded yet. Run listen_updates to collect it."))
+            return
+        
+        peak = max(row['messages'] for row in activity) or 1
+        for row in activity:
+            bar = '█' * max(1, round(row['messages'] / peak * 40))
+            self.stdout.write(
+                f"  {row['day']:%Y-%m-%d}  {row['messages']:>5} ({row['outgoing']:>4} sent)  {bar}"
+            )
+        self.stdout.write("")
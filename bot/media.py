@@ -0,0 +1,254 @@
+"""
+Media download pipeline for the Telegram user account.
+
+Files are stored under TELEGRAM_MEDIA_ROOT (telegram_media/ by default) in a
+content-addressed layout (telegram/ab/cd/<sha256><ext>), and every
+downloaded message is recorded in the MediaFile manifest. A file is
+downloaded at most once: forwards and reposts share Telegram's file id and
+are linked to the existing blob without a download, and re-uploads of
+identical content end up in the same blob.
+Interrupted downloads resume from their partial file on the next run.
+"""
+from django.conf import settings
+from django.db import IntegrityError
+from asgiref.sync import sync_to_async
+from collections import defaultdict
+import asyncio
+import hashlib
+import logging
+import os
+from telethon import types
+from .models import MediaBlob, MediaFile
+
+logger = logging.getLogger(__name__)
+
+MEDIA_SUBDIR = 'telegram'
+# Telegram serves files in multiples of 4 KB, so resumed downloads start on that boundary
+RESUME_ALIGNMENT = 4096
+
+
+def media_key(media):
+    """
+    Telegram's id for the file of a message media, or None if it has no downloadable file
+    """
+    if isinstance(media, types.MessageMediaPhoto) and isinstance(media.photo, types.Photo):
+        return f"photo:{media.photo.id}"
+    if isinstance(media, types.MessageMediaDocument) and isinstance(media.document, types.Document):
+        return f"document:{media.document.id}"
+    return None
+
+
+def check_media_root(root):
+    """
+    Raise ValueError if `root` is inside a directory the site serves publicly,
+    unless TELEGRAM_MEDIA_PUBLIC allows it
+    """
+    if settings.TELEGRAM_MEDIA_PUBLIC:
+        return
+    root = os.path.realpath(root)
+    for served in (settings.MEDIA_ROOT, settings.STATIC_ROOT):
+        if not served:
+            continue
+        served = os.path.realpath(served)
+        if os.path.commonpath([root, served]) == served:
+            raise ValueError(
+                f'TELEGRAM_MEDIA_ROOT ({root}) is inside {served}, which is served publicly. '
+                'Choose another directory or set TELEGRAM_MEDIA_PUBLIC=True.'
+            )
+
+
+class MediaDownloader:
+    """
+    Download the media of messages with bounded concurrency.
+    All methods ending in _async run on the TelegramClient connection loop.
+    """
+
+    def __init__(self, client, root=None, concurrency=4, max_size=None, progress=None):
+        self.client = client
+        self.root = str(root or settings.TELEGRAM_MEDIA_ROOT)
+        check_media_root(self.root)
+        self.concurrency = max(1, concurrency)
+        self.max_size = max_size
+        # Called as progress(status, dialog_id, message, detail) after each message
+        self.progress = progress
+        self.stats = defaultdict(int)
+        self._key_locks = defaultdict(asyncio.Lock)
+
+    @property
+    def tmp_dir(self):
+        return os.path.join(self.root, MEDIA_SUBDIR, 'tmp')
+
+    def download_dialog(self, dialog_id, limit=None, filters=None):
+        """
+        Download the media of up to `limit` recent messages of a dialog (synchronous)
+        """
+        return self.client.connection.run(self.download_dialog_async(dialog_id, limit, filters))
+
+    def download_messages(self, dialog_id, message_ids):
+        """
+        Download the media of the given messages of a dialog (synchronous)
+        """
+        return self.client.connection.run(self.download_messages_async(dialog_id, message_ids))
+
+    async def download_dialog_async(self, dialog_id, limit=None, filters=None):
+        telethon_client = await self._connect()
+        messages = self.client._iter_filtered_messages(telethon_client, dialog_id, limit, filters=filters)
+        await self._run_pipeline(telethon_client, dialog_id, messages)
+        return dict(self.stats)
+
+    async def download_messages_async(self, dialog_id, message_ids):
+        telethon_client = await self._connect()
+        done = await sync_to_async(self._done_message_ids)(dialog_id)
+        pending = [message_id for message_id in message_ids if message_id not in done]
+        self.stats['skipped'] += len(message_ids) - len(pending)
+
+        async def fetch():
+            # One request per 100 messages
+            for start in range(0, len(pending), 100):
+                for message in await telethon_client.get_messages(dialog_id, ids=pending[start:start + 100]):
+                    if message is not None:
+                        yield message
+
+        await self._run_pipeline(telethon_client, dialog_id, fetch(), done)
+        return dict(self.stats)
+
+    async def _connect(self):
+        telethon_client = await self.client.ensure_connected(use_user_account=True)
+        if not telethon_client:
+            raise ConnectionError("Failed to connect as user account. Make sure TELEGRAM_PHONE_NUMBER is set in .env")
+        return telethon_client
+
+    async def _run_pipeline(self, telethon_client, dialog_id, messages, done=None):
+        """
+        Feed messages through a bounded queue to `concurrency` download workers
+        """
+        if done is None:
+            done = await sync_to_async(self._done_message_ids)(dialog_id)
+        queue = asyncio.Queue(self.concurrency * 2)
+
+        async def worker():
+            while True:
+                message = await queue.get()
+                try:
+                    if message is None:
+                        return
+                    await self._download_message(telethon_client, dialog_id, message)
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+        try:
+            async for message in messages:
+                if media_key(message.media) is None:
+                    continue
+                if message.id in done:
+                    self.stats['skipped'] += 1
+                    continue
+                await queue.put(message)
+        finally:
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+
+    async def _download_message(self, telethon_client, dialog_id, message):
+        key = media_key(message.media)
+        file = message.file
+        try:
+            if self.max_size and file.size and file.size > self.max_size:
+                self._report('too_large', dialog_id, message, file.size)
+                return
+
+            # Workers never download the same Telegram file at the same time
+            async with self._key_locks[key]:
+                blob = await sync_to_async(self._blob_for_key)(key)
+                if blob:
+                    status = 'deduplicated'
+                else:
+                    path, sha256, size = await self._fetch(telethon_client, message, key)
+                    blob, created = await sync_to_async(self._store_blob)(path, sha256, size, file)
+                    status = 'downloaded' if created else 'deduplicated'
+                    self.stats['bytes'] += size
+                await sync_to_async(self._record)(dialog_id, message, key, file, blob)
+            self._report(status, dialog_id, message, blob.path)
+        except Exception as e:
+            logger.error(f"Error downloading media of message {message.id} in {dialog_id}: {str(e)}")
+            self._report('failed', dialog_id, message, str(e))
+
+    async def _fetch(self, telethon_client, message, key):
+        """
+        Download a file into its partial file, resuming if it exists.
+        Returns the partial file path, its SHA-256 and its size.
+        """
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        path = os.path.join(self.tmp_dir, key.replace(':', '_') + '.part')
+
+        offset = 0
+        if os.path.exists(path):
+            offset = os.path.getsize(path)
+            offset -= offset % RESUME_ALIGNMENT
+        sha256 = await asyncio.to_thread(self._hash_partial, path, offset)
+        if offset:
+            self.stats['resumed'] += 1
+
+        with open(path, 'ab') as f:
+            async for chunk in telethon_client.iter_download(message.media, offset=offset):
+                f.write(chunk)
+                sha256.update(chunk)
+            size = f.tell()
+        return path, sha256.hexdigest(), size
+
+    @staticmethod
+    def _hash_partial(path, offset):
+        """
+        Cut a partial file down to `offset` bytes and hash what is left
+        """
+        sha256 = hashlib.sha256()
+        if not offset:
+            open(path, 'wb').close()
+            return sha256
+        with open(path, 'rb+') as f:
+            f.truncate(offset)
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        return sha256
+
+    def _report(self, status, dialog_id, message, detail):
+        self.stats[status] += 1
+        if self.progress:
+            self.progress(status, dialog_id, message, detail)
+
+    def _done_message_ids(self, dialog_id):
+        return set(MediaFile.objects.filter(dialog_id=dialog_id).values_list('message_id', flat=True))
+
+    def _blob_for_key(self, key):
+        media_file = MediaFile.objects.filter(file_key=key).select_related('blob').first()
+        return media_file.blob if media_file else None
+
+    def _store_blob(self, path, sha256, size, file):
+        """
+        Move a finished download to its content-addressed path, or drop it
+        if a blob with the same content exists. Returns (blob, created).
+        """
+        blob = MediaBlob.objects.filter(sha256=sha256).first()
+        if blob:
+            os.remove(path)
+            return blob, False
+
+        relative_path = os.path.join(MEDIA_SUBDIR, sha256[:2], sha256[2:4], sha256 + (file.ext or ''))
+        final_path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(path, final_path)
+        try:
+            return MediaBlob.objects.create(
+                sha256=sha256, size=size, mime_type=file.mime_type or '', path=relative_path
+            ), True
+        except IntegrityError:
+            # Stored by another process meanwhile: same content, same path
+            return MediaBlob.objects.get(sha256=sha256), False
+
+    def _record(self, dialog_id, message, key, file, blob):
+        MediaFile.objects.update_or_create(
+            dialog_id=dialog_id,
+            message_id=message.id,
+            defaults={'file_key': key, 'file_name': file.name or '', 'blob': blob},
+        )
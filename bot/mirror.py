@@ -0,0 +1,370 @@
+"""
+Local mirror of the Telegram user account's dialogs and messages.
+Filled incrementally by the sync_messages command and readable by the
+other management commands with --source mirror. The dialog list doubles
+as a snapshot cache shared by list_channels, telegram_stats and
+message_history. The listen_updates command keeps the account statistics
+and per-dialog activity counters current between snapshots.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from datetime import datetime, timedelta
+import logging
+import time
+from .models import BotState, DialogActivity, SyncCursor, TelegramDialog, TelegramMessage
+from .telegram_client import STATISTICS_KEYS, count_dialogs
+
+logger = logging.getLogger(__name__)
+
+USER_ID_KEY = 'telegram_user_id'
+SNAPSHOT_KEY = 'dialog_snapshot_at'
+STATISTICS_PREFIX = 'stats.'
+LISTENER_HEARTBEAT_KEY = 'listener_heartbeat'
+
+# Stored media types (Telethon media class names) for the --media kinds;
+# video, audio, voice, round and gif messages are all stored as documents
+MIRROR_MEDIA_TYPES = {
+    'photo': ['Photo'],
+    'photo_video': ['Photo', 'Document'],
+    'url': ['WebPage'],
+}
+
+DIALOG_FIELDS = [
+    'title', 'name', 'username', 'dialog_type', 'participants_count', 'unread_count',
+    'is_verified', 'is_broadcast', 'is_megagroup', 'is_contact', 'is_active', 'position',
+]
+
+
+def save_dialogs(dialogs):
+    """
+    Store the complete dialog list from TelegramClient.get_all_dialogs().
+    Dialogs missing from the list are marked inactive.
+    """
+    started = timezone.now()
+    objects = [
+        TelegramDialog(
+            dialog_id=dialog['id'],
+            title=dialog.get('title') or '',
+            name=dialog.get('name') or '',
+            username=dialog.get('username'),
+            dialog_type=dialog.get('type', 'user'),
+            participants_count=dialog.get('participants_count'),
+            unread_count=dialog.get('unread_count') or 0,
+            is_verified=bool(dialog.get('is_verified')),
+            is_broadcast=bool(dialog.get('is_broadcast')),
+            is_megagroup=bool(dialog.get('is_megagroup')),
+            is_contact=bool(dialog.get('is_contact')),
+            is_active=True,
+            position=position,
+        )
+        for position, dialog in enumerate(dialogs)
+    ]
+    with transaction.atomic():
+        TelegramDialog.objects.bulk_create(
+            objects,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['dialog_id'],
+            update_fields=DIALOG_FIELDS + ['updated_at'],
+        )
+        TelegramDialog.objects.filter(updated_at__lt=started, is_active=True).update(is_active=False)
+        BotState.objects.update_or_create(key=SNAPSHOT_KEY, defaults={'value': int(time.time())})
+        save_statistics(count_dialogs(dialogs))
+
+
+def get_dialog_objects(dialog_ids):
+    """
+    Dict mapping dialog ids to TelegramDialog objects
+    """
+    return TelegramDialog.objects.in_bulk(list(dialog_ids), field_name='dialog_id')
+
+
+def is_snapshot_fresh(ttl=None):
+    """
+    Whether the dialog snapshot is younger than `ttl` seconds
+    (TELEGRAM_DIALOG_SNAPSHOT_TTL by default)
+    """
+    ttl = settings.TELEGRAM_DIALOG_SNAPSHOT_TTL if ttl is None else ttl
+    state = BotState.objects.filter(key=SNAPSHOT_KEY).first()
+    return bool(state and time.time() - state.value < ttl)
+
+
+def get_dialog_snapshot(client, refresh=False, ttl=None):
+    """
+    All dialogs of the account, served from the local snapshot while it is
+    younger than `ttl` seconds (TELEGRAM_DIALOG_SNAPSHOT_TTL by default).
+    With refresh=True, or when the snapshot is stale, the dialog list is
+    fetched from Telegram in a single pass and stored.
+    """
+    if not refresh and is_snapshot_fresh(ttl):
+        return get_dialogs()
+
+    dialogs = client.get_all_dialogs()
+    if dialogs:
+        save_dialogs(dialogs)
+    return dialogs
+
+
+def get_min_ids():
+    """
+    Highest synced message id per dialog id
+    """
+    return dict(SyncCursor.objects.values_list('dialog__dialog_id', 'max_message_id'))
+
+
+def _parse_date(value):
+    if not value or not isinstance(value, str):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def save_messages(dialog, messages, batch_size=500):
+    """
+    Bulk insert messages of one dialog and advance its sync cursor.
+    Returns the number of messages written; ones already mirrored are skipped.
+    """
+    if not messages:
+        SyncCursor.objects.update_or_create(dialog=dialog, defaults={'last_synced_at': timezone.now()})
+        return 0
+
+    now = timezone.now()
+    objects = [
+        TelegramMessage(
+            dialog=dialog,
+            message_id=msg['id'],
+            date=_parse_date(msg.get('date')),
+            text=msg.get('text') or '',
+            sender_id=msg.get('sender_id'),
+            sender_name=msg.get('sender_name'),
+            is_reply=bool(msg.get('is_reply')),
+            reply_to_msg_id=msg.get('reply_to_msg_id'),
+            media_type=msg.get('media_type'),
+            has_media=bool(msg.get('has_media')),
+            synced_at=now,
+        )
+        for msg in messages
+    ]
+
+    # Messages are fetched with min_id, so they are all newer than the cursor
+    max_id = max(msg['id'] for msg in messages)
+    # ignore_conflicts doesn't report skipped rows, count the id range before and after instead
+    in_range = TelegramMessage.objects.filter(
+        dialog=dialog, message_id__gte=min(msg['id'] for msg in messages), message_id__lte=max_id
+    )
+    with transaction.atomic():
+        cursor, _ = SyncCursor.objects.select_for_update().get_or_create(dialog=dialog)
+        existing = in_range.count()
+        TelegramMessage.objects.bulk_create(objects, batch_size=batch_size, ignore_conflicts=True)
+        written = in_range.count() - existing
+        cursor.max_message_id = max(cursor.max_message_id, max_id)
+        cursor.message_count += written
+        cursor.last_synced_at = now
+        cursor.save()
+    return written
+
+
+def save_user_id(user_id):
+    """
+    Remember the account's own user id, used for --my-messages-only on the mirror
+    """
+    if user_id:
+        BotState.objects.update_or_create(key=USER_ID_KEY, defaults={'value': user_id})
+
+
+def has_data():
+    """
+    Whether sync_messages has been run at least once
+    """
+    return SyncCursor.objects.exists()
+
+
+def get_dialogs():
+    """
+    Mirrored dialogs, same shape as TelegramClient.get_all_dialogs()
+    """
+    return [dialog.to_dict() for dialog in TelegramDialog.objects.filter(is_active=True)]
+
+
+def iter_dialogs():
+    """
+    Stream mirrored dialogs without loading them all at once
+    """
+    for dialog in TelegramDialog.objects.filter(is_active=True).iterator(chunk_size=500):
+        yield dialog.to_dict()
+
+
+def get_messages(peer_id, limit=100, offset_id=0, from_user_only=False, filters=None):
+    """
+    Mirrored messages of one dialog, newest first,
+    same shape as TelegramClient.get_messages()
+    """
+    return list(iter_messages(peer_id, limit, offset_id, from_user_only, filters))
+
+
+def iter_messages(peer_id, limit=100, offset_id=0, from_user_only=False, filters=None):
+    """
+    Stream mirrored messages of one dialog, newest first.
+    Accepts the same `filters` as the client (see build_message_filters());
+    media kinds are matched against the stored media type.
+    """
+    filters = dict(filters or {})
+    if from_user_only:
+        filters['from_user'] = 'me'
+
+    queryset = TelegramMessage.objects.filter(dialog__dialog_id=peer_id).order_by('-message_id')
+    if offset_id and offset_id > 0:
+        queryset = queryset.filter(message_id__lt=offset_id)
+    if filters.get('since'):
+        queryset = queryset.filter(date__gte=filters['since'])
+    if filters.get('until'):
+        queryset = queryset.filter(date__lt=filters['until'])
+    if filters.get('search'):
+        queryset = queryset.filter(text__icontains=filters['search'])
+    if filters.get('media'):
+        queryset = queryset.filter(media_type__in=MIRROR_MEDIA_TYPES.get(filters['media'], ['Document']))
+
+    from_user = filters.get('from_user')
+    if from_user == 'me':
+        state = BotState.objects.filter(key=USER_ID_KEY).first()
+        if state:
+            queryset = queryset.filter(sender_id=state.value)
+        else:
+            logger.warning("Own user id is not in the mirror yet, cannot filter by user")
+    elif isinstance(from_user, int):
+        queryset = queryset.filter(sender_id=from_user)
+    elif from_user:
+        logger.warning(f"The mirror can only filter senders by id, ignoring {from_user}")
+
+    if limit:
+        queryset = queryset[:limit]
+    for message in queryset.iterator(chunk_size=1000):
+        yield message.to_dict()
+
+
+def save_statistics(stats):
+    """
+    Store account statistics counters (see TelegramClient.get_statistics())
+    """
+    for name, value in stats.items():
+        BotState.objects.update_or_create(key=STATISTICS_PREFIX + name, defaults={'value': value})
+
+
+def get_statistics():
+    """
+    Stored account statistics counters, or None if there are none
+    """
+    rows = BotState.objects.filter(key__startswith=STATISTICS_PREFIX).values_list('key', 'value')
+    stats = {key[len(STATISTICS_PREFIX):]: value for key, value in rows}
+    return stats or None
+
+
+def _increment_statistic(name, delta):
+    BotState.objects.filter(key=STATISTICS_PREFIX + name).update(value=F('value') + delta)
+
+
+def listener_heartbeat():
+    """
+    Record that listen_updates is running and keeping the counters current
+    """
+    BotState.objects.update_or_create(key=LISTENER_HEARTBEAT_KEY, defaults={'value': int(time.time())})
+
+
+def is_listener_running(max_age=300):
+    """
+    Whether listen_updates has reported in during the last `max_age` seconds
+    """
+    state = BotState.objects.filter(key=LISTENER_HEARTBEAT_KEY).first()
+    return bool(state and time.time() - state.value < max_age)
+
+
+def add_dialog(dialog):
+    """
+    Add (or reactivate) a dialog the account just joined and update the counters.
+    Returns True if the dialog was new.
+    """
+    obj, created = TelegramDialog.objects.get_or_create(dialog_id=dialog['id'], defaults={
+        'title': dialog.get('title') or '',
+        'name': dialog.get('name') or '',
+        'username': dialog.get('username'),
+        'dialog_type': dialog['type'],
+        'participants_count': dialog.get('participants_count'),
+        'is_verified': bool(dialog.get('is_verified')),
+        'is_broadcast': bool(dialog.get('is_broadcast')),
+        'is_megagroup': bool(dialog.get('is_megagroup')),
+        'is_contact': bool(dialog.get('is_contact')),
+    })
+    if not created:
+        if obj.is_active:
+            return False
+        obj.is_active = True
+        obj.save(update_fields=['is_active', 'updated_at'])
+
+    _increment_statistic('total_dialogs', 1)
+    _increment_statistic(STATISTICS_KEYS[obj.dialog_type], 1)
+    if obj.is_contact:
+        _increment_statistic('contacts', 1)
+    return True
+
+
+def remove_dialog(dialog_id):
+    """
+    Mark a dialog the account left as inactive and update the counters
+    """
+    obj = TelegramDialog.objects.filter(dialog_id=dialog_id, is_active=True).first()
+    if not obj:
+        return False
+    obj.is_active = False
+    obj.save(update_fields=['is_active', 'updated_at'])
+
+    _increment_statistic('total_dialogs', -1)
+    _increment_statistic(STATISTICS_KEYS[obj.dialog_type], -1)
+    if obj.is_contact:
+        _increment_statistic('contacts', -1)
+    return True
+
+
+def record_message(dialog_id, date, outgoing):
+    """
+    Count a new message in the dialog's daily activity and unread counters
+    """
+    date = date or timezone.now()
+    dialog = TelegramDialog.objects.filter(dialog_id=dialog_id).first()
+    if not dialog:
+        return False
+
+    activity, _ = DialogActivity.objects.get_or_create(dialog=dialog, day=date.date())
+    DialogActivity.objects.filter(pk=activity.pk).update(
+        message_count=F('message_count') + 1,
+        outgoing_count=F('outgoing_count') + (1 if outgoing else 0),
+    )
+
+    updates = {'last_message_at': date}
+    if outgoing:
+        # Replying means the chat has been read
+        updates['unread_count'] = 0
+    else:
+        updates['unread_count'] = F('unread_count') + 1
+    TelegramDialog.objects.filter(pk=dialog.pk).update(**updates)
+    return True
+
+
+def mark_read(dialog_id):
+    """
+    Reset the unread counter of a dialog
+    """
+    TelegramDialog.objects.filter(dialog_id=dialog_id).update(unread_count=0)
+
+
+def get_daily_activity(days=14):
+    """
+    Total and outgoing message counts per day for the last `days` days
+    """
+    since = timezone.now().date() - timedelta(days=days - 1)
+    rows = (DialogActivity.objects
+            .filter(day__gte=since)
+            .values('day')
+            .annotate(messages=Sum('message_count'), outgoing=Sum('outgoing_count'))
+            .order_by('day'))
+    return list(rows)
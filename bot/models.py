@@ -8,11 +8,415 @@ class ContactMessage(models.Model):
     message = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
     sent_to_telegram = models.BooleanField(default=False)
-    
+
+    # Outbox delivery state (used by the process_outbox command)
+    delivery_attempts = models.PositiveIntegerField(default=0)
+    last_attempt_at = models.DateTimeField(null=True, blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Contact Message'
         verbose_name_plural = 'Contact Messages'
-    
+        indexes = [
+            # Admin changelist, newest first (also its keyset pagination)
+            models.Index(fields=['-created_at', '-id'], name='contact_created_idx'),
+            # Changelist of undelivered messages, newest first
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(sent_to_telegram=False),
+                         name='contact_unsent_created_idx'),
+            # Everything one visitor sent
+            models.Index(fields=['email', '-created_at'], name='contact_email_created_idx'),
+            # Outbox: due messages that are still undelivered, a small partial index
+            models.Index(fields=['next_attempt_at', 'id'], condition=models.Q(sent_to_telegram=False),
+                         name='contact_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} - {self.subject}"
+
+
+class ProcessedUpdate(models.Model):
+    """
+    Telegram update_ids that have already been accepted, shared by all workers
+    """
+    update_id = models.BigIntegerField(unique=True)
+    processed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Processed Update'
+        verbose_name_plural = 'Processed Updates'
+
+    def __str__(self):
+        return str(self.update_id)
+
+
+class BotState(models.Model):
+    """
+    Small key/value store for bot bookkeeping (update high-water marks, offsets)
+    """
+    key = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Bot State'
+        verbose_name_plural = 'Bot State'
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
+
+
+class TelegramDialog(models.Model):
+    """
+    A dialog (chat, group, channel) of the Telegram user account, mirrored locally
+    """
+    dialog_id = models.BigIntegerField(unique=True)
+    title = models.CharField(max_length=255, blank=True, default='')
+    name = models.CharField(max_length=255, blank=True, default='')
+    username = models.CharField(max_length=100, null=True, blank=True)
+    dialog_type = models.CharField(max_length=20)
+    participants_count = models.PositiveIntegerField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+    is_verified = models.BooleanField(default=False)
+    is_broadcast = models.BooleanField(default=False)
+    is_megagroup = models.BooleanField(default=False)
+    is_contact = models.BooleanField(default=False)
+    # False once the dialog no longer shows up in the account's dialog list
+    is_active = models.BooleanField(default=True)
+    # Order in the account's dialog list (most recent activity first)
+    position = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['position']
+        verbose_name = 'Telegram Dialog'
+        verbose_name_plural = 'Telegram Dialogs'
+
+    def __str__(self):
+        return self.title or self.name or str(self.dialog_id)
+
+    def to_dict(self):
+        """
+        Same shape as TelegramClient.get_all_dialogs() items
+        """
+        return {
+            'id': self.dialog_id,
+            'title': self.title,
+            'name': self.name,
+            'username': self.username,
+            'type': self.dialog_type,
+            'participants_count': self.participants_count,
+            'unread_count': self.unread_count,
+            'is_verified': self.is_verified,
+            'is_broadcast': self.is_broadcast,
+            'is_megagroup': self.is_megagroup,
+            'is_contact': self.is_contact,
+        }
+
+
+class TelegramMessage(models.Model):
+    """
+    A message from a mirrored dialog
+    """
+    dialog = models.ForeignKey(TelegramDialog, on_delete=models.CASCADE, related_name='messages')
+    message_id = models.BigIntegerField()
+    date = models.DateTimeField(null=True, blank=True)
+    text = models.TextField(blank=True, default='')
+    sender_id = models.BigIntegerField(null=True, blank=True)
+    sender_name = models.CharField(max_length=255, null=True, blank=True)
+    is_reply = models.BooleanField(default=False)
+    reply_to_msg_id = models.BigIntegerField(null=True, blank=True)
+    media_type = models.CharField(max_length=50, null=True, blank=True)
+    has_media = models.BooleanField(default=False)
+    synced_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-message_id']
+        verbose_name = 'Telegram Message'
+        verbose_name_plural = 'Telegram Messages'
+        constraints = [
+            models.UniqueConstraint(fields=['dialog', 'message_id'], name='unique_dialog_message'),
+        ]
+        indexes = [
+            # Date ranges of one dialog, used by the analytics rollups
+            models.Index(fields=['dialog', 'date'], name='message_dialog_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.dialog_id}:{self.message_id}"
+
+    def to_dict(self):
+        """
+        Same shape as TelegramClient.get_messages() items
+        """
+        return {
+            'id': self.message_id,
+            'date': self.date.isoformat() if self.date else None,
+            'text': self.text,
+            'sender_id': self.sender_id,
+            'sender_name': self.sender_name,
+            'is_reply': self.is_reply,
+            'reply_to_msg_id': self.reply_to_msg_id,
+            'media_type': self.media_type,
+            'has_media': self.has_media,
+        }
+
+
+class SyncCursor(models.Model):
+    """
+    Per-dialog high-water mark of the message mirror
+    """
+    dialog = models.OneToOneField(TelegramDialog, on_delete=models.CASCADE, related_name='sync_cursor')
+    max_message_id = models.BigIntegerField(default=0)
+    message_count = models.PositiveIntegerField(default=0)
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Sync Cursor'
+        verbose_name_plural = 'Sync Cursors'
+
+    def __str__(self):
+        return f"{self.dialog_id} @ {self.max_message_id}"
+
+
+class DialogActivity(models.Model):
+    """
+    Daily message counters per dialog, maintained by the listen_updates command
+    """
+    dialog = models.ForeignKey(TelegramDialog, on_delete=models.CASCADE, related_name='activity')
+    day = models.DateField()
+    message_count = models.PositiveIntegerField(default=0)
+    outgoing_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day']
+        verbose_name = 'Dialog Activity'
+        verbose_name_plural = 'Dialog Activity'
+        constraints = [
+            models.UniqueConstraint(fields=['dialog', 'day'], name='unique_dialog_activity_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.dialog_id} {self.day}: {self.message_count}"
+
+
+class ChatDailyStats(models.Model):
+    """
+    Analytics rollup: messages per dialog and day, computed from the mirror
+    """
+    dialog = models.ForeignKey(TelegramDialog, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField(db_index=True)
+    # ISO weekday of `day` (1 is Monday), stored so heatmaps don't compute it per row
+    weekday = models.PositiveSmallIntegerField()
+    message_count = models.PositiveIntegerField(default=0)
+    outgoing_count = models.PositiveIntegerField(default=0)
+    reply_count = models.PositiveIntegerField(default=0)
+    media_count = models.PositiveIntegerField(default=0)
+    sender_count = models.PositiveIntegerField(default=0)
+    # Messages per hour of the day, 24 counts
+    hourly_counts = models.JSONField(default=list)
+
+    class Meta:
+        ordering = ['-day']
+        verbose_name = 'Chat Daily Stats'
+        verbose_name_plural = 'Chat Daily Stats'
+        constraints = [
+            models.UniqueConstraint(fields=['dialog', 'day'], name='unique_chat_daily_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.dialog_id} {self.day}: {self.message_count}"
+
+
+class SenderDailyStats(models.Model):
+    """
+    Analytics rollup: messages per dialog, sender and day
+    """
+    dialog = models.ForeignKey(TelegramDialog, on_delete=models.CASCADE, related_name='sender_stats')
+    day = models.DateField(db_index=True)
+    sender_id = models.BigIntegerField(null=True, blank=True)
+    sender_name = models.CharField(max_length=255, null=True, blank=True)
+    message_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day']
+        verbose_name = 'Sender Daily Stats'
+        verbose_name_plural = 'Sender Daily Stats'
+        constraints = [
+            models.UniqueConstraint(fields=['dialog', 'day', 'sender_id'], name='unique_sender_daily_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.dialog_id} {self.day} {self.sender_id}: {self.message_count}"
+
+
+class MediaDailyStats(models.Model):
+    """
+    Analytics rollup: messages per dialog, day and media type
+    """
+    dialog = models.ForeignKey(TelegramDialog, on_delete=models.CASCADE, related_name='media_stats')
+    day = models.DateField(db_index=True)
+    media_type = models.CharField(max_length=50)
+    message_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Media Daily Stats'
+        verbose_name_plural = 'Media Daily Stats'
+        constraints = [
+            models.UniqueConstraint(fields=['dialog', 'day', 'media_type'], name='unique_media_daily_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.dialog_id} {self.day} {self.media_type}: {self.message_count}"
+
+
+class ResponseTimeStats(models.Model):
+    """
+    Analytics rollup: replies to someone else's message per dialog and day,
+    counted in response time buckets (see analytics.RESPONSE_BUCKETS)
+    """
+    dialog = models.ForeignKey(TelegramDialog, on_delete=models.CASCADE, related_name='response_stats')
+    day = models.DateField(db_index=True)
+    # Whether the reply was sent by the account itself
+    outgoing = models.BooleanField(default=False)
+    bucket = models.PositiveSmallIntegerField()
+    reply_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Response Time Stats'
+        verbose_name_plural = 'Response Time Stats'
+        constraints = [
+            models.UniqueConstraint(fields=['dialog', 'day', 'outgoing', 'bucket'], name='unique_response_time_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.dialog_id} {self.day} bucket {self.bucket}: {self.reply_count}"
+
+
+class TelegramEntity(models.Model):
+    """
+    Cached display name of a message sender (user, chat or channel),
+    the persistent part of TelegramClient's sender name cache
+    """
+    entity_id = models.BigIntegerField(unique=True)
+    name = models.CharField(max_length=255, null=True, blank=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = 'Telegram Entity'
+        verbose_name_plural = 'Telegram Entities'
+
+    def __str__(self):
+        return f"{self.entity_id}: {self.name}"
+
+
+class MediaBlob(models.Model):
+    """
+    A downloaded media file, stored once under TELEGRAM_MEDIA_ROOT and named by its SHA-256
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField(default=0)
+    mime_type = models.CharField(max_length=100, blank=True, default='')
+    # Relative to TELEGRAM_MEDIA_ROOT
+    path = models.CharField(max_length=255)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Media Blob'
+        verbose_name_plural = 'Media Blobs'
+
+    def __str__(self):
+        return self.path
+
+
+class MediaFile(models.Model):
+    """
+    Manifest entry: the media of one message and the blob holding its content
+    """
+    dialog_id = models.BigIntegerField()
+    message_id = models.BigIntegerField()
+    # Telegram's own file id ("photo:123", "document:456"), the same for every forward of a file
+    file_key = models.CharField(max_length=64, db_index=True)
+    file_name = models.CharField(max_length=255, blank=True, default='')
+    blob = models.ForeignKey(MediaBlob, on_delete=models.PROTECT, related_name='files')
+    downloaded_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Media File'
+        verbose_name_plural = 'Media Files'
+        constraints = [
+            models.UniqueConstraint(fields=['dialog_id', 'message_id'], name='unique_media_message'),
+        ]
+
+    def __str__(self):
+        return f"{self.dialog_id}:{self.message_id} -> {self.blob_id}"
+
+
+class ExportCheckpoint(models.Model):
+    """
+    Progress of a named export through one dialog, so an interrupted export resumes
+    """
+    name = models.CharField(max_length=100)
+    dialog_id = models.BigIntegerField()
+    # Highest message id written so far (exports run oldest first)
+    last_message_id = models.BigIntegerField(default=0)
+    message_count = models.PositiveIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Export Checkpoint'
+        verbose_name_plural = 'Export Checkpoints'
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'dialog_id'], name='unique_export_checkpoint'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} {self.dialog_id} @ {self.last_message_id}"
+
+
+class TelethonSession(models.Model):
+    """
+    A Telethon login (auth key and data center) kept in the database, see bot.sessions
+    """
+    name = models.CharField(max_length=100, unique=True)
+    dc_id = models.PositiveIntegerField(default=0)
+    server_address = models.CharField(max_length=255, null=True, blank=True)
+    port = models.PositiveIntegerField(null=True, blank=True)
+    auth_key = models.BinaryField(null=True, blank=True)
+    takeout_id = models.BigIntegerField(null=True, blank=True)
+    # Update state per entity id (0 for the common state): [pts, qts, timestamp, seq]
+    update_states = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Telethon Session'
+        verbose_name_plural = 'Telethon Sessions'
+
+    def __str__(self):
+        return f"{self.name} (DC {self.dc_id})"
+
+
+class TelethonSessionEntity(models.Model):
+    """
+    A cached input entity (peer id and access hash) of a Telethon session
+    """
+    session = models.ForeignKey(TelethonSession, on_delete=models.CASCADE, related_name='entities')
+    entity_id = models.BigIntegerField()
+    access_hash = models.BigIntegerField(default=0)
+    username = models.CharField(max_length=100, null=True, blank=True)
+    phone = models.CharField(max_length=32, null=True, blank=True)
+    name = models.CharField(max_length=255, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Telethon Session Entity'
+        verbose_name_plural = 'Telethon Session Entities'
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'entity_id'], name='unique_session_entity'),
+        ]
+
     def __str__(self):
-        return f"{self.name} - {self.subject}"
\ No newline at end of file
+        return f"{self.session_id}: {self.entity_id}"
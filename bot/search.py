@@ -0,0 +1,175 @@
+"""
+Full-text search over mirrored Telegram messages with SQLite FTS5.
+
+The index is an external-content FTS5 table over TelegramMessage.text, kept
+current by triggers, so messages written by sync_messages are searchable as
+soon as they are committed. The table and triggers are created after migrate
+(see BotConfig.ready) because this project generates its migrations on deploy.
+"""
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.utils import timezone
+from datetime import timezone as dt_timezone
+from django.utils.dateparse import parse_datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'bot_telegrammessage_fts'
+MESSAGE_TABLE = 'bot_telegrammessage'
+DIALOG_TABLE = 'bot_telegramdialog'
+
+SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text,
+        content='{MESSAGE_TABLE}',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON {MESSAGE_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON {MESSAGE_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF text ON {MESSAGE_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+]
+
+
+def is_available(using=DEFAULT_DB_ALIAS):
+    """
+    Whether the database supports the FTS5 index
+    """
+    return connections[using].vendor == 'sqlite'
+
+
+def ensure_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Create the FTS5 table and its triggers on the `using` database if they
+    don't exist yet. A newly created index is filled from the existing messages.
+    Safe to call repeatedly; connected to post_migrate.
+    """
+    if not is_available(using):
+        return False
+
+    db = connections[using]
+    with db.cursor() as cursor:
+        tables = db.introspection.table_names(cursor)
+        if MESSAGE_TABLE not in tables:
+            return False
+        created = FTS_TABLE not in tables
+        for statement in SCHEMA:
+            cursor.execute(statement)
+        if created:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            logger.info("Created the message search index")
+    return True
+
+
+def rebuild():
+    """
+    Rebuild the index from the messages table
+    """
+    ensure_index()
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def optimize():
+    """
+    Merge the index b-trees, worth running after large syncs
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def build_query(text):
+    """
+    Turn plain search text into an FTS5 query matching all words.
+    A trailing * on a word keeps its prefix search.
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*').replace('"', '""')
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return ' '.join(terms)
+
+
+def _to_isoformat(value):
+    # Raw queries return the stored UTC datetime string
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value is None:
+        return None
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value.isoformat()
+
+
+def search(query, dialog_id=None, sender_id=None, since=None, until=None, limit=20,
+           highlight=('[', ']'), raw=False):
+    """
+    Ranked search over mirrored messages, best match first.
+    `query` is plain text unless raw=True, in which case it is passed to FTS5
+    as is (phrases, OR, NOT, NEAR, prefix*). `since`/`until` are datetimes.
+    Returns a list of dicts with the message, its dialog and a highlighted snippet.
+    """
+    match = query if raw else build_query(query)
+    if not match:
+        return []
+
+    where = [f"{FTS_TABLE} MATCH %s"]
+    params = [highlight[0], highlight[1], match]
+    if dialog_id is not None:
+        where.append("d.dialog_id = %s")
+        params.append(dialog_id)
+    if sender_id is not None:
+        where.append("m.sender_id = %s")
+        params.append(sender_id)
+    if since is not None:
+        where.append("m.date >= %s")
+        params.append(connection.ops.adapt_datetimefield_value(since))
+    if until is not None:
+        where.append("m.date < %s")
+        params.append(connection.ops.adapt_datetimefield_value(until))
+    params.append(limit)
+
+    sql = f"""
+        SELECT d.dialog_id, d.title, d.name, m.message_id, m.date, m.sender_id, m.sender_name,
+               snippet({FTS_TABLE}, 0, %s, %s, '…', 16), bm25({FTS_TABLE}) AS rank
+        FROM {FTS_TABLE}
+        JOIN {MESSAGE_TABLE} m ON m.id = {FTS_TABLE}.rowid
+        JOIN {DIALOG_TABLE} d ON d.id = m.dialog_id
+        WHERE {' AND '.join(where)}
+        ORDER BY rank
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    return [
+        {
+            'dialog_id': dialog,
+            'dialog_title': title or name,
+            'id': message_id,
+            'date': _to_isoformat(date),
+            'sender_id': sender,
+            'sender_name': sender_name,
+            'snippet': snippet,
+            'rank': rank,
+        }
+        for dialog, title, name, message_id, date, sender, sender_name, snippet, rank in rows
+    ]
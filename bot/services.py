@@ -1,16 +1,605 @@
 import telebot
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from collections import OrderedDict
+from datetime import timedelta
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from requests.adapters import HTTPAdapter
+import heapq
+import itertools
 import logging
+import queue
 import requests
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+
+class TelegramBotTransport:
+    """
+    Process-wide pooled transport for the Telegram Bot API.
+    Keeps a keep-alive requests.Session so the TCP+TLS handshake to
+    api.telegram.org is paid once per pooled connection, not once per call.
+    Use TelegramBotTransport.get_instance() instead of creating it directly.
+    """
+    
+    API_URL = 'https://api.telegram.org/bot{token}/{method}'
+    
+    _instance = None
+    _instance_lock = threading.Lock()
+    
+    def __init__(self, bot_token, pool_size=10, connect_timeout=5, read_timeout=15):
+        self.bot_token = bot_token
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+    
+    @classmethod
+    def get_instance(cls):
+        """
+        Get or create the shared transport for this process
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls(
+                        settings.TELEGRAM_BOT_TOKEN,
+                        pool_size=settings.TELEGRAM_API_POOL_SIZE,
+                        connect_timeout=settings.TELEGRAM_API_CONNECT_TIMEOUT,
+                        read_timeout=settings.TELEGRAM_API_READ_TIMEOUT
+                    )
+                    logger.info(f"Telegram Bot API transport created (pool size: {cls._instance.pool_size})")
+        return cls._instance
+    
+    def call(self, method, params=None, read_timeout=None):
+        """
+        Call a Bot API method and return its `result`.
+        Raises telebot.apihelper.ApiTelegramException when Telegram returns ok=false,
+        so callers can handle errors the same way as with telebot.
+        """
+        url = self.API_URL.format(token=self.bot_token, method=method)
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        
+        with self._stats_lock:
+            self._requests += 1
+        try:
+            response = self.session.post(url, json=params or {}, timeout=timeout)
+            try:
+                result_json = response.json()
+            except ValueError:
+                raise telebot.apihelper.ApiInvalidJSONException(method, response)
+            
+            if not result_json.get('ok'):
+                raise telebot.apihelper.ApiTelegramException(method, response, result_json)
+            return result_json['result']
+        except Exception:
+            with self._stats_lock:
+                self._errors += 1
+            raise
+    
+    def get_stats(self):
+        """
+        Connection reuse statistics for this process
+        """
+        connections = 0
+        pool_requests = 0
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                pool_requests += pool.num_requests
+        
+        with self._stats_lock:
+            requests_made = self._requests
+            errors = self._errors
+        
+        return {
+            'requests': requests_made,
+            'errors': errors,
+            'connections_opened': connections,
+            'connections_reused': max(pool_requests - connections, 0),
+            'pool_size': self.pool_size,
+        }
+
+
+class TelegramSendScheduler:
+    """
+    Rate-limit-aware scheduler for outgoing Bot API messages.
+    A background thread releases queued calls while respecting the global
+    limit (~30 msg/s) and the per-chat limit (~1 msg/s), pausing when
+    Telegram answers 429 with retry_after, and hands them to a pool of
+    sender threads as large as the transport's connection pool, so one
+    slow round trip doesn't hold back the next message. A chat has at most
+    one call in flight, which keeps its messages in order. Lower priority
+    values are sent first, so admin notifications overtake bot replies.
+    Limits are enforced per process.
+    """
+    
+    PRIORITY_ADMIN = 0
+    PRIORITY_REPLY = 10
+    
+    _instance = None
+    _instance_lock = threading.Lock()
+    
+    def __init__(self, transport, global_rate=30, chat_rate=1, max_retries=5, workers=None):
+        self.transport = transport
+        self.global_interval = 1.0 / global_rate
+        self.chat_interval = 1.0 / chat_rate
+        self.max_retries = max_retries
+        # More senders than pooled connections would only wait for a connection
+        self.workers = workers or transport.pool_size
+        
+        self._queue = []  # heap of (priority, seq, item)
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._executor = None
+        self._in_flight_chats = set()
+        self._in_flight = 0
+        
+        self._next_global_at = 0.0
+        self._next_chat_at = {}
+        self._paused_until = 0.0
+        
+        self._sent = 0
+        self._failed = 0
+        self._rate_limited = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+    
+    @classmethod
+    def get_instance(cls):
+        """
+        Get or create the shared scheduler for this process
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls(
+                        TelegramBotTransport.get_instance(),
+                        global_rate=settings.TELEGRAM_GLOBAL_RATE_LIMIT,
+                        chat_rate=settings.TELEGRAM_CHAT_RATE_LIMIT,
+                        max_retries=settings.TELEGRAM_SEND_MAX_RETRIES
+                    )
+        return cls._instance
+    
+    def submit(self, method, params, priority=PRIORITY_REPLY):
+        """
+        Queue a Bot API call and return a Future with its result
+        """
+        future = Future()
+        item = {
+            'method': method,
+            'params': params,
+            'chat_id': params.get('chat_id'),
+            'priority': priority,
+            'seq': next(self._seq),
+            'future': future,
+            'queued_at': time.monotonic(),
+            'retries': 0,
+        }
+        with self._condition:
+            heapq.heappush(self._queue, (priority, item['seq'], item))
+            self._ensure_worker()
+            self._condition.notify()
+        return future
+    
+    def call(self, method, params, priority=PRIORITY_REPLY, timeout=None):
+        """
+        Queue a Bot API call and wait for its result.
+        If the call is still queued when the timeout expires it is cancelled,
+        so a timed-out message is never sent later behind the caller's back.
+        """
+        future = self.submit(method, params, priority)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                raise
+            # Already being sent, wait for the outcome
+            return future.result()
+    
+    def _ensure_worker(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='telegram-send')
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='telegram-send-scheduler', daemon=True)
+            self._thread.start()
+    
+    def _next_ready(self, now):
+        """
+        Pop the highest-priority item whose chat is allowed to send now.
+        Returns (item, None) or (None, seconds to wait), where None seconds
+        means wait until a sender finishes.
+        """
+        wait = max(self._paused_until - now, self._next_global_at - now)
+        if wait > 0:
+            return None, wait
+        if self._in_flight >= self.workers:
+            return None, None
+        
+        wait = None
+        for entry in sorted(self._queue):
+            item = entry[2]
+            if item['future'].cancelled():
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                return None, 0
+            if item['chat_id'] in self._in_flight_chats:
+                continue
+            chat_wait = self._next_chat_at.get(item['chat_id'], 0.0) - now
+            if chat_wait <= 0:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                return item, None
+            wait = chat_wait if wait is None else min(wait, chat_wait)
+        return None, wait
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    item, wait = self._next_ready(now)
+                    if item is not None:
+                        break
+                    self._condition.wait(timeout=wait)
+                
+                self._next_global_at = now + self.global_interval
+                self._next_chat_at[item['chat_id']] = now + self.chat_interval
+                if len(self._next_chat_at) > 10000:
+                    self._next_chat_at = {k: v for k, v in self._next_chat_at.items() if v > now}
+                self._in_flight += 1
+                self._in_flight_chats.add(item['chat_id'])
+            
+            self._executor.submit(self._send_released, item, now)
+    
+    def _send_released(self, item, started_at):
+        """
+        Send on a sender thread, then free the item's slot and chat
+        """
+        try:
+            self._send(item, started_at)
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._in_flight_chats.discard(item['chat_id'])
+                self._condition.notify()
+    
+    def _send(self, item, started_at):
+        future = item['future']
+        if item['retries'] == 0 and not future.set_running_or_notify_cancel():
+            return
+        
+        waited = started_at - item['queued_at']
+        try:
+            result = self.transport.call(item['method'], item['params'])
+        except telebot.apihelper.ApiTelegramException as api_error:
+            if api_error.error_code == 429 and item['retries'] < self.max_retries:
+                retry_after = (api_error.result_json.get('parameters') or {}).get('retry_after', 1)
+                logger.warning(f"Telegram rate limit hit, retrying {item['method']} "
+                               f"to {item['chat_id']} in {retry_after}s")
+                with self._condition:
+                    self._rate_limited += 1
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                    item['retries'] += 1
+                    # Keep the original position in the queue
+                    heapq.heappush(self._queue, (item['priority'], item['seq'], item))
+                    self._condition.notify()
+                return
+            self._record(waited, sent=False)
+            future.set_exception(api_error)
+            return
+        except Exception as e:
+            self._record(waited, sent=False)
+            future.set_exception(e)
+            return
+        
+        self._record(waited, sent=True)
+        future.set_result(result)
+    
+    def _record(self, waited, sent):
+        with self._condition:
+            if sent:
+                self._sent += 1
+            else:
+                self._failed += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+    
+    def get_stats(self):
+        """
+        Queue depth and wait-time statistics
+        """
+        with self._condition:
+            completed = self._sent + self._failed
+            return {
+                'queue_depth': len(self._queue),
+                'queue_depth_admin': sum(1 for entry in self._queue if entry[0] == self.PRIORITY_ADMIN),
+                'in_flight': self._in_flight,
+                'sent': self._sent,
+                'failed': self._failed,
+                'rate_limited': self._rate_limited,
+                'avg_wait': self._wait_total / completed if completed else 0.0,
+                'max_wait': self._wait_max,
+                'paused_for': max(self._paused_until - time.monotonic(), 0.0),
+            }
+
+
+class UpdateDispatcher:
+    """
+    Bounded background worker pool for incoming bot updates.
+    The webhook view only enqueues the update and returns, so a slow reply
+    never holds back the updates Telegram has queued behind it. When the
+    queue is full, submit() returns False and the caller should ask
+    Telegram to redeliver later (backpressure).
+    """
+    
+    def __init__(self, handler, workers=4, queue_size=100, put_timeout=0.05):
+        self.handler = handler
+        self.workers = workers
+        self.put_timeout = put_timeout
+        
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        # Updates a worker has taken off the queue and is handling, by id()
+        self._active = {}
+        
+        self._accepted = 0
+        self._processed = 0
+        self._failed = 0
+        self._overflow = 0
+        self._max_depth = 0
+    
+    def submit(self, update, timeout=None, block=False):
+        """
+        Queue an update for processing.
+        Returns False if the queue stayed full for `timeout` seconds
+        (put_timeout by default). With `block`, waits for room as long as
+        it takes instead, for callers that can simply stop fetching (polling);
+        that wait is backpressure, not overflow.
+        """
+        self._ensure_workers()
+        try:
+            if block:
+                self._queue.put(update)
+            else:
+                self._queue.put(update, timeout=timeout if timeout is not None else self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self._overflow += 1
+            logger.warning(f"Update queue is full ({self._queue.maxsize}), rejecting update")
+            return False
+        
+        with self._lock:
+            self._accepted += 1
+            self._max_depth = max(self._max_depth, self._queue.qsize())
+        return True
+    
+    def _ensure_workers(self):
+        if len(self._threads) >= self.workers:
+            return
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._run,
+                    name=f'telegram-update-worker-{len(self._threads) + 1}',
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+    
+    def _run(self):
+        while True:
+            update = self._queue.get()
+            with self._lock:
+                self._active[id(update)] = update
+            try:
+                self.handler(update)
+                with self._lock:
+                    self._processed += 1
+            except Exception as e:
+                with self._lock:
+                    self._failed += 1
+                logger.error(f"Error processing update {update.get('update_id')}: {str(e)}", exc_info=True)
+            finally:
+                with self._lock:
+                    self._active.pop(id(update), None)
+                self._queue.task_done()
+    
+    def wait(self, timeout=None):
+        """
+        Block until every submitted update has been handled.
+        Returns False if some were still pending after `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+    
+    def drain(self, timeout=10):
+        """
+        Stop handing out queued updates and give the workers `timeout` seconds
+        to finish the ones they are handling. Returns (queued, running): the
+        updates that never started, and the ones still running after the
+        timeout, which may have been partly handled (e.g. already answered).
+        """
+        queued = []
+        while True:
+            try:
+                queued.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            self._queue.task_done()
+        self.wait(timeout)
+        with self._lock:
+            running = list(self._active.values())
+        return queued, running
+    
+    def get_stats(self):
+        """
+        Queue depth, throughput and overflow statistics
+        """
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_depth': self._max_depth,
+                'queue_size': self._queue.maxsize,
+                'workers': self.workers,
+                'accepted': self._accepted,
+                'processed': self._processed,
+                'failed': self._failed,
+                'overflow': self._overflow,
+            }
+
+
+class UpdateDeduplicator:
+    """
+    Remembers which Telegram update_ids were already accepted so that
+    redelivered updates are not processed (and answered) twice.
+    Recent ids are kept in an in-memory LRU; the ProcessedUpdate table makes
+    the check work across workers and restarts. Updates older than the
+    high-water mark minus `window` are rejected without a ProcessedUpdate
+    lookup. The mark is read from the database on every claim rather than
+    cached, since other workers advance it and prune ProcessedUpdate below it.
+    """
+    
+    HIGH_WATER_KEY = 'update_high_water'
+    PRUNE_EVERY = 500
+    
+    def __init__(self, cache_size=1000, window=10000):
+        self.cache_size = cache_size
+        self.window = window
+        
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._high_water = None  # last value read, for get_stats()
+        self._claims = 0
+        self._duplicates = 0
+    
+    def _remember(self, update_id):
+        self._seen[update_id] = True
+        self._seen.move_to_end(update_id)
+        while len(self._seen) > self.cache_size:
+            self._seen.popitem(last=False)
+    
+    def high_water(self):
+        """
+        Highest update_id accepted so far by any worker
+        """
+        from .models import BotState
+        
+        self._high_water = (BotState.objects.filter(key=self.HIGH_WATER_KEY)
+                            .values_list('value', flat=True).first() or 0)
+        return self._high_water
+    
+    def _advance_high_water(self, update_id):
+        from .models import BotState
+        
+        self._high_water = update_id
+        # Conditional, so a worker that read an older mark never moves it backwards
+        updated = BotState.objects.filter(key=self.HIGH_WATER_KEY, value__lt=update_id).update(value=update_id)
+        if not updated:
+            BotState.objects.get_or_create(key=self.HIGH_WATER_KEY, defaults={'value': update_id})
+    
+    def claim(self, update_id):
+        """
+        Mark an update as being processed.
+        Returns False if it was seen before and should be skipped.
+        """
+        from .models import ProcessedUpdate
+        
+        if update_id is None:
+            return True
+        
+        with self._lock:
+            if update_id in self._seen:
+                self._seen.move_to_end(update_id)
+                self._duplicates += 1
+                return False
+            
+            high_water = self.high_water()
+            if update_id <= high_water - self.window:
+                self._duplicates += 1
+                return False
+            
+            try:
+                with transaction.atomic():
+                    ProcessedUpdate.objects.create(update_id=update_id)
+            except IntegrityError:
+                self._remember(update_id)
+                self._duplicates += 1
+                return False
+            
+            self._remember(update_id)
+            if update_id > high_water:
+                self._advance_high_water(update_id)
+                high_water = update_id
+            
+            self._claims += 1
+            if self._claims % self.PRUNE_EVERY == 0:
+                ProcessedUpdate.objects.filter(update_id__lte=high_water - self.window).delete()
+        return True
+    
+    def release(self, update_id):
+        """
+        Forget a claimed update so that a redelivery is processed again
+        """
+        from .models import ProcessedUpdate
+        
+        if update_id is None:
+            return
+        
+        with self._lock:
+            self._seen.pop(update_id, None)
+            ProcessedUpdate.objects.filter(update_id=update_id).delete()
+    
+    def get_stats(self):
+        with self._lock:
+            return {
+                'claimed': self._claims,
+                'duplicates': self._duplicates,
+                'cached': len(self._seen),
+                'high_water': self._high_water,
+            }
+
+
 class TelegramBotService:
     def __init__(self):
         self.bot_token = settings.TELEGRAM_BOT_TOKEN
         self.admin_id = settings.TELEGRAM_ADMIN_ID
         self.webhook_url = settings.TELEGRAM_WEBHOOK_URL
-        self.bot = None
+    
+    @property
+    def transport(self):
+        """
+        Shared pooled Bot API transport
+        """
+        return TelegramBotTransport.get_instance()
+    
+    @property
+    def scheduler(self):
+        """
+        Shared rate-limited send scheduler
+        """
+        return TelegramSendScheduler.get_instance()
     
     def send_message_to_admin(self, message_text):
         """
@@ -25,13 +614,13 @@ class TelegramBotService:
                 logger.error("Telegram admin ID not configured")
                 return False
             
-            # Create bot instance if not exists
-            if not self.bot:
-                self.bot = telebot.TeleBot(self.bot_token)
-            
             # Send message to admin
             try:
-                self.bot.send_message(int(self.admin_id), message_text, parse_mode='HTML')
+                self.scheduler.call('sendMessage', {
+                    'chat_id': int(self.admin_id),
+                    'text': message_text,
+                    'parse_mode': 'HTML'
+                }, priority=TelegramSendScheduler.PRIORITY_ADMIN, timeout=settings.TELEGRAM_SEND_TIMEOUT)
                 logger.info(f"Message sent to admin {self.admin_id}")
                 return True
             except telebot.apihelper.ApiTelegramException as api_error:
@@ -74,6 +663,17 @@ class TelegramBotService:
         
         return self.send_message_to_admin(message_text)
     
+    def send_contact_message(self, contact_message):
+        """
+        Send a stored ContactMessage to admin via Telegram
+        """
+        return self.send_contact_form_message(
+            contact_message.name,
+            contact_message.email,
+            contact_message.subject,
+            contact_message.message
+        )
+    
     def send_message_to_user(self, user_id, message_text):
         """
         Send a message to a specific user via Telegram bot
@@ -83,12 +683,10 @@ class TelegramBotService:
                 logger.error("Telegram bot token not configured")
                 return False
             
-            # Create bot instance if not exists
-            if not self.bot:
-                self.bot = telebot.TeleBot(self.bot_token)
-            
             # Send message to user
-            self.bot.send_message(user_id, message_text)
+            self.scheduler.call('sendMessage', {'chat_id': user_id, 'text': message_text},
+                                priority=TelegramSendScheduler.PRIORITY_REPLY,
+                                timeout=settings.TELEGRAM_SEND_TIMEOUT)
             logger.info(f"Message sent to user {user_id}")
             return True
             
@@ -105,12 +703,8 @@ class TelegramBotService:
                 logger.error("Webhook URL not configured")
                 return False
             
-            # Create bot instance if not exists
-            if not self.bot:
-                self.bot = telebot.TeleBot(self.bot_token)
-            
             # Set webhook
-            self.bot.set_webhook(url=self.webhook_url)
+            self.transport.call('setWebhook', {'url': self.webhook_url})
             logger.info(f"Webhook set to: {self.webhook_url}")
             return True
             
@@ -123,12 +717,8 @@ class TelegramBotService:
         Delete webhook for the bot (use polling instead)
         """
         try:
-            # Create bot instance if not exists
-            if not self.bot:
-                self.bot = telebot.TeleBot(self.bot_token)
-            
             # Delete webhook
-            self.bot.remove_webhook()
+            self.transport.call('deleteWebhook')
             logger.info("Webhook deleted")
             return True
             
@@ -141,14 +731,135 @@ class TelegramBotService:
         Get current webhook information
         """
         try:
-            # Create bot instance if not exists
-            if not self.bot:
-                self.bot = telebot.TeleBot(self.bot_token)
-            
             # Get webhook info
-            webhook_info = self.bot.get_webhook_info()
+            webhook_info = telebot.types.WebhookInfo.de_json(self.transport.call('getWebhookInfo'))
             return webhook_info
             
         except Exception as e:
             logger.error(f"Error getting webhook info: {str(e)}")
             return None
+
+
+class ContactOutbox:
+    """
+    Delivers stored contact messages to Telegram in batches.
+    Rows with sent_to_telegram=False are retried with exponential backoff
+    until they are delivered or run out of attempts.
+    """
+    
+    def __init__(self, batch_size=None, max_attempts=None, retry_delay=None, max_retry_delay=None):
+        self.batch_size = batch_size or settings.TELEGRAM_OUTBOX_BATCH_SIZE
+        self.max_attempts = max_attempts or settings.TELEGRAM_OUTBOX_MAX_ATTEMPTS
+        self.retry_delay = retry_delay or settings.TELEGRAM_OUTBOX_RETRY_DELAY
+        self.max_retry_delay = max_retry_delay or settings.TELEGRAM_OUTBOX_MAX_RETRY_DELAY
+        self.bot_service = TelegramBotService()
+    
+    def pending(self):
+        """
+        Messages that are due for a delivery attempt, oldest first
+        """
+        from .models import ContactMessage
+        
+        return ContactMessage.objects.filter(
+            sent_to_telegram=False,
+            delivery_attempts__lt=self.max_attempts,
+            next_attempt_at__lte=timezone.now()
+        ).order_by('next_attempt_at', 'id')
+    
+    def backoff(self, attempts):
+        """
+        Delay before the next attempt after `attempts` failed deliveries
+        """
+        delay = self.retry_delay * (2 ** max(attempts - 1, 0))
+        return timedelta(seconds=min(delay, self.max_retry_delay))
+    
+    @staticmethod
+    def send_lease():
+        """
+        Longest a delivery can take: the wait in the send scheduler's queue, then
+        the first request and every 429 retry running into the HTTP timeouts
+        """
+        request = settings.TELEGRAM_API_CONNECT_TIMEOUT + settings.TELEGRAM_API_READ_TIMEOUT
+        return timedelta(seconds=settings.TELEGRAM_SEND_TIMEOUT + request * (settings.TELEGRAM_SEND_MAX_RETRIES + 1))
+    
+    @classmethod
+    def lease_until(cls):
+        """
+        next_attempt_at for a message whose delivery starts now, so no worker claims it meanwhile
+        """
+        return timezone.now() + cls.send_lease()
+    
+    def claim(self, contact_message):
+        """
+        Lease a message so that concurrent workers don't deliver it twice.
+        The lease outlasts the delivery; if the worker dies, the message is
+        retried after the lease or the backoff, whichever is longer.
+        Returns False if another worker got to it first.
+        """
+        from .models import ContactMessage
+        
+        lease_until = max(self.lease_until(), timezone.now() + self.backoff(contact_message.delivery_attempts + 1))
+        claimed = ContactMessage.objects.filter(
+            pk=contact_message.pk,
+            sent_to_telegram=False,
+            next_attempt_at=contact_message.next_attempt_at
+        ).update(next_attempt_at=lease_until)
+        if claimed:
+            contact_message.next_attempt_at = lease_until
+        return bool(claimed)
+    
+    def deliver(self, contact_message):
+        """
+        Try to deliver a single message and record the outcome
+        """
+        now = timezone.now()
+        error = ''
+        try:
+            sent = self.bot_service.send_contact_message(contact_message)
+            if not sent:
+                error = 'Telegram API did not accept the message'
+        except Exception as e:
+            sent = False
+            error = str(e)
+        
+        contact_message.delivery_attempts += 1
+        contact_message.last_attempt_at = now
+        contact_message.sent_to_telegram = sent
+        contact_message.last_error = error
+        if not sent:
+            contact_message.next_attempt_at = now + self.backoff(contact_message.delivery_attempts)
+        contact_message.save(update_fields=[
+            'delivery_attempts', 'last_attempt_at', 'sent_to_telegram',
+            'last_error', 'next_attempt_at'
+        ])
+        
+        if sent:
+            logger.info(f"Outbox: contact message {contact_message.pk} delivered "
+                        f"(attempt {contact_message.delivery_attempts})")
+        elif contact_message.delivery_attempts >= self.max_attempts:
+            logger.error(f"Outbox: giving up on contact message {contact_message.pk} "
+                         f"after {contact_message.delivery_attempts} attempts: {error}")
+        else:
+            logger.warning(f"Outbox: contact message {contact_message.pk} failed "
+                           f"(attempt {contact_message.delivery_attempts}), "
+                           f"retrying at {contact_message.next_attempt_at}: {error}")
+        return sent
+    
+    def process_batch(self):
+        """
+        Deliver one batch of pending messages.
+        Returns a dict with counts of sent, failed and skipped messages.
+        """
+        stats = {'sent': 0, 'failed': 0, 'skipped': 0}
+        
+        for contact_message in list(self.pending()[:self.batch_size]):
+            if not self.claim(contact_message):
+                stats['skipped'] += 1
+                continue
+            
+            if self.deliver(contact_message):
+                stats['sent'] += 1
+            else:
+                stats['failed'] += 1
+        
+        return stats
@@ -0,0 +1,192 @@
+"""
+Database-backed Telethon sessions.
+
+Telethon's default sessions are SQLite files in the working directory, and
+every process using one holds a lock on it, so two commands (or a command
+next to the web process) end up serializing on "database is locked".
+DatabaseSession keeps the session in memory like Telethon's MemorySession
+and stores it in Django's database instead: the auth key and data center
+are written as soon as they change, and the entity cache and update state
+are flushed every few seconds and when the client disconnects.
+
+Enabled with TELEGRAM_SESSION_BACKEND=database; existing .session files
+are copied over with the import_session command.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import logging
+import time
+from django.db import close_old_connections, transaction
+from telethon import types, utils
+from telethon.crypto import AuthKey
+from telethon.sessions import MemorySession
+from .models import TelethonSession, TelethonSessionEntity
+
+logger = logging.getLogger(__name__)
+
+# Telethon calls the session from its event loop, where Django refuses
+# synchronous queries, so all database access runs on this thread
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='telethon-session')
+
+
+def _run_db(func, *args):
+    def call():
+        close_old_connections()
+        return func(*args)
+    return _executor.submit(call)
+
+
+class DatabaseSession(MemorySession):
+    """
+    Telethon session stored in the TelethonSession and TelethonSessionEntity
+    tables under `name`. Processes using the same name share the login.
+    """
+
+    def __init__(self, name, flush_interval=5.0):
+        super().__init__()
+        self.name = name
+        self.flush_interval = flush_interval
+        # Entity rows (id, hash, username, phone, name) keyed by id
+        self._entities = {}
+        self._dirty_entities = {}
+        self._dirty_session = False
+        self._dirty_states = False
+        self._last_flush = time.monotonic()
+        _run_db(self._load).result()
+
+    def _load(self):
+        row = TelethonSession.objects.filter(name=self.name).first()
+        if row is None:
+            return
+        self._dc_id = row.dc_id
+        self._server_address = row.server_address
+        self._port = row.port
+        self._auth_key = AuthKey(data=bytes(row.auth_key)) if row.auth_key else None
+        self._takeout_id = row.takeout_id
+        for entity_id, (pts, qts, timestamp, seq) in row.update_states.items():
+            self._update_states[int(entity_id)] = types.updates.State(
+                pts=pts, qts=qts, date=datetime.fromtimestamp(timestamp, tz=timezone.utc), seq=seq, unread_count=0
+            )
+        rows = row.entities.values_list('entity_id', 'access_hash', 'username', 'phone', 'name')
+        self._entities = {entity[0]: entity for entity in rows}
+
+    # Session data: written right away, Telethon can't reconnect without it
+
+    def set_dc(self, dc_id, server_address, port):
+        super().set_dc(dc_id, server_address, port)
+        self._dirty_session = True
+
+    @MemorySession.auth_key.setter
+    def auth_key(self, value):
+        self._auth_key = value
+        self._dirty_session = True
+
+    @MemorySession.takeout_id.setter
+    def takeout_id(self, value):
+        self._takeout_id = value
+        self._dirty_session = True
+        self.save()
+
+    def set_update_state(self, entity_id, state):
+        super().set_update_state(entity_id, state)
+        self._dirty_states = True
+
+    # Entity cache: a dict instead of MemorySession's set, looked up by id
+
+    def process_entities(self, tlo):
+        for row in self._entities_to_rows(tlo):
+            if self._entities.get(row[0]) != row:
+                self._entities[row[0]] = row
+                self._dirty_entities[row[0]] = row
+        if self._dirty_entities and time.monotonic() - self._last_flush >= self.flush_interval:
+            self._flush()
+
+    def _find(self, index, value):
+        return next(((row[0], row[1]) for row in self._entities.values() if row[index] == value), None)
+
+    def get_entity_rows_by_phone(self, phone):
+        return self._find(3, phone)
+
+    def get_entity_rows_by_username(self, username):
+        return self._find(2, username)
+
+    def get_entity_rows_by_name(self, name):
+        return self._find(4, name)
+
+    def get_entity_rows_by_id(self, id, exact=True):
+        ids = [id] if exact else [
+            utils.get_peer_id(types.PeerUser(id)),
+            utils.get_peer_id(types.PeerChat(id)),
+            utils.get_peer_id(types.PeerChannel(id)),
+        ]
+        for entity_id in ids:
+            row = self._entities.get(entity_id)
+            if row:
+                return row[0], row[1]
+        return None
+
+    # Flushing
+
+    def save(self):
+        if self._dirty_session:
+            # Wait for it: a lost auth key means signing in again
+            self._flush().result()
+        elif (self._dirty_entities or self._dirty_states) and \
+                time.monotonic() - self._last_flush >= self.flush_interval:
+            self._flush()
+
+    def close(self):
+        self._flush().result()
+
+    def delete(self):
+        _run_db(TelethonSession.objects.filter(name=self.name).delete).result()
+        self._dirty_session = False
+        self._dirty_states = False
+        self._dirty_entities = {}
+
+    def _flush(self):
+        """
+        Hand a snapshot of the changes to the database thread, returns its future
+        """
+        session = None
+        if self._dirty_session or self._dirty_states:
+            session = {
+                'dc_id': self._dc_id or 0,
+                'server_address': self._server_address,
+                'port': self._port,
+                'auth_key': self._auth_key.key if self._auth_key else None,
+                'takeout_id': self._takeout_id,
+                'update_states': {
+                    str(entity_id): [state.pts, state.qts, int(state.date.timestamp()), state.seq]
+                    for entity_id, state in self._update_states.items()
+                },
+            }
+        entities = list(self._dirty_entities.values())
+        self._dirty_session = False
+        self._dirty_states = False
+        self._dirty_entities = {}
+        self._last_flush = time.monotonic()
+        return _run_db(self._write, session, entities)
+
+    def _write(self, session, entities):
+        try:
+            with transaction.atomic():
+                if session is not None:
+                    row, _ = TelethonSession.objects.update_or_create(name=self.name, defaults=session)
+                else:
+                    row, _ = TelethonSession.objects.get_or_create(name=self.name)
+                if entities:
+                    TelethonSessionEntity.objects.bulk_create(
+                        [
+                            TelethonSessionEntity(session=row, entity_id=entity_id, access_hash=access_hash,
+                                                  username=username, phone=phone, name=name)
+                            for entity_id, access_hash, username, phone, name in entities
+                        ],
+                        batch_size=500,
+                        update_conflicts=True,
+                        unique_fields=['session', 'entity_id'],
+                        update_fields=['access_hash', 'username', 'phone', 'name', 'updated_at'],
+                    )
+        except Exception as e:
+            logger.error(f"Error saving Telethon session {self.name}: {str(e)}")
+            raise
@@ -0,0 +1,250 @@
+"""
+Sharded message export over several worker processes.
+
+One MTProto connection caps how fast a full-account export can go, so
+ShardedExport spreads the dialogs over N processes, each with its own
+connection and its own copy of the user session. Workers pull dialogs from
+a shared queue and spool each one to a JSON lines file. The coordinator
+streams every finished dialog from its spool file, so the output keeps each
+dialog's messages together in the usual (dialog, message, error) stream.
+
+Each shard handles FloodWaits itself, up to a budget of waiting time, and
+tells the coordinator how long it will be waiting. A shard that goes over
+its budget, or stops reporting progress for `stall_timeout` seconds beyond
+any announced wait, loses its dialog: the dialog is queued again for
+the other shards, and whatever the stalled shard sends for it later is ignored.
+
+Messages arrive in the order dialogs finish, not in dialog list order.
+"""
+from decouple import config
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds between progress reports of a worker
+PROGRESS_INTERVAL = 5
+
+
+def clone_session(name, shard, directory):
+    """
+    Name of the session shard `shard` connects with. File sessions are copied
+    into `directory`, since two processes can't share a SQLite session; the
+    copy holds the account's auth key, so the caller removes the directory.
+    Database sessions are loaded by every process on its own and need no copy.
+    """
+    if config('TELEGRAM_SESSION_BACKEND', default='file') == 'database':
+        return name
+    clone = os.path.join(directory, f'{os.path.basename(name)}.shard{shard}')
+    shutil.copyfile(f'{name}.session', f'{clone}.session')
+    return clone
+
+
+def run_shard(shard, session_name, tasks, results, spool_dir, options):
+    """
+    Worker process: export dialogs from `tasks` until it gets None.
+    Reports to `results` as (kind, shard, ...) tuples.
+    """
+    import django
+    django.setup()
+    from telethon.errors import FloodWaitError
+    from .telegram_client import get_telegram_client, json_default
+
+    client = get_telegram_client()
+    client.user_session_name = session_name
+    user_client = client.get_client(use_user_account=True)
+    if user_client is None:
+        results.put(('exit', shard, 'could not create the Telethon client'))
+        return
+    # FloodWaits are counted against the shard's budget instead of being slept off silently
+    user_client.flood_sleep_threshold = 0
+    budget = options['flood_budget']
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        dialog, attempt, offset_id, count = task
+        dialog_id = dialog['id']
+        limit = options['limit']
+        path = os.path.join(spool_dir, f'{dialog_id}.{attempt}.jsonl')
+        written = 0
+        last_report = time.monotonic()
+        results.put(('progress', shard, dialog_id, attempt, written))
+        try:
+            with open(path, 'w', encoding='utf-8') as spool:
+                while True:
+                    remaining = limit - count - written if limit else None
+                    if limit and remaining <= 0:
+                        break
+                    try:
+                        for msg in client.iter_messages(dialog_id, limit=remaining, offset_id=offset_id,
+                                                        from_user_only=options['from_user_only'],
+                                                        filters=options['filters']):
+                            spool.write(json.dumps(msg, ensure_ascii=False, default=json_default) + '\n')
+                            offset_id = msg['id']
+                            written += 1
+                            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                                results.put(('progress', shard, dialog_id, attempt, written))
+                                last_report = time.monotonic()
+                        break
+                    except FloodWaitError as e:
+                        if e.seconds > budget:
+                            results.put(('flood', shard, dialog_id, attempt, e.seconds))
+                            # Out of budget: hand the dialog back and stop taking work
+                            client.close()
+                            return
+                        budget -= e.seconds
+                        # No progress while sleeping, so the coordinator has to know not to expect any
+                        results.put(('waiting', shard, dialog_id, attempt, e.seconds))
+                        time.sleep(e.seconds)
+        except ConnectionError as e:
+            # The coordinator moves the dialog once it notices the shard is gone
+            results.put(('exit', shard, str(e)))
+            return
+        except Exception as e:
+            results.put(('error', shard, dialog_id, attempt, str(e)))
+            continue
+        results.put(('done', shard, dialog_id, attempt, path))
+
+    client.close()
+
+
+class ShardedExport:
+    """
+    Export `dialogs` over `shards` worker processes. Iterating yields
+    (dialog, message, error) tuples like TelegramClient.iter_messages_for_dialogs().
+    """
+
+    def __init__(self, session_name, dialogs, shards=2, limit=50, from_user_only=False, filters=None,
+                 offsets=None, flood_budget=300, stall_timeout=120, progress=None):
+        self.session_name = session_name
+        self.dialogs = list(dialogs)
+        self.shards = max(1, shards)
+        self.offsets = offsets or {}
+        self.stall_timeout = stall_timeout
+        # Called as progress(message) when shards stall, fail or are rebalanced
+        self.progress = progress or (lambda message: None)
+        self.options = {
+            'limit': limit,
+            'from_user_only': from_user_only,
+            'filters': filters,
+            'flood_budget': flood_budget,
+        }
+        self.reassigned = 0
+
+    def _report(self, message):
+        logger.warning(message)
+        self.progress(message)
+
+    def __iter__(self):
+        # Workers start fresh: no inherited connection thread or event loop
+        context = multiprocessing.get_context('spawn')
+        tasks = context.Queue()
+        results = context.Queue()
+        spool_dir = tempfile.mkdtemp(prefix='telegram-shards-')
+        dialogs = {dialog['id']: dialog for dialog in self.dialogs}
+        attempts = {dialog_id: 0 for dialog_id in dialogs}
+        # dialog id -> (shard, time of its last report or end of its FloodWait) for dialogs being exported
+        active = {}
+        alive = set(range(self.shards))
+        pending = set(dialogs)
+
+        def enqueue(dialog_id):
+            offset_id, count = self.offsets.get(dialog_id, (0, 0))
+            tasks.put((dialogs[dialog_id], attempts[dialog_id], offset_id, count))
+
+        try:
+            sessions = [clone_session(self.session_name, shard, spool_dir) for shard in range(self.shards)]
+        except OSError:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+            raise
+
+        for dialog_id in dialogs:
+            enqueue(dialog_id)
+        workers = [
+            context.Process(
+                target=run_shard,
+                args=(shard, sessions[shard], tasks, results, spool_dir, self.options),
+                name=f'telegram-shard-{shard}',
+                daemon=True,
+            )
+            for shard in range(self.shards)
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            while pending:
+                if not alive:
+                    for dialog_id in sorted(pending):
+                        yield dialogs[dialog_id], None, RuntimeError('No shard left to export this dialog')
+                    return
+                try:
+                    kind, shard, *payload = results.get(timeout=1)
+                except queue.Empty:
+                    kind = None
+
+                if kind == 'exit':
+                    alive.discard(shard)
+                    self._report(f'Shard {shard} stopped: {payload[0]}')
+                elif kind is not None:
+                    dialog_id, attempt = payload[0], payload[1]
+                    current = attempt == attempts.get(dialog_id) and dialog_id in pending
+                    if kind == 'progress' and current:
+                        active[dialog_id] = (shard, time.monotonic())
+                    elif kind == 'waiting' and current:
+                        active[dialog_id] = (shard, time.monotonic() + payload[2])
+                    elif kind == 'flood':
+                        alive.discard(shard)
+                        if current:
+                            self._report(f'Shard {shard} is over its FloodWait budget ({payload[2]}s), '
+                                         f'moving dialog {dialog_id}')
+                            self._reassign(dialog_id, attempts, active, enqueue)
+                    elif kind == 'error' and current:
+                        pending.discard(dialog_id)
+                        active.pop(dialog_id, None)
+                        yield dialogs[dialog_id], None, RuntimeError(payload[2])
+                    elif kind == 'done':
+                        path = payload[2]
+                        if current:
+                            pending.discard(dialog_id)
+                            active.pop(dialog_id, None)
+                            yield from self._read_spool(dialogs[dialog_id], path)
+                        os.remove(path)
+
+                for shard_id in range(self.shards):
+                    if not workers[shard_id].is_alive() and shard_id in alive:
+                        alive.discard(shard_id)
+                        self._report(f'Shard {shard_id} exited')
+                now = time.monotonic()
+                for dialog_id, (shard_id, seen) in list(active.items()):
+                    if shard_id not in alive or now - seen > self.stall_timeout:
+                        self._report(f'Shard {shard_id} stalled on dialog {dialog_id}, moving it')
+                        self._reassign(dialog_id, attempts, active, enqueue)
+        finally:
+            for _ in workers:
+                tasks.put(None)
+            for worker in workers:
+                worker.join(timeout=10)
+                if worker.is_alive():
+                    worker.terminate()
+            shutil.rmtree(spool_dir, ignore_errors=True)
+
+    def _reassign(self, dialog_id, attempts, active, enqueue):
+        attempts[dialog_id] += 1
+        active.pop(dialog_id, None)
+        self.reassigned += 1
+        enqueue(dialog_id)
+
+    @staticmethod
+    def _read_spool(dialog, path):
+        with open(path, encoding='utf-8') as spool:
+            for line in spool:
+                yield dialog, json.loads(line), None
@@ -2,12 +2,472 @@
 Telegram Client Configuration and Setup using Telethon
 """
 from telethon import TelegramClient as TelethonClient
+from telethon import types, utils
+from telethon.errors import FloodWaitError, TakeoutInitDelayError
+from asgiref.sync import sync_to_async
+from collections import OrderedDict
 from decouple import config
+import atexit
 import logging
+import sys
+from datetime import datetime, timezone
 import asyncio
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+_END_OF_STREAM = object()
+
+# Telethon fetches history 100 messages per request
+MESSAGE_PAGE_SIZE = 100
+
+# Takeout exports convert (and resolve the senders of) this many messages at a time
+TAKEOUT_PAGE_SIZE = 500
+
+# Data a takeout session asks access to: all kinds of chats, no files
+TAKEOUT_SCOPES = {
+    'contacts': False,
+    'users': True,
+    'chats': True,
+    'megagroups': True,
+    'channels': True,
+    'files': False,
+}
+
+
+class TelethonConnectionManager:
+    """
+    Runs an asyncio event loop on a dedicated background thread.
+    Telethon clients connected on this loop stay connected between calls,
+    and synchronous code submits coroutines to it through run().
+    """
+    
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    @property
+    def loop(self):
+        """
+        The background event loop, started on first use
+        """
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._thread = threading.Thread(
+                        target=self._run_loop,
+                        args=(loop,),
+                        name='telethon-event-loop',
+                        daemon=True
+                    )
+                    self._thread.start()
+                    self._loop = loop
+        return self._loop
+    
+    def _run_loop(self, loop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+    
+    def run(self, coro, timeout=None):
+        """
+        Run a coroutine on the background loop and wait for its result
+        """
+        loop = self.loop
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("run() cannot be called from the Telethon event loop thread")
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        return future.result(timeout)
+    
+    def iterate(self, aiterable, maxsize=8, batch_size=100):
+        """
+        Iterate an async iterable on the background loop from synchronous code.
+        Items are handed over in batches through a bounded queue, so the producer
+        never runs more than `maxsize` batches ahead of the consumer.
+        """
+        queue = None
+        
+        async def produce():
+            batch = []
+            try:
+                async for item in aiterable:
+                    batch.append(item)
+                    if len(batch) >= batch_size:
+                        await queue.put(batch)
+                        batch = []
+                if batch:
+                    await queue.put(batch)
+                await queue.put(_END_OF_STREAM)
+            except Exception as e:
+                await queue.put(e)
+        
+        async def start():
+            nonlocal queue
+            queue = asyncio.Queue(maxsize)
+            return asyncio.ensure_future(produce())
+        
+        task = self.run(start())
+        try:
+            while True:
+                batch = self.run(queue.get())
+                if batch is _END_OF_STREAM:
+                    return
+                if isinstance(batch, Exception):
+                    raise batch
+                yield from batch
+        finally:
+            # The consumer stopped early (or failed), don't leave the producer blocked
+            if not task.done():
+                self.loop.call_soon_threadsafe(task.cancel)
+    
+    def stop(self):
+        """
+        Stop the background loop
+        """
+        with self._lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
+            self._thread = None
+
+
+class AdaptiveConcurrency:
+    """
+    Async concurrency limiter that backs off on FloodWaitError.
+    A flood wait pauses every task for the requested time and halves the
+    limit; the limit grows back by one after `recover_after` successes.
+    """
+    
+    def __init__(self, limit, recover_after=10):
+        self.max_limit = max(1, limit)
+        self.limit = self.max_limit
+        self.recover_after = recover_after
+        self._active = 0
+        self._successes = 0
+        self._paused_until = 0.0
+        self._condition = None
+    
+    async def __aenter__(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout=pause)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if self._active < self.limit:
+                    break
+                await self._condition.wait()
+            self._active += 1
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        async with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+    
+    def success(self):
+        self._successes += 1
+        if self._successes >= self.recover_after and self.limit < self.max_limit:
+            self.limit += 1
+            self._successes = 0
+    
+    def flood_wait(self, seconds):
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+# Statistics key for each dialog type
+STATISTICS_KEYS = {
+    'channel': 'channels',
+    'supergroup': 'supergroups',
+    'group': 'groups',
+    'user': 'chats',  # Private chats
+}
+
+
+# --media choices and the Telegram search filters they map to
+MEDIA_FILTERS = {
+    'photo': types.InputMessagesFilterPhotos,
+    'video': types.InputMessagesFilterVideo,
+    'photo_video': types.InputMessagesFilterPhotoVideo,
+    'document': types.InputMessagesFilterDocument,
+    'audio': types.InputMessagesFilterMusic,
+    'voice': types.InputMessagesFilterVoice,
+    'round': types.InputMessagesFilterRoundVideo,
+    'gif': types.InputMessagesFilterGif,
+    'url': types.InputMessagesFilterUrl,
+}
+
+
+def parse_date_bound(value):
+    """
+    Parse a YYYY-MM-DD or ISO datetime string into an aware datetime (UTC if no offset is given)
+    """
+    if not value or isinstance(value, datetime):
+        return value
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Invalid date: {value}. Use YYYY-MM-DD or an ISO datetime.')
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def build_message_filters(since=None, until=None, from_user=None, search=None, media=None):
+    """
+    Message filters for the TelegramClient message methods, applied by Telegram:
+    `since`/`until` dates (strings or datetimes, `until` exclusive), `from_user`
+    (a user id, username or 'me'), `search` text and a `media` kind from MEDIA_FILTERS.
+    Raises ValueError for invalid values.
+    """
+    if media and media not in MEDIA_FILTERS:
+        raise ValueError(f"Unknown media type: {media}. Choose from {', '.join(MEDIA_FILTERS)}.")
+    if isinstance(from_user, str) and from_user.lstrip('-').isdigit():
+        from_user = int(from_user)
+    filters = {
+        'since': parse_date_bound(since),
+        'until': parse_date_bound(until),
+        'from_user': from_user,
+        'search': search,
+        'media': media,
+    }
+    return {key: value for key, value in filters.items() if value}
+
+
+def count_dialogs(dialogs):
+    """
+    Count dialogs by type, plus contacts and the total
+    """
+    stats = {key: 0 for key in STATISTICS_KEYS.values()}
+    stats['contacts'] = 0
+    stats['total_dialogs'] = len(dialogs)
+    for dialog in dialogs:
+        stats[STATISTICS_KEYS[dialog['type']]] += 1
+        if dialog.get('is_contact'):
+            stats['contacts'] += 1
+    return stats
+
+
+class Record:
+    """
+    Compact fixed-field result record. The fields live in __slots__ instead
+    of a per-instance dict, and the record reads like the dict it replaces
+    (record['id'], record.get('id'), **record, dict(record)), so a real dict
+    is only built where results are written out, see to_dict() and json_default().
+    """
+    __slots__ = ()
+    
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError(f"Unknown {type(self).__name__} fields: {', '.join(fields)}")
+    
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def get(self, key, default=None):
+        if key not in self.__slots__:
+            return default
+        return getattr(self, key)
+    
+    def keys(self):
+        return self.__slots__
+    
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.__slots__]
+    
+    def __contains__(self, key):
+        return key in self.__slots__
+    
+    def __iter__(self):
+        return iter(self.__slots__)
+    
+    def __len__(self):
+        return len(self.__slots__)
+    
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+    
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+    
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class MessageRecord(Record):
+    """
+    A message, with the same keys as TelegramMessage.to_dict()
+    """
+    __slots__ = ('id', 'date', 'text', 'sender_id', 'sender_name', 'is_reply', 'reply_to_msg_id',
+                 'media_type', 'has_media')
+
+
+class DialogRecord(Record):
+    """
+    A dialog, with the same keys as TelegramDialog.to_dict()
+    """
+    __slots__ = ('id', 'title', 'name', 'username', 'type', 'participants_count', 'unread_count',
+                 'is_verified', 'is_broadcast', 'is_megagroup', 'is_contact')
+
+
+def json_default(value):
+    """
+    json.dumps() default for command output: records become dicts, anything else a string
+    """
+    if isinstance(value, Record):
+        return value.to_dict()
+    return str(value)
+
+
+# Media type names by Telethon media class, shared by all messages with that media
+_MEDIA_TYPE_NAMES = {}
+
+
+def media_type_name(media):
+    """
+    Short media type name of a Telethon message media ('Photo', 'Document', ...)
+    """
+    media_class = type(media)
+    name = _MEDIA_TYPE_NAMES.get(media_class)
+    if name is None:
+        name = media_class.__name__.replace('MessageMedia', '').replace('_', ' ')
+        name = _MEDIA_TYPE_NAMES[media_class] = sys.intern(name)
+    return name
+
+
+class EntityNameCache:
+    """
+    Size-bounded LRU cache of sender display names, keyed by peer id.
+    Loaded from and saved to the TelegramEntity table, so names resolved
+    in one run are reused by the next. Names are interned, so every message
+    from a sender shares one string. The cache is only changed on the
+    connection thread. Database work runs on executor threads: load() is
+    locked, and save() writes a snapshot taken with take_dirty() on the
+    connection thread.
+    """
+    
+    def __init__(self, max_size=10000, flush_every=1000):
+        self.max_size = max_size
+        self.flush_every = flush_every
+        self._names = OrderedDict()
+        self._dirty = set()
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def touch(self, entity_id):
+        """
+        Whether the entity is cached, marking it as recently used;
+        counts towards the hit rate
+        """
+        if entity_id in self._names:
+            self._names.move_to_end(entity_id)
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+    
+    def peek(self, entity_id):
+        """
+        Cached name of an entity, or None
+        """
+        return self._names.get(entity_id)
+    
+    def put(self, entity_id, name):
+        """
+        Cache an entity's current name; only new or changed names are saved
+        """
+        if entity_id not in self._names or self._names[entity_id] != name:
+            self._names[entity_id] = sys.intern(name) if name else name
+            self._dirty.add(entity_id)
+        self._names.move_to_end(entity_id)
+        while len(self._names) > self.max_size:
+            evicted, _ = self._names.popitem(last=False)
+            self._dirty.discard(evicted)
+    
+    @property
+    def needs_flush(self):
+        return len(self._dirty) >= self.flush_every
+    
+    def load(self):
+        """
+        Fill the cache with the most recently used names from the database.
+        Several fetch tasks may ask at once; the names are read only once.
+        """
+        with self._load_lock:
+            if self._loaded:
+                return
+            from .models import TelegramEntity
+            rows = (TelegramEntity.objects
+                    .order_by('-last_used_at')
+                    .values_list('entity_id', 'name')[:self.max_size])
+            # Oldest first, so the most recently used names are evicted last
+            for entity_id, name in reversed(list(rows)):
+                self._names.setdefault(entity_id, sys.intern(name) if name else name)
+            self._loaded = True
+    
+    def take_dirty(self):
+        """
+        (entity id, name) of the names changed since the last save; they count
+        as saved from now on. Call it where put() is called.
+        """
+        names = [(entity_id, self._names[entity_id]) for entity_id in self._dirty if entity_id in self._names]
+        self._dirty.clear()
+        return names
+    
+    def save(self, names=None):
+        """
+        Write `names` (take_dirty() by default) to the database and trim it to max_size
+        """
+        if names is None:
+            names = self.take_dirty()
+        if not names:
+            return
+        from .models import TelegramEntity
+        from django.utils import timezone
+        now = timezone.now()
+        objects = [
+            TelegramEntity(entity_id=entity_id, name=name, last_used_at=now)
+            for entity_id, name in names
+        ]
+        TelegramEntity.objects.bulk_create(
+            objects,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['entity_id'],
+            update_fields=['name', 'last_used_at'],
+        )
+        stale = TelegramEntity.objects.order_by('-last_used_at').values_list('id', flat=True)[self.max_size:]
+        TelegramEntity.objects.filter(id__in=list(stale)).delete()
+    
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._names),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
 
 class TelegramClient:
     """
@@ -28,11 +488,22 @@ class TelegramClient:
         self.webhook_url = config('TELEGRAM_WEBHOOK_URL', default='https://ikramov.uz/bot/update/')
         self.session_name = config('TELEGRAM_SESSION_NAME', default='bot_session')
         self.user_session_name = config('TELEGRAM_USER_SESSION_NAME', default='user_session')
+        # 'file' (SQLite .session files) or 'database' (see bot.sessions)
+        self.session_backend = config('TELEGRAM_SESSION_BACKEND', default='file')
         self.use_user_account = config('TELEGRAM_USE_USER_ACCOUNT', default=False, cast=bool)
+        self.entity_cache_size = config('TELEGRAM_ENTITY_CACHE_SIZE', default=10000, cast=int)
         
         self.client = None
         self.user_client = None
         
+        # Persistent connections live on a dedicated event-loop thread
+        self.connection = TelethonConnectionManager()
+        self._connect_locks = {}
+        self._authorized = {}
+        self._user_id = None
+        self.entity_names = EntityNameCache(max_size=self.entity_cache_size)
+        atexit.register(self.close)
+        
         # Validate configuration
         self._validate_settings()
     
@@ -55,6 +526,15 @@ class TelegramClient:
         if not self.webhook_url:
             logger.warning("TELEGRAM_WEBHOOK_URL is not set in .env file")
     
+    def _session(self, name):
+        """
+        Telethon session for `name` in the configured backend
+        """
+        if self.session_backend == 'database':
+            from .sessions import DatabaseSession
+            return DatabaseSession(name)
+        return name
+    
     def get_client(self, use_user_account=False):
         """
         Get or create Telethon client instance
@@ -69,7 +549,7 @@ class TelegramClient:
             if not self.user_client:
                 try:
                     self.user_client = TelethonClient(
-                        self.user_session_name,
+                        self._session(self.user_session_name),
                         self.api_id,
                         self.api_hash
                     )
@@ -83,7 +563,7 @@ class TelegramClient:
             if not self.client:
                 try:
                     self.client = TelethonClient(
-                        self.session_name,
+                        self._session(self.session_name),
                         self.api_id,
                         self.api_hash
                     )
@@ -125,18 +605,51 @@ class TelegramClient:
             logger.error(f"Error connecting Telethon client: {str(e)}")
             return False
     
+    async def ensure_connected(self, use_user_account=False):
+        """
+        Return a connected client, connecting (and signing in) only if the
+        connection is not already up. Returns None if connecting fails.
+        """
+        client = self.get_client(use_user_account=use_user_account)
+        if not client:
+            return None
+        
+        lock = self._connect_locks.get(use_user_account)
+        if lock is None:
+            lock = self._connect_locks[use_user_account] = asyncio.Lock()
+        
+        async with lock:
+            if client.is_connected() and self._authorized.get(use_user_account):
+                return client
+            
+            if self._authorized.get(use_user_account):
+                logger.warning("Telethon connection dropped, reconnecting")
+            
+            self._authorized[use_user_account] = await self.connect_client(use_user_account=use_user_account)
+            if not self._authorized[use_user_account]:
+                return None
+            return client
+    
+    def _run(self, coro, default=None):
+        """
+        Run a coroutine on the connection thread and return its result,
+        or `default` if it raises
+        """
+        try:
+            return self.connection.run(coro)
+        except Exception as e:
+            logger.error(f"Error running {getattr(coro, '__name__', 'coroutine')}: {str(e)}")
+            return default
+    
     async def send_message_async(self, chat_id, message_text):
         """
         Send a message asynchronously
         """
         try:
-            client = self.get_client()
+            client = await self.ensure_connected()
             if not client:
                 return False
             
-            if not client.is_connected():
-                await self.connect_client()
-            
             await client.send_message(chat_id, message_text)
             logger.info(f"Message sent to {chat_id}")
             return True
@@ -148,24 +661,8 @@ class TelegramClient:
         """
         Send a message synchronously (wrapper for async method)
         """
-        try:
-            client = self.get_client()
-            if not client:
-                return False
-            
-            # Create event loop if needed
-            try:
-                loop = asyncio.get_event_loop()
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            
-            # Run async function
-            return loop.run_until_complete(self.send_message_async(chat_id, message_text))
-        except Exception as e:
-            logger.error(f"Error in send_message: {str(e)}")
-            return False
-    
+        return self._run(self.send_message_async(chat_id, message_text), default=False)
+
     def get_admin_id(self):
         """
         Get admin ID as integer
@@ -194,139 +691,72 @@ class TelegramClient:
             self.webhook_url
         ])
     
-    async def get_joined_channels_async(self):
+    @staticmethod
+    def _build_dialog_record(dialog_id, entity, is_channel, is_group, title, name, unread_count=0):
         """
-        Get all joined channels and groups asynchronously
-        Returns a list of dictionaries with channel information
-        NOTE: Requires user account (phone number), not bot token
+        Dialog information (including its type) in the shape used by all commands
         """
-        try:
-            # Use separate user client to avoid session conflicts
-            client = self.get_client(use_user_account=True)
-            if not client:
-                return []
-            
-            # Disconnect if already connected (might be from previous operation)
-            if client.is_connected():
-                await client.disconnect()
-            
-            # Must use user account to list channels (bots can't do this)
-            if not await self.connect_client(use_user_account=True):
-                logger.error("Failed to connect as user account. Make sure TELEGRAM_PHONE_NUMBER is set in .env")
-                return []
-            
-            channels_list = []
-            
-            # Get all dialogs (chats, groups, channels, supergroups)
-            async for dialog in client.iter_dialogs():
-                # Filter for channels, supergroups, and groups
-                if dialog.is_channel or dialog.is_group:
-                    # Determine the type more accurately
-                    is_broadcast = getattr(dialog.entity, 'broadcast', False)
-                    is_megagroup = getattr(dialog.entity, 'megagroup', False)
-                    
-                    if dialog.is_channel:
-                        if is_broadcast:
-                            dialog_type = 'channel'  # Broadcast channel
-                        elif is_megagroup:
-                            dialog_type = 'supergroup'  # Supergroup (megagroup)
-                        else:
-                            dialog_type = 'supergroup'  # Supergroup (default for channels that aren't broadcast)
-                    else:
-                        dialog_type = 'group'  # Regular group
-                    
-                    channel_info = {
-                        'id': dialog.id,
-                        'title': dialog.title,
-                        'username': dialog.entity.username if hasattr(dialog.entity, 'username') else None,
-                        'type': dialog_type,
-                        'participants_count': getattr(dialog.entity, 'participants_count', None),
-                        'unread_count': dialog.unread_count,
-                        'is_verified': getattr(dialog.entity, 'verified', False),
-                        'is_broadcast': is_broadcast,
-                        'is_megagroup': is_megagroup,
-                    }
-                    channels_list.append(channel_info)
-            
-            logger.info(f"Found {len(channels_list)} channels/supergroups/groups")
-            return channels_list
-            
-        except Exception as e:
-            logger.error(f"Error getting joined channels: {str(e)}")
-            return []
+        is_broadcast = getattr(entity, 'broadcast', False)
+        is_megagroup = getattr(entity, 'megagroup', False)
+        
+        # Determine the type more accurately
+        if is_channel:
+            # Broadcast channel, otherwise a supergroup (megagroup)
+            dialog_type = 'channel' if is_broadcast else 'supergroup'
+        elif is_group:
+            dialog_type = 'group'  # Regular group
+        else:
+            dialog_type = 'user'  # Private chat
+        
+        return DialogRecord(
+            id=dialog_id,
+            title=title,
+            name=name,
+            username=entity.username if hasattr(entity, 'username') else None,
+            type=dialog_type,
+            participants_count=getattr(entity, 'participants_count', None),
+            unread_count=unread_count,
+            is_verified=getattr(entity, 'verified', False),
+            is_broadcast=is_broadcast,
+            is_megagroup=is_megagroup,
+            # A private chat with a phone number is a saved contact
+            is_contact=dialog_type == 'user' and hasattr(entity, 'phone'),
+        )
     
-    def get_joined_channels(self):
+    @classmethod
+    def _dialog_to_record(cls, dialog):
         """
-        Get all joined channels and groups synchronously
+        Extract dialog information from a Telethon dialog
         """
-        try:
-            client = self.get_client()
-            if not client:
-                return []
-            
-            # Create event loop if needed
-            try:
-                loop = asyncio.get_event_loop()
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            
-            # Run async function
-            return loop.run_until_complete(self.get_joined_channels_async())
-        except Exception as e:
-            logger.error(f"Error in get_joined_channels: {str(e)}")
-            return []
+        return cls._build_dialog_record(
+            dialog.id, dialog.entity, dialog.is_channel, dialog.is_group,
+            dialog.title, dialog.name, dialog.unread_count
+        )
+    
+    @classmethod
+    def entity_to_dialog(cls, entity):
+        """
+        Extract dialog information from a Telethon user, chat or channel entity
+        (e.g. the chat of a live update)
+        """
+        is_channel = isinstance(entity, (types.Channel, types.ChannelForbidden))
+        is_group = isinstance(entity, (types.Chat, types.ChatForbidden)) or getattr(entity, 'megagroup', False)
+        name = utils.get_display_name(entity)
+        return cls._build_dialog_record(utils.get_peer_id(entity), entity, is_channel, is_group, name, name)
     
     async def get_all_dialogs_async(self):
         """
-        Get all dialogs (chats, groups, channels) asynchronously
+        Get all dialogs (chats, groups, channels) asynchronously in a single pass
         NOTE: Requires user account (phone number), not bot token
         """
         try:
-            # Use separate user client to avoid session conflicts
-            client = self.get_client(use_user_account=True)
+            # Reuse the persistent user connection (bots can't do this)
+            client = await self.ensure_connected(use_user_account=True)
             if not client:
-                return []
-            
-            # Disconnect if already connected (might be from previous operation)
-            if client.is_connected():
-                await client.disconnect()
-            
-            # Must use user account to list dialogs (bots can't do this)
-            if not await self.connect_client(use_user_account=True):
                 logger.error("Failed to connect as user account. Make sure TELEGRAM_PHONE_NUMBER is set in .env")
                 return []
             
-            dialogs_list = []
-            
-            async for dialog in client.iter_dialogs():
-                # Determine the type more accurately
-                if dialog.is_channel:
-                    is_broadcast = getattr(dialog.entity, 'broadcast', False)
-                    is_megagroup = getattr(dialog.entity, 'megagroup', False)
-                    if is_broadcast:
-                        dialog_type = 'channel'  # Broadcast channel
-                    elif is_megagroup:
-                        dialog_type = 'supergroup'  # Supergroup (megagroup)
-                    else:
-                        dialog_type = 'supergroup'  # Supergroup (default for channels that aren't broadcast)
-                elif dialog.is_group:
-                    dialog_type = 'group'  # Regular group
-                else:
-                    dialog_type = 'user'  # Private chat
-                
-                dialog_info = {
-                    'id': dialog.id,
-                    'title': dialog.title,
-                    'name': dialog.name,
-                    'username': dialog.entity.username if hasattr(dialog.entity, 'username') else None,
-                    'type': dialog_type,
-                    'unread_count': dialog.unread_count,
-                    'is_verified': getattr(dialog.entity, 'verified', False),
-                    'is_broadcast': getattr(dialog.entity, 'broadcast', False),
-                    'is_megagroup': getattr(dialog.entity, 'megagroup', False),
-                }
-                dialogs_list.append(dialog_info)
+            dialogs_list = [self._dialog_to_record(dialog) async for dialog in client.iter_dialogs()]
             
             logger.info(f"Found {len(dialogs_list)} dialogs")
             return dialogs_list
@@ -339,111 +769,66 @@ class TelegramClient:
         """
         Get all dialogs synchronously
         """
-        try:
-            client = self.get_client()
-            if not client:
-                return []
-            
-            # Create event loop if needed
-            try:
-                loop = asyncio.get_event_loop()
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            
-            # Run async function
-            return loop.run_until_complete(self.get_all_dialogs_async())
-        except Exception as e:
-            logger.error(f"Error in get_all_dialogs: {str(e)}")
-            return []
+        return self._run(self.get_all_dialogs_async(), default=[])
     
-    async def get_statistics_async(self):
+    async def iter_dialogs_async(self):
         """
-        Get statistics about contacts, chats, channels, groups, etc.
-        Returns a dictionary with counts
+        Yield dialogs as they arrive from Telegram. Errors are raised.
         """
-        try:
-            # Use separate user client to avoid session conflicts
-            client = self.get_client(use_user_account=True)
-            if not client:
-                return {}
-            
-            # Disconnect if already connected
-            if client.is_connected():
-                await client.disconnect()
-            
-            # Must use user account
-            if not await self.connect_client(use_user_account=True):
-                logger.error("Failed to connect as user account. Make sure TELEGRAM_PHONE_NUMBER is set in .env")
-                return {}
-            
-            stats = {
-                'channels': 0,
-                'supergroups': 0,
-                'groups': 0,
-                'chats': 0,  # Private chats
-                'contacts': 0,
-                'total_dialogs': 0
-            }
-            
-            async for dialog in client.iter_dialogs():
-                stats['total_dialogs'] += 1
-                
-                if dialog.is_channel:
-                    is_broadcast = getattr(dialog.entity, 'broadcast', False)
-                    is_megagroup = getattr(dialog.entity, 'megagroup', False)
-                    if is_broadcast:
-                        stats['channels'] += 1
-                    else:
-                        stats['supergroups'] += 1
-                elif dialog.is_group:
-                    stats['groups'] += 1
-                else:
-                    # Private chat
-                    stats['chats'] += 1
-                    # Check if it's a contact (has phone number or is saved contact)
-                    if hasattr(dialog.entity, 'phone'):
-                        stats['contacts'] += 1
-            
-            logger.info(f"Statistics collected: {stats}")
-            return stats
-            
-        except Exception as e:
-            logger.error(f"Error getting statistics: {str(e)}")
-            return {}
+        client = await self.ensure_connected(use_user_account=True)
+        if not client:
+            raise ConnectionError("Failed to connect as user account. Make sure TELEGRAM_PHONE_NUMBER is set in .env")
+        async for dialog in client.iter_dialogs():
+            yield self._dialog_to_record(dialog)
     
-    def get_statistics(self):
+    def iter_dialogs(self, maxsize=8):
         """
-        Get statistics synchronously
+        Stream dialogs synchronously with bounded memory
         """
-        try:
-            # Create event loop if needed
-            try:
-                loop = asyncio.get_event_loop()
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            
-            # Run async function
-            return loop.run_until_complete(self.get_statistics_async())
-        except Exception as e:
-            logger.error(f"Error in get_statistics: {str(e)}")
+        return self.connection.iterate(self.iter_dialogs_async(), maxsize=maxsize)
+    
+    def get_joined_channels(self, dialogs=None):
+        """
+        Get all joined channels and groups
+        Filters `dialogs` if given, otherwise fetches all dialogs
+        NOTE: Requires user account (phone number), not bot token
+        """
+        if dialogs is None:
+            dialogs = self.get_all_dialogs()
+        channels_list = [dialog for dialog in dialogs if dialog['type'] != 'user']
+        logger.info(f"Found {len(channels_list)} channels/supergroups/groups")
+        return channels_list
+    
+    def get_statistics(self, dialogs=None):
+        """
+        Get statistics about contacts, chats, channels, groups, etc.
+        Counts `dialogs` if given, otherwise fetches all dialogs
+        Returns a dictionary with counts
+        """
+        if dialogs is None:
+            dialogs = self.get_all_dialogs()
+        if not dialogs:
             return {}
+        
+        stats = count_dialogs(dialogs)
+        logger.info(f"Statistics collected: {stats}")
+        return stats
     
     async def get_current_user_id_async(self):
         """
         Get current user's ID
         """
+        if self._user_id:
+            return self._user_id
         try:
-            client = self.get_client(use_user_account=True)
+            client = await self.ensure_connected(use_user_account=True)
             if not client:
                 return None
             
-            if not client.is_connected():
-                await self.connect_client(use_user_account=True)
-            
             me = await client.get_me()
-            return me.id if me else None
+            # The account can't change while connected, so one lookup is enough
+            self._user_id = me.id if me else None
+            return self._user_id
         except Exception as e:
             logger.error(f"Error getting current user ID: {str(e)}")
             return None
@@ -452,123 +837,473 @@ class TelegramClient:
         """
         Get current user's ID synchronously
         """
-        try:
+        return self._run(self.get_current_user_id_async(), default=None)
+
+    @staticmethod
+    def _sender_name(sender):
+        """
+        Display name of a message sender (user, chat or channel)
+        """
+        if hasattr(sender, 'first_name'):
+            sender_name = sender.first_name
+            if hasattr(sender, 'last_name') and sender.last_name:
+                sender_name += f" {sender.last_name}"
+            return sender_name
+        if hasattr(sender, 'title'):
+            return sender.title
+        if hasattr(sender, 'username'):
+            return f"@{sender.username}"
+        return None
+    
+    @classmethod
+    def _message_to_record(cls, message, sender_name=None):
+        """
+        Extract message information from a Telethon message.
+        The sender name is read from message.sender unless it is passed in.
+        """
+        if sender_name is None and message.sender:
+            sender_name = cls._sender_name(message.sender)
+        
+        return MessageRecord(
+            id=message.id,
+            date=message.date.isoformat() if message.date else None,
+            text=message.text or '',
+            sender_id=message.sender_id,
+            sender_name=sender_name,
+            is_reply=message.is_reply,
+            reply_to_msg_id=message.reply_to.reply_to_msg_id if message.reply_to else None,
+            media_type=media_type_name(message.media) if message.media else None,
+            has_media=message.media is not None,
+        )
+    
+    async def _fetch_messages(self, client, peer_id, limit=100, offset_id=0, min_id=0, filters=None):
+        """
+        Fetch messages from a peer on a connected client.
+        Only messages newer than `min_id` are returned if it is set.
+        Unlike get_messages_async, errors (e.g. FloodWaitError) are raised.
+        """
+        messages_list = [
+            msg async for msg in self._iter_message_records(client, peer_id, limit, offset_id, min_id, filters)
+        ]
+        logger.info(f"Retrieved {len(messages_list)} messages from peer {peer_id}")
+        return messages_list
+    
+    async def _iter_filtered_messages(self, client, peer_id, limit=100, offset_id=0, min_id=0, filters=None,
+                                      reverse=False, wait_time=None):
+        """
+        Yield Telethon messages from a peer, newest first (oldest first with
+        `reverse`), with `filters` (see build_message_filters()) applied by Telegram.
+        `wait_time` is the pause between history requests, see Telethon's iter_messages().
+        """
+        filters = filters or {}
+        
+        # Prepare parameters for iter_messages
+        kwargs = {'limit': limit, 'reverse': reverse}
+        if offset_id and offset_id > 0:
+            kwargs['offset_id'] = offset_id
+        if min_id and min_id > 0:
+            kwargs['min_id'] = min_id
+        if wait_time is not None:
+            kwargs['wait_time'] = wait_time
+        # In reverse the offset date is the lower bound
+        if reverse and filters.get('since'):
+            kwargs['offset_date'] = filters['since']
+        elif not reverse and filters.get('until'):
+            kwargs['offset_date'] = filters['until']
+        if filters.get('from_user'):
+            kwargs['from_user'] = filters['from_user']
+        if filters.get('search'):
+            kwargs['search'] = filters['search']
+        if filters.get('media'):
+            kwargs['filter'] = MEDIA_FILTERS[filters['media']]
+        since = filters.get('since')
+        until = filters.get('until')
+        
+        async for message in client.iter_messages(peer_id, **kwargs):
+            # Newest first: everything after this is older too (and the other way round in reverse)
+            if not reverse and since and message.date and message.date < since:
+                break
+            if reverse and until and message.date and message.date >= until:
+                break
+            yield message
+    
+    async def _iter_message_records(self, client, peer_id, limit=100, offset_id=0, min_id=0, filters=None,
+                                    reverse=False, wait_time=None, page_size=MESSAGE_PAGE_SIZE):
+        """
+        Yield messages from a peer on a connected client as MessageRecords, newest first.
+        `filters` (see build_message_filters()) are applied by Telegram, so only
+        matching messages are transferred.
+        """
+        # Messages are converted a page at a time so their senders are resolved together
+        page = []
+        async for message in self._iter_filtered_messages(client, peer_id, limit, offset_id, min_id, filters,
+                                                          reverse, wait_time):
+            page.append(message)
+            if len(page) >= page_size:
+                for msg in await self._messages_to_records(client, page):
+                    yield msg
+                page = []
+        if page:
+            for msg in await self._messages_to_records(client, page):
+                yield msg
+    
+    async def _messages_to_records(self, client, messages):
+        """
+        Convert a page of messages. Senders included with the page refresh
+        the entity name cache, so renames are picked up; the cache is only
+        consulted for senders Telegram left out, and those missing from it
+        are looked up in one batch.
+        """
+        names = self.entity_names
+        if not names._loaded:
+            await sync_to_async(names.load)()
+        
+        unresolved = set()
+        for message in messages:
+            sender_id = message.sender_id
+            if sender_id is None:
+                continue
+            if message.sender is not None:
+                names.put(sender_id, self._sender_name(message.sender))
+            elif not names.touch(sender_id):
+                unresolved.add(sender_id)
+        
+        if unresolved:
             try:
-                loop = asyncio.get_event_loop()
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            
-            return loop.run_until_complete(self.get_current_user_id_async())
-        except Exception as e:
-            logger.error(f"Error in get_current_user_id: {str(e)}")
-            return None
+                entities = await client.get_entity(list(unresolved))
+                for entity in entities:
+                    names.put(utils.get_peer_id(entity), self._sender_name(entity))
+            except Exception as e:
+                logger.debug(f"Could not resolve {len(unresolved)} senders: {str(e)}")
+        
+        if names.needs_flush:
+            # Snapshot here: other fetch tasks keep adding names while the thread writes these
+            await sync_to_async(names.save)(names.take_dirty())
+        
+        return [self._message_to_record(message, names.peek(message.sender_id)) for message in messages]
+    
+    @staticmethod
+    def _user_filters(filters, from_user_only):
+        # "My messages only" is a server-side sender filter
+        if from_user_only:
+            return {**(filters or {}), 'from_user': 'me'}
+        return filters
     
-    async def get_messages_async(self, peer_id, limit=100, offset_id=0, from_user_only=False):
+    async def iter_messages_async(self, peer_id, limit=100, offset_id=0, from_user_only=False, filters=None):
+        """
+        Yield messages from a peer as they arrive from Telegram.
+        Unlike get_messages_async, errors are raised.
+        """
+        client = await self.ensure_connected(use_user_account=True)
+        if not client:
+            raise ConnectionError("Failed to connect as user account. Make sure TELEGRAM_PHONE_NUMBER is set in .env")
+        
+        filters = self._user_filters(filters, from_user_only)
+        async for msg in self._iter_message_records(client, peer_id, limit, offset_id, filters=filters):
+            yield msg
+    
+    def iter_messages(self, peer_id, limit=100, offset_id=0, from_user_only=False, filters=None, maxsize=8):
+        """
+        Stream messages from a peer synchronously with bounded memory,
+        see TelethonConnectionManager.iterate()
+        """
+        return self.connection.iterate(
+            self.iter_messages_async(peer_id, limit, offset_id, from_user_only, filters), maxsize=maxsize
+        )
+    
+    async def iter_message_pages_async(self, peer_id, page_size=MESSAGE_PAGE_SIZE, limit=None, offset_id=0,
+                                       from_user_only=False, filters=None, checkpoints=None):
+        """
+        Yield messages from a peer in lists of up to `page_size` MessageRecords,
+        newest first. Errors are raised.
+        With `checkpoints` (see bot.checkpoints.ExportCheckpoints) the position is
+        saved once the caller asks for the page after the one it was given, and a
+        peer with saved progress resumes after its last saved page: a finished peer
+        yields nothing and `limit` includes the messages of earlier runs.
+        """
+        if checkpoints:
+            last_id, count, completed = checkpoints.progress(peer_id)
+            if completed:
+                return
+            offset_id = last_id or offset_id
+            if limit:
+                limit -= count
+                if limit <= 0:
+                    await sync_to_async(checkpoints.complete)(peer_id)
+                    return
+        
+        client = await self.ensure_connected(use_user_account=True)
+        if not client:
+            raise ConnectionError("Failed to connect as user account. Make sure TELEGRAM_PHONE_NUMBER is set in .env")
+        
+        filters = self._user_filters(filters, from_user_only)
+        page = []
+        async for msg in self._iter_message_records(client, peer_id, limit, offset_id, filters=filters):
+            page.append(msg)
+            if len(page) >= page_size:
+                yield page
+                if checkpoints:
+                    await sync_to_async(checkpoints.advance_page)(peer_id, page)
+                page = []
+        if page:
+            yield page
+            if checkpoints:
+                await sync_to_async(checkpoints.advance_page)(peer_id, page)
+        if checkpoints:
+            await sync_to_async(checkpoints.complete)(peer_id)
+    
+    def iter_message_pages(self, peer_id, page_size=MESSAGE_PAGE_SIZE, limit=None, offset_id=0,
+                           from_user_only=False, filters=None, checkpoints=None):
+        """
+        Iterate message pages synchronously, see iter_message_pages_async().
+        Pages are fetched one at a time when asked for, so a checkpoint is only
+        saved after the caller is done with its page.
+        """
+        pages = self.iter_message_pages_async(peer_id, page_size, limit, offset_id, from_user_only, filters,
+                                              checkpoints)
+        try:
+            while True:
+                try:
+                    page = self.connection.run(pages.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield page
+        finally:
+            self.connection.run(pages.aclose())
+    
+    async def get_messages_async(self, peer_id, limit=100, offset_id=0, from_user_only=False, filters=None):
         """
         Get messages from a specific peer (user/chat/channel)
         If from_user_only is True, only returns messages sent by the current user
         """
         try:
-            # Use separate user client
-            client = self.get_client(use_user_account=True)
+            # Reuse the persistent user connection (bots can't do this)
+            client = await self.ensure_connected(use_user_account=True)
             if not client:
-                return []
-            
-            # Disconnect if already connected
-            if client.is_connected():
-                await client.disconnect()
-            
-            # Must use user account
-            if not await self.connect_client(use_user_account=True):
                 logger.error("Failed to connect as user account. Make sure TELEGRAM_PHONE_NUMBER is set in .env")
                 return []
             
-            # Get current user ID if filtering
-            current_user_id = None
-            if from_user_only:
-                current_user_id = await self.get_current_user_id_async()
-                if not current_user_id:
-                    logger.warning("Could not get current user ID, cannot filter by user")
-            
-            messages_list = []
-            
-            # Prepare parameters for iter_messages
-            kwargs = {'limit': limit}
-            if offset_id and offset_id > 0:
-                kwargs['offset_id'] = offset_id
-            
-            # Get messages
-            async for message in client.iter_messages(peer_id, **kwargs):
-                # Filter by sender if requested
-                if from_user_only and current_user_id:
-                    if message.sender_id != current_user_id:
-                        continue
-                # Extract message information
-                msg_info = {
-                    'id': message.id,
-                    'date': message.date.isoformat() if message.date else None,
-                    'text': message.text or '',
-                    'sender_id': message.sender_id,
-                    'sender_name': None,
-                    'is_reply': message.is_reply,
-                    'reply_to_msg_id': message.reply_to.reply_to_msg_id if message.reply_to else None,
-                    'media_type': None,
-                    'has_media': message.media is not None,
-                }
-                
-                # Get sender name
-                if message.sender:
-                    if hasattr(message.sender, 'first_name'):
-                        sender_name = message.sender.first_name
-                        if hasattr(message.sender, 'last_name') and message.sender.last_name:
-                            sender_name += f" {message.sender.last_name}"
-                        msg_info['sender_name'] = sender_name
-                    elif hasattr(message.sender, 'title'):
-                        msg_info['sender_name'] = message.sender.title
-                    elif hasattr(message.sender, 'username'):
-                        msg_info['sender_name'] = f"@{message.sender.username}"
-                
-                # Get media type if present
-                if message.media:
-                    media_type = type(message.media).__name__
-                    msg_info['media_type'] = media_type.replace('MessageMedia', '').replace('_', ' ')
-                
-                messages_list.append(msg_info)
-            
-            logger.info(f"Retrieved {len(messages_list)} messages from peer {peer_id}")
-            return messages_list
+            filters = self._user_filters(filters, from_user_only)
+            return await self._fetch_messages(client, peer_id, limit, offset_id, filters=filters)
             
         except Exception as e:
             logger.error(f"Error getting messages: {str(e)}")
             return []
     
-    def get_messages(self, peer_id, limit=100, offset_id=0, from_user_only=False):
+    async def iter_completed_dialogs_async(self, dialogs, limit=50, from_user_only=False, concurrency=4,
+                                           min_ids=None, filters=None):
         """
-        Get messages synchronously
-        If from_user_only is True, only returns messages sent by the current user
+        Fetch messages from many dialogs concurrently over the single user connection
+        and yield (dialog, messages, error) tuples as each dialog finishes.
+        `min_ids` maps dialog ids to a message id high-water mark: for those dialogs
+        every newer message is fetched and `limit` is not applied.
+        A finished dialog keeps its concurrency slot until it has been consumed, so
+        at most `concurrency` fetched dialogs are held in memory.
         """
+        min_ids = min_ids or {}
+        client = await self.ensure_connected(use_user_account=True)
+        if not client:
+            raise ConnectionError("Failed to connect as user account. Make sure TELEGRAM_PHONE_NUMBER is set in .env")
+        
+        filters = self._user_filters(filters, from_user_only)
+        limiter = AdaptiveConcurrency(concurrency)
+        finished = asyncio.Queue(maxsize=1)
+        
+        async def fetch(dialog):
+            messages, error = [], None
+            while True:
+                async with limiter:
+                    try:
+                        min_id = min_ids.get(dialog.get('id'), 0)
+                        messages = await self._fetch_messages(client, dialog.get('id'),
+                                                              None if min_id else limit,
+                                                              min_id=min_id,
+                                                              filters=filters)
+                        limiter.success()
+                    except FloodWaitError as e:
+                        limiter.flood_wait(e.seconds)
+                        logger.warning(f"FloodWait for {e.seconds}s, concurrency reduced to {limiter.limit}")
+                        continue
+                    except Exception as e:
+                        error = e
+                    await finished.put((dialog, messages, error))
+                    return
+        
+        tasks = [asyncio.ensure_future(fetch(dialog)) for dialog in dialogs]
         try:
-            # Create event loop if needed
-            try:
-                loop = asyncio.get_event_loop()
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            
-            # Run async function
-            return loop.run_until_complete(self.get_messages_async(peer_id, limit, offset_id, from_user_only))
-        except Exception as e:
-            logger.error(f"Error in get_messages: {str(e)}")
+            for _ in tasks:
+                yield await finished.get()
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    def iter_completed_dialogs(self, dialogs, limit=50, from_user_only=False, concurrency=4, min_ids=None,
+                               filters=None):
+        """
+        Fetch messages from many dialogs concurrently and yield each dialog's
+        (dialog, messages, error) as soon as it is done (synchronous wrapper)
+        """
+        return self.connection.iterate(
+            self.iter_completed_dialogs_async(dialogs, limit, from_user_only, concurrency, min_ids, filters),
+            maxsize=1, batch_size=1
+        )
+    
+    async def get_messages_for_dialogs_async(self, dialogs, limit=50, from_user_only=False,
+                                             concurrency=4, progress=None, min_ids=None, filters=None):
+        """
+        Get messages from many dialogs concurrently over the single user connection.
+        Returns a list of (dialog, messages, error) tuples in the same order as `dialogs`.
+        `progress` is called as progress(done, total, dialog, messages, error) after each dialog.
+        See iter_completed_dialogs_async() for `min_ids`.
+        """
+        results = {}
+        try:
+            async for dialog, messages, error in self.iter_completed_dialogs_async(
+                    dialogs, limit, from_user_only, concurrency, min_ids, filters):
+                results[id(dialog)] = (dialog, messages, error)
+                if progress:
+                    progress(len(results), len(dialogs), dialog, messages, error)
+        except ConnectionError as e:
+            logger.error(str(e))
             return []
+        return [results[id(dialog)] for dialog in dialogs]
+    
+    def get_messages_for_dialogs(self, dialogs, limit=50, from_user_only=False, concurrency=4, progress=None,
+                                 min_ids=None, filters=None):
+        """
+        Get messages from many dialogs concurrently (synchronous wrapper)
+        """
+        return self._run(
+            self.get_messages_for_dialogs_async(dialogs, limit, from_user_only, concurrency, progress, min_ids,
+                                                filters),
+            default=[]
+        )
+    
+    async def iter_messages_for_dialogs_async(self, dialogs, limit=50, from_user_only=False, filters=None,
+                                              offsets=None):
+        """
+        Yield (dialog, message, error) tuples for many dialogs, one dialog after
+        another. A dialog that fails yields a single tuple with message None.
+        `offsets` maps dialog ids to (last message id, messages already fetched)
+        of an earlier run (see ExportCheckpoints.offsets()); those dialogs
+        continue below that id, with `limit` counting the earlier messages.
+        """
+        offsets = offsets or {}
+        client = await self.ensure_connected(use_user_account=True)
+        if not client:
+            raise ConnectionError("Failed to connect as user account. Make sure TELEGRAM_PHONE_NUMBER is set in .env")
+        
+        filters = self._user_filters(filters, from_user_only)
+        for dialog in dialogs:
+            offset_id, count = offsets.get(dialog.get('id'), (0, 0))
+            dialog_limit = limit - count if limit else limit
+            if limit and dialog_limit <= 0:
+                continue
+            try:
+                async for msg in self._iter_message_records(client, dialog.get('id'), dialog_limit, offset_id,
+                                                            filters=filters):
+                    yield dialog, msg, None
+            except Exception as e:
+                yield dialog, None, e
+    
+    def iter_messages_for_dialogs(self, dialogs, limit=50, from_user_only=False, filters=None, offsets=None,
+                                  maxsize=8):
+        """
+        Stream messages from many dialogs synchronously with bounded memory
+        """
+        return self.connection.iterate(
+            self.iter_messages_for_dialogs_async(dialogs, limit, from_user_only, filters, offsets), maxsize=maxsize
+        )
+    
+    async def iter_takeout_messages_async(self, dialogs, from_user_only=False, filters=None, min_ids=None):
+        """
+        Yield (dialog, message, error) tuples with the complete history of many
+        dialogs, oldest first, through a takeout session. Takeout requests have
+        higher flood limits, so history is fetched without pauses. `min_ids`
+        maps dialog ids to the last message already exported; those dialogs
+        resume after it. The takeout is finished when the export ends, and
+        reused by the next run if the process dies before that.
+        """
+        min_ids = min_ids or {}
+        client = await self.ensure_connected(use_user_account=True)
+        if not client:
+            raise ConnectionError("Failed to connect as user account. Make sure TELEGRAM_PHONE_NUMBER is set in .env")
+        
+        filters = self._user_filters(filters, from_user_only)
+        if client.session.takeout_id:
+            # Left unfinished by an interrupted export
+            takeout = client.takeout(finalize=True)
+        else:
+            takeout = client.takeout(finalize=True, **TAKEOUT_SCOPES)
+        
+        try:
+            async with takeout:
+                for dialog in dialogs:
+                    last_id = min_ids.get(dialog.get('id'), 0)
+                    while True:
+                        try:
+                            async for msg in self._iter_message_records(takeout, dialog.get('id'), None,
+                                                                        min_id=last_id, filters=filters,
+                                                                        reverse=True, wait_time=0,
+                                                                        page_size=TAKEOUT_PAGE_SIZE):
+                                last_id = msg.id
+                                yield dialog, msg, None
+                            break
+                        except FloodWaitError as e:
+                            # Continue the dialog after the last message handed out
+                            logger.warning(f"FloodWait for {e.seconds}s during takeout export")
+                            await asyncio.sleep(e.seconds)
+                        except Exception as e:
+                            yield dialog, None, e
+                            break
+        except TakeoutInitDelayError as e:
+            raise ConnectionError(
+                f"Telegram delays the takeout by {e.seconds}s. Allow the data export in the Telegram app, "
+                f"or wait and try again."
+            )
+    
+    def iter_takeout_messages(self, dialogs, from_user_only=False, filters=None, min_ids=None, maxsize=8):
+        """
+        Stream a takeout export synchronously with bounded memory,
+        see iter_takeout_messages_async()
+        """
+        return self.connection.iterate(
+            self.iter_takeout_messages_async(dialogs, from_user_only, filters, min_ids),
+            maxsize=maxsize, batch_size=TAKEOUT_PAGE_SIZE
+        )
     
+    def get_messages(self, peer_id, limit=100, offset_id=0, from_user_only=False, filters=None):
+        """
+        Get messages synchronously
+        If from_user_only is True, only returns messages sent by the current user
+        """
+        return self._run(self.get_messages_async(peer_id, limit, offset_id, from_user_only, filters), default=[])
+
     async def disconnect(self):
         """
-        Disconnect the client
+        Disconnect the bot and user clients
+        """
+        for client in (self.client, self.user_client):
+            if client and client.is_connected():
+                await client.disconnect()
+                logger.info("Telethon client disconnected")
+        self._authorized = {}
+    
+    def close(self):
+        """
+        Save the sender name cache, disconnect the clients and stop the connection thread
         """
-        if self.client and self.client.is_connected():
-            await self.client.disconnect()
-            logger.info("Telethon client disconnected")
+        try:
+            self.entity_names.save()
+        except Exception as e:
+            logger.error(f"Error saving sender name cache: {str(e)}")
+        if self.connection._loop is None:
+            return
+        try:
+            self.connection.run(self.disconnect(), timeout=10)
+        except Exception as e:
+            logger.error(f"Error disconnecting Telethon clients: {str(e)}")
+        self.connection.stop()
 
 
 # Global client instance
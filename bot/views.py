@@ -4,6 +4,7 @@ from django.views.decorators.http import require_http_methods
 import json
 import logging
 from .services import TelegramBotService
+from .handlers import get_update_dispatcher, get_update_deduplicator, get_inline_reply
 
 logger = logging.getLogger(__name__)
 
@@ -73,6 +74,8 @@ def webhook_update(request):
         """
         POST request - Handle webhook updates from Telegram
         """
+        deduplicator = get_update_deduplicator()
+        update_id = None
         try:
             # Parse the JSON data from Telegram
             update_data = json.loads(request.body)
@@ -80,26 +83,22 @@ def webhook_update(request):
             # Log the update for debugging
             logger.info(f"Received webhook update: {update_data}")
             
-            # Extract message information
-            if 'message' in update_data:
-                message = update_data['message']
-                chat_id = message['chat']['id']
-                text = message.get('text', '')
-                user_name = message['from'].get('first_name', 'Unknown')
-                
-                # Handle different commands
-                if text.startswith('/start'):
-                    response_text = f"Hello {user_name}! This is the ikramov.uz website bot. I'm here to notify you about contact form submissions."
-                elif text.startswith('/help'):
-                    response_text = "Available commands:\n/start - Start the bot\n/help - Show this help message\n/status - Check bot status"
-                elif text.startswith('/status'):
-                    response_text = "Bot is running and ready to receive contact form notifications!"
-                else:
-                    response_text = f"Hi {user_name}! I received your message: '{text}'"
-                
-                # Send response back to user
-                bot_service = TelegramBotService()
-                bot_service.send_message_to_user(chat_id, response_text)
+            # Skip updates Telegram redelivers after a slow or failed response
+            update_id = update_data.get('update_id')
+            if not deduplicator.claim(update_id):
+                logger.info(f"Skipping duplicate update {update_id}")
+                return JsonResponse({'status': 'ok'})
+            
+            # Answer simple commands directly in the response body
+            inline_reply = get_inline_reply(update_data)
+            if inline_reply:
+                return JsonResponse(inline_reply)
+            
+            # Hand the update to the background workers and acknowledge right away
+            if not get_update_dispatcher().submit(update_data):
+                # Queue is full: let Telegram redeliver the update later
+                deduplicator.release(update_id)
+                return JsonResponse({'status': 'error', 'message': 'Busy'}, status=503)
             
             # Always return 200 OK to Telegram
             return JsonResponse({'status': 'ok'})
@@ -109,6 +108,12 @@ def webhook_update(request):
             return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
         except Exception as e:
             logger.error(f"Error processing webhook update: {str(e)}")
+            # Let Telegram's redelivery process the update again
+            try:
+                deduplicator.release(update_id)
+            except Exception as release_error:
+                # Typically the same database failure, the claim then blocks redelivery until it expires
+                logger.error(f"Could not release update {update_id}: {str(release_error)}")
             return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
     
     else:
@@ -1,9 +1,21 @@
 from django.shortcuts import render
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponseNotFound, HttpResponseServerError
-from bot.services import TelegramBotService
+from django.conf import settings
+from bot.services import ContactOutbox, TelegramBotService
 from bot.models import ContactMessage
 
+
+def _delivery_lease():
+    """
+    Without the outbox the view sends the message itself, so outbox workers
+    must not pick it up until that send is over (or has failed)
+    """
+    if settings.TELEGRAM_OUTBOX_ENABLED:
+        return {}
+    return {'next_attempt_at': ContactOutbox.lease_until()}
+
+
 def home(request):
     """Home page view"""
     context = {
@@ -32,9 +44,15 @@ def home(request):
                 name=name,
                 email=email,
                 subject=subject,
-                message=message_text
+                message=message_text,
+                **_delivery_lease()
             )
             
+            # Outbox mode: the process_outbox worker delivers it to Telegram
+            if settings.TELEGRAM_OUTBOX_ENABLED:
+                messages.success(request, 'Your message has been sent successfully!')
+                return render(request, 'index.html', context)
+            
             # Send to Telegram
             bot_service = TelegramBotService()
             telegram_sent = bot_service.send_contact_form_message(
@@ -111,9 +129,17 @@ def contact_form_ajax(request):
                     name=name,
                     email=email,
                     subject=subject,
-                    message=message_text
+                    message=message_text,
+                    **_delivery_lease()
                 )
                 logger.info(f"Contact message saved to database: ID {contact_message.id}")
+                
+                # Outbox mode: the process_outbox worker delivers it to Telegram
+                if settings.TELEGRAM_OUTBOX_ENABLED:
+                    return JsonResponse({
+                        'success': True,
+                        'message': 'Your message has been sent successfully! I will get back to you soon.'
+                    })
             except Exception as db_error:
                 logger.error(f"Database error: {str(db_error)}")
                 # Continue even if database save fails, try to send to Telegram
@@ -149,3 +149,43 @@ CSRF_USE_SESSIONS = False
 TELEGRAM_BOT_TOKEN = config('TELEGRAM_BOT_TOKEN', default='')
 TELEGRAM_ADMIN_ID = config('TELEGRAM_ADMIN_ID', default='739089730')
 TELEGRAM_WEBHOOK_URL = config('TELEGRAM_WEBHOOK_URL', default='https://ikramov.uz/bot/update/')
+
+# Contact form outbox: when enabled, the contact views only store the message
+# and the process_outbox command delivers it to Telegram.
+TELEGRAM_OUTBOX_ENABLED = config('TELEGRAM_OUTBOX_ENABLED', default=False, cast=bool)
+TELEGRAM_OUTBOX_BATCH_SIZE = config('TELEGRAM_OUTBOX_BATCH_SIZE', default=20, cast=int)
+TELEGRAM_OUTBOX_MAX_ATTEMPTS = config('TELEGRAM_OUTBOX_MAX_ATTEMPTS', default=8, cast=int)
+TELEGRAM_OUTBOX_RETRY_DELAY = config('TELEGRAM_OUTBOX_RETRY_DELAY', default=30, cast=int)  # seconds
+TELEGRAM_OUTBOX_MAX_RETRY_DELAY = config('TELEGRAM_OUTBOX_MAX_RETRY_DELAY', default=3600, cast=int)  # seconds
+
+# Shared Bot API transport (one pooled keep-alive session per process)
+TELEGRAM_API_POOL_SIZE = config('TELEGRAM_API_POOL_SIZE', default=10, cast=int)
+TELEGRAM_API_CONNECT_TIMEOUT = config('TELEGRAM_API_CONNECT_TIMEOUT', default=5, cast=float)  # seconds
+TELEGRAM_API_READ_TIMEOUT = config('TELEGRAM_API_READ_TIMEOUT', default=15, cast=float)  # seconds
+
+# Outgoing message scheduler (Telegram allows ~30 msg/s overall and ~1 msg/s per chat)
+TELEGRAM_GLOBAL_RATE_LIMIT = config('TELEGRAM_GLOBAL_RATE_LIMIT', default=30, cast=float)  # messages/second
+TELEGRAM_CHAT_RATE_LIMIT = config('TELEGRAM_CHAT_RATE_LIMIT', default=1, cast=float)  # messages/second per chat
+TELEGRAM_SEND_TIMEOUT = config('TELEGRAM_SEND_TIMEOUT', default=60, cast=float)  # seconds to wait in the queue
+TELEGRAM_SEND_MAX_RETRIES = config('TELEGRAM_SEND_MAX_RETRIES', default=5, cast=int)  # retries after 429
+
+# Webhook updates are processed by a bounded pool of background threads
+TELEGRAM_UPDATE_WORKERS = config('TELEGRAM_UPDATE_WORKERS', default=4, cast=int)
+TELEGRAM_UPDATE_QUEUE_SIZE = config('TELEGRAM_UPDATE_QUEUE_SIZE', default=100, cast=int)
+TELEGRAM_UPDATE_QUEUE_TIMEOUT = config('TELEGRAM_UPDATE_QUEUE_TIMEOUT', default=0.05, cast=float)  # seconds
+
+# Answer simple commands in the webhook response body instead of a separate sendMessage call
+TELEGRAM_INLINE_REPLIES = config('TELEGRAM_INLINE_REPLIES', default=True, cast=bool)
+
+# Redelivered webhook updates are skipped using their update_id
+TELEGRAM_UPDATE_DEDUP_CACHE_SIZE = config('TELEGRAM_UPDATE_DEDUP_CACHE_SIZE', default=1000, cast=int)
+TELEGRAM_UPDATE_DEDUP_WINDOW = config('TELEGRAM_UPDATE_DEDUP_WINDOW', default=10000, cast=int)  # update_ids kept in the table
+
+# Dialog list snapshot shared by list_channels, telegram_stats and message_history
+TELEGRAM_DIALOG_SNAPSHOT_TTL = config('TELEGRAM_DIALOG_SNAPSHOT_TTL', default=3600, cast=int)  # seconds
+
+# Where download_media stores Telegram attachments. Kept out of MEDIA_ROOT, which is
+# served at MEDIA_URL and would publish private chat media.
+TELEGRAM_MEDIA_ROOT = config('TELEGRAM_MEDIA_ROOT', default=str(BASE_DIR / 'telegram_media'))
+# Allow TELEGRAM_MEDIA_ROOT inside MEDIA_ROOT or STATIC_ROOT anyway
+TELEGRAM_MEDIA_PUBLIC = config('TELEGRAM_MEDIA_PUBLIC', default=False, cast=bool)
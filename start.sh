@@ -4,6 +4,7 @@
 
 # Create migrations for the 'users', 'index', and 'exam' apps
 python manage.py makemigrations index
+python manage.py makemigrations bot
 
 # Apply migrations
 python manage.py migrate